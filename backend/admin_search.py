@@ -0,0 +1,158 @@
+import os
+import re
+
+# Admin search over users (license, name, email, phone), cars (VIN, plate,
+# model) and reservations (ID). Users, phones and cars are matched through the
+# ngram FULLTEXT indexes from migration 009, which InnoDB keeps current on every
+# commit, so a substring anywhere in a field is an index lookup rather than a
+# LIKE '%q%' scan. Reservations are only found by exact ID, a primary key
+# lookup. All branches go out as one UNION ALL statement.
+#
+# FULLTEXT relevance says little about which hit an admin wants, so rows are
+# re-ranked here: an exact field match first, then a field or word starting
+# with the query, then plain substrings, with relevance breaking ties. Rows
+# whose fields don't literally contain every query word are dropped.
+
+SEARCH_LIMIT = int(os.getenv('ADMIN_SEARCH_LIMIT','20'))
+SEARCH_MAX_LIMIT = int(os.getenv('ADMIN_SEARCH_MAX_LIMIT','100'))
+MIN_LENGTH = 2
+
+# the ngram parser's default ngram_token_size; shorter words become prefix terms
+NGRAM_SIZE = 2
+
+EXACT, PREFIX, SUBSTRING = 3, 2, 1
+MATCH_NAMES = {EXACT: 'exact', PREFIX: 'prefix', SUBSTRING: 'substring'}
+
+USER_MATCH = "MATCH(u.License_No, u.FName, u.MName, u.LName, u.Email) AGAINST (%s IN BOOLEAN MODE)"
+PHONE_MATCH = "MATCH(p.Phone) AGAINST (%s IN BOOLEAN MODE)"
+CAR_MATCH = "MATCH(c.VIN, c.Reg_No, c.Model) AGAINST (%s IN BOOLEAN MODE)"
+
+USER_COLUMNS = """'user' AS Kind, u.License_No AS Ref, CONCAT_WS(' ', u.FName, u.MName, u.LName) AS Label,
+                  u.Email AS Email,
+                  (SELECT GROUP_CONCAT(up.Phone SEPARATOR ', ') FROM User_Phone up
+                   WHERE up.License_No = u.License_No) AS Phones,
+                  NULL AS Reg_No, u.User_Type AS Detail"""
+
+_WORD = re.compile(r'\w+$')
+
+
+def normalize(q):
+    return ' '.join((q or '').split())
+
+
+def words(q):
+    return [w for w in q.replace('"', ' ').split() if w]
+
+
+def against(q):
+    # Boolean-mode expression requiring every word: each is an ngram phrase,
+    # except words shorter than one ngram, which only match as a prefix term
+    terms = []
+    for w in words(q):
+        if len(w) >= NGRAM_SIZE:
+            terms.append(f'+"{w}"')
+        elif _WORD.match(w):
+            terms.append(f'+{w}*')
+    return ' '.join(terms)
+
+
+def reservation_id(q):
+    return int(q) if q.isdigit() and len(q) <= 18 else None
+
+
+def search_query(q, limit):
+    # (sql, params) for one search; limit caps each branch, and the caller
+    # trims the merged list
+    expr = against(q)
+    branches = []
+    params = []
+    if expr:
+        branches += [
+            f"""(SELECT {USER_COLUMNS}, {USER_MATCH} AS Score
+                FROM User u WHERE {USER_MATCH}
+                ORDER BY Score DESC LIMIT %s)""",
+            f"""(SELECT {USER_COLUMNS}, {PHONE_MATCH} AS Score
+                FROM User_Phone p JOIN User u ON u.License_No = p.License_No
+                WHERE {PHONE_MATCH}
+                ORDER BY Score DESC LIMIT %s)""",
+            f"""(SELECT 'car' AS Kind, c.VIN AS Ref, c.Model AS Label, NULL AS Email, NULL AS Phones,
+                        c.Reg_No AS Reg_No, CONCAT_WS(' ', c.Car_Type, c.Status) AS Detail, {CAR_MATCH} AS Score
+                FROM Car c WHERE {CAR_MATCH}
+                ORDER BY Score DESC LIMIT %s)""",
+        ]
+        params += [expr, expr, limit] * 3
+    rid = reservation_id(q)
+    if rid is not None:
+        branches.append("""(SELECT 'reservation' AS Kind, CAST(r.Reservation_ID AS CHAR) AS Ref,
+                                   CONCAT_WS(' ', u.FName, u.LName) AS Label, u.Email AS Email, NULL AS Phones,
+                                   c.Reg_No AS Reg_No,
+                                   CONCAT_WS(' ', r.Status, r.Start_Date, r.End_Date, c.Model) AS Detail,
+                                   0 AS Score
+                            FROM Reservation r
+                            JOIN User u ON r.License_No = u.License_No
+                            JOIN Car c ON r.VIN = c.VIN
+                            WHERE r.Reservation_ID = %s)""")
+        params.append(rid)
+    return '\nUNION ALL\n'.join(branches), tuple(params)
+
+
+def _fields(row):
+    fields = [row['Ref'], row['Label'], row['Email'], row['Reg_No']]
+    if row['Phones']:
+        fields += row['Phones'].split(', ')
+    return [str(f).casefold() for f in fields if f]
+
+
+def match_tier(row, q):
+    # EXACT/PREFIX/SUBSTRING for a row that contains every word of q, else None
+    q = q.casefold()
+    fields = _fields(row)
+    text = '\n'.join(fields)
+    if not all(w.casefold() in text for w in words(q)):
+        return None
+    if q in fields:
+        return EXACT
+    if any(f.startswith(q) or f' {q}' in f for f in fields):
+        return PREFIX
+    return SUBSTRING
+
+
+def rank(rows, q, limit):
+    best = {}
+    for row in rows:
+        tier = match_tier(row, q)
+        if tier is None:
+            continue
+        key = (row['Kind'], row['Ref'])
+        score = float(row['Score'] or 0)
+        if key not in best or (tier, score) > best[key][:2]:
+            best[key] = (tier, score, row)
+    ranked = sorted(best.values(), key=lambda t: (-t[0], -t[1], t[2]['Kind'], t[2]['Ref']))
+    results = []
+    for tier, score, row in ranked[:limit]:
+        result = {k: row[k] for k in ('Kind', 'Ref', 'Label', 'Email', 'Phones', 'Reg_No', 'Detail')}
+        result['Match'] = MATCH_NAMES[tier]
+        results.append(result)
+    return results
+
+
+def search(conn, q, limit=SEARCH_LIMIT):
+    q = normalize(q)
+    sql, params = search_query(q, limit)
+    if not sql:
+        return []
+    cur = conn.cursor(dictionary=True)
+    cur.execute(sql, params)
+    rows = cur.fetchall()
+    cur.close()
+    return rank(rows, q, limit)
+
+
+def validate(q):
+    # Raises ValueError for a query the indexes can't answer usefully
+    q = normalize(q)
+    if reservation_id(q) is None and len(q) < MIN_LENGTH:
+        raise ValueError(f'q must be at least {MIN_LENGTH} characters, or a reservation ID')
+    if not search_query(q, 1)[0]:
+        raise ValueError('q must contain letters or digits')
+    return q
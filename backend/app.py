@@ -1,19 +1,91 @@
+import io
 import os
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify
+import time
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, stream_with_context
 from flask_session import Session
-from werkzeug.security import generate_password_hash, check_password_hash
-from db import get_db_connection
+import db
+from db import get_db_connection, pool_stats, replica_stats
+from availability import (apply_reservation_events, availability_index, available_cars,
+                          calendar as availability_calendar)
+import admin_search
+from batch_booking import book_batch
+from booking import book_reservation, parse_dates
+from cache_versions import bump_versions
+from catalog import (bump_catalog_version, cached_json, catalog_stats, fleet_for, invalidate_fleet, location_args,
+                     location_key, locations_summary)
+from dashboard import (ADMIN_RESERVATIONS_SELECT, ADMIN_USERS_SELECT, SECTIONS, build_sections, car_status_summary,
+                       current_versions, dashboard_hub, decode_versions, encode_versions, revenue_series)
+from fleet_io import FORMATS as FLEET_FORMATS, export_csv as export_fleet_csv, import_csv as import_fleet_csv
+from pricing import quote_cars
+import outbox
+import perf
+from perf import query_budget
+import revenue
+import stats
+from passwords import HashPoolBusy, hash_pool
+from pagination import keyset_query, page_args, stream_page
+from session_store import SqliteSessionStore, StoreSessionInterface
+from user_versions import (bump_user_version, check_not_modified, etag_stats, not_modified, tag_response,
+                           user_etag, user_version)
+from roles import apply_role_events, cached_role, remember_role, role_cache_stats, role_changed
 from dotenv import load_dotenv
 
 load_dotenv()
 
 app = Flask(__name__, static_folder='static', template_folder='templates')
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY','change_me')
-app.config['SESSION_TYPE'] = 'filesystem'
-Session(app)
+# SESSION_BACKEND=sqlite (default) keeps sessions in one SQLite file behind an
+# in-process LRU; filesystem is the previous Flask-Session file-per-session store
+app.config['SESSION_BACKEND'] = os.getenv('SESSION_BACKEND','sqlite')
+# Cross-check every indexed availability answer against the SQL anti-join (tests only)
+app.config['AVAILABILITY_CONSISTENCY_CHECK'] = os.getenv('AVAILABILITY_CONSISTENCY_CHECK','0') == '1'
+
+BATCH_MAX_ROWS = int(os.getenv('BATCH_MAX_ROWS','5000'))
+QUOTE_MAX_CELLS = int(os.getenv('QUOTE_MAX_CELLS','100000'))
+CALENDAR_MAX_DAYS = int(os.getenv('CALENDAR_MAX_DAYS','366'))
+REVENUE_MAX_DAYS = int(os.getenv('REVENUE_MAX_DAYS','3660'))
+if app.config['SESSION_BACKEND'] == 'filesystem':
+    app.config['SESSION_TYPE'] = 'filesystem'
+    Session(app)
+    session_store = None
+else:
+    session_store = SqliteSessionStore()
+    app.session_interface = StoreSessionInterface(session_store)
+
+
+# Cache upkeep driven by other processes' writes, see outbox.py
+if os.getenv('OUTBOX_DISPATCH','1') == '1':
+    outbox.dispatcher.subscribe('availability', apply_reservation_events, types=outbox.RESERVATION_EVENTS)
+    outbox.dispatcher.subscribe('roles', apply_role_events, types=outbox.ROLE_EVENTS)
+    outbox.dispatcher.start()
+
+
+@app.before_request
+def perf_start():
+    perf.start_request()
+
+@app.before_request
+def route_db_reads():
+    # Sessions that wrote in the last DB_PIN_SECONDS read from the primary
+    db.route_request(session.get('db_primary_until', 0) > time.time())
+
+@app.after_request
+def pin_after_write(response):
+    if db.committed_write() and session.get('license_no') and db.get_replicas() is not None:
+        session['db_primary_until'] = time.time() + db.PIN_SECONDS
+    return response
+
+@app.after_request
+def perf_finish(response):
+    # Recorded when the body has been sent, so statements run by streamed
+    # responses are counted too
+    rule = request.url_rule.rule if request.url_rule else '<unmatched>'
+    response.call_on_close(perf.request_finisher(request.method, rule, request.path, response.status_code))
+    return response
 
 
 from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
 from functools import wraps
 
 def admin_required(f):
@@ -23,14 +95,23 @@ def admin_required(f):
         if not session.get('license_no'):
             return redirect(url_for('login_page'))
         
-        conn = get_db_connection()
-        cur = conn.cursor(dictionary=True)
-        cur.execute("SELECT User_Type FROM User WHERE License_No = %s", (session['license_no'],))
-        user = cur.fetchone()
-        cur.close()
-        conn.close()
-
-        if not user or user['User_Type'] != 'Admin':
+        # Role is cached in the session at login, see roles.py; the DB is only
+        # read when the stamp is missing, too old or behind a known role change
+        user_type = cached_role(session)
+        if user_type is None:
+            with get_db_connection() as conn:
+                cur = conn.cursor(dictionary=True)
+                cur.execute("""
+                    SELECT u.User_Type, COALESCE(uv.Version, 0) AS Version FROM User u
+                    LEFT JOIN User_Version uv ON uv.License_No = u.License_No
+                    WHERE u.License_No = %s
+                """, (session['license_no'],))
+                user = cur.fetchone()
+                cur.close()
+            user_type = user['User_Type'] if user else None
+            remember_role(session, session['license_no'], user_type, user['Version'] if user else 0)
+
+        if user_type != 'Admin':
             return jsonify({'error': 'Admin access required'}), 403
             
         return f(*args, **kwargs)
@@ -38,250 +119,245 @@ def admin_required(f):
 
 # Admin Routes
 @app.route('/admin')
+@query_budget(0)
 @admin_required
 def admin_page():
     return render_template('admin.html')
 
 @app.route('/api/admin/stats')
+@query_budget(1)
 @admin_required
 def api_admin_stats():
-    conn = get_db_connection()
-    cur = conn.cursor(dictionary=True)
-    
-    # Get total and new users
-    cur.execute("SELECT COUNT(*) as total FROM User")
-    total_users = cur.fetchone()['total']
-
-    # created_at may not exist in every schema; fall back gracefully
-    try:
-        cur.execute("SELECT COUNT(*) as new FROM User WHERE DATE(created_at) = CURDATE()")
-        new_users = cur.fetchone()['new']
-    except Exception:
-        # If the column doesn't exist, return 0 for new users today
-        new_users = 0
-    
-    # Get reservation stats
-    cur.execute("SELECT COUNT(*) as active FROM Reservation WHERE Status='Confirmed' AND End_Date >= CURDATE()")
-    active_reservations = cur.fetchone()['active']
-    
-    cur.execute("SELECT COUNT(*) as pending FROM Reservation WHERE Status='Pending'")
-    pending_reservations = cur.fetchone()['pending']
-    
-    # Get car stats
-    cur.execute("SELECT COUNT(*) as available FROM Car WHERE Status='Available'")
-    available_cars = cur.fetchone()['available']
-    
-    cur.execute("SELECT COUNT(*) as total FROM Car")
-    total_cars = cur.fetchone()['total']
-    
-    # Get revenue stats
-    cur.execute("""
-        SELECT COALESCE(SUM(Total_Amount), 0) as revenue 
-        FROM Reservation 
-        WHERE YEAR(Start_Date) = YEAR(CURDATE()) 
-        AND MONTH(Start_Date) = MONTH(CURDATE())
-        AND Status IN ('Confirmed', 'Completed')
-    """)
-    monthly_revenue = cur.fetchone()['revenue']
-    
-    # Calculate revenue change
-    cur.execute("""
-        SELECT COALESCE(SUM(Total_Amount), 0) as last_month 
-        FROM Reservation 
-        WHERE Status IN ('Confirmed', 'Completed')
-        AND Start_Date >= DATE_SUB(DATE_FORMAT(CURDATE(), '%Y-%m-01'), INTERVAL 1 MONTH)
-        AND Start_Date < DATE_FORMAT(CURDATE(), '%Y-%m-01')
-    """)
-    last_month = cur.fetchone()['last_month']
-    
-    revenue_change = 0
-    if last_month > 0:
-        revenue_change = ((monthly_revenue - last_month) / last_month) * 100
-    
-    cur.close()
-    conn.close()
-    
-    return jsonify({
-        'totalUsers': total_users,
-        'newUsers': new_users,
-        'activeReservations': active_reservations,
-        'pendingReservations': pending_reservations,
-        'availableCars': available_cars,
-        'totalCars': total_cars,
-        'monthlyRevenue': float(monthly_revenue),
-        'revenueChange': float(revenue_change)
-    })
+    # Served from the Stats_Rollup counters maintained on every write path
+    with get_db_connection(read_only=True) as conn:
+        result = stats.read_admin_stats(conn)
+    return jsonify(result)
 
 @app.route('/api/admin/users')
+@query_budget(1)
 @admin_required
 def api_admin_users():
-    conn = get_db_connection()
-    cur = conn.cursor(dictionary=True)
-    
-    cur.execute("""
-        SELECT u.*, COUNT(r.Reservation_ID) as total_reservations,
-               SUM(CASE WHEN r.Status = 'Confirmed' THEN 1 ELSE 0 END) as active_reservations
-        FROM User u
-        LEFT JOIN Reservation r ON u.License_No = r.License_No
-        GROUP BY u.License_No
-        ORDER BY u.License_No DESC
-    """)
-    users = cur.fetchall()
-    
-    cur.close()
-    conn.close()
-    return jsonify(users)
+    try:
+        limit, after = page_args(key_type=str)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    sql, params = keyset_query(ADMIN_USERS_SELECT, 'u.License_No', limit, after, group_by='u.License_No')
+    return stream_page(sql, params, 'License_No', limit, read_only=True)
+
+@app.route('/api/admin/users/<license_no>/role', methods=['POST'])
+@query_budget(5)
+@admin_required
+def api_admin_set_user_role(license_no):
+    user_type = (request.json or {}).get('User_Type')
+    if user_type not in ('Customer', 'Guest', 'Admin'):
+        return jsonify({'error':'User_Type must be Customer, Guest or Admin'}), 400
+    with get_db_connection() as conn:
+        cur = conn.cursor(dictionary=True)
+        # The locked read also pins User_Version, so the bump below yields Version + 1
+        cur.execute("""
+            SELECT u.User_Type, COALESCE(uv.Version, 0) AS Version FROM User u
+            LEFT JOIN User_Version uv ON uv.License_No = u.License_No
+            WHERE u.License_No = %s FOR UPDATE
+        """, (license_no,))
+        user = cur.fetchone()
+        if not user or user['User_Type'] == user_type:
+            conn.rollback()
+            cur.close()
+            if not user:
+                return jsonify({'error':'User not found'}), 404
+            return jsonify({'message':'role unchanged'})
+        version = user['Version'] + 1
+        cur.execute("UPDATE User SET User_Type=%s WHERE License_No=%s", (user_type, license_no))
+        bump_user_version(conn, license_no)
+        bump_versions(conn, ['users'])
+        outbox.role_changed(conn, license_no, user_type, version)
+        conn.commit()
+        cur.close()
+    # Other workers hear about it through the outbox; this one stops trusting
+    # stale stamps right away
+    role_changed(license_no, version)
+    return jsonify({'message':'role updated'})
 
 @app.route('/api/admin/reservations')
+@query_budget(1)
 @admin_required
 def api_admin_reservations():
-    conn = get_db_connection()
-    cur = conn.cursor(dictionary=True)
+    try:
+        limit, after = page_args(default_limit=200)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     # Return summarized reservations with user contact and car info
-    cur.execute("""
-        SELECT r.Reservation_ID, r.License_No, u.FName, u.LName, u.Email,
-               GROUP_CONCAT(DISTINCT up.Phone SEPARATOR ', ') AS Phones,
-               c.VIN, c.Model, c.Car_Type, c.Color,
-               r.Start_Date, r.End_Date, r.Status, r.Total_Amount, r.Insurance_Type
-        FROM Reservation r
-        JOIN User u ON r.License_No = u.License_No
-        LEFT JOIN User_Phone up ON up.License_No = u.License_No
-        JOIN Car c ON r.VIN = c.VIN
-        GROUP BY r.Reservation_ID
-        ORDER BY r.Reservation_ID DESC
-        LIMIT 200
-    """)
-    reservations = cur.fetchall()
-
-    cur.close()
-    conn.close()
-    return jsonify(reservations)
+    sql, params = keyset_query(ADMIN_RESERVATIONS_SELECT, 'r.Reservation_ID', limit, after,
+                               group_by='r.Reservation_ID')
+    return stream_page(sql, params, 'Reservation_ID', limit, read_only=True)
 
 
 @app.route('/api/admin/reservation/<int:reservation_id>')
+@query_budget(2)
 @admin_required
 def api_admin_reservation_detail(reservation_id):
-    conn = get_db_connection()
-    cur = conn.cursor(dictionary=True)
-    try:
-        # Try the rich query first (may reference optional Payment columns)
-        cur.execute("""
-            SELECT r.*, u.FName, u.LName, u.Email, u.Address, u.DOB, u.User_Type,
-                   GROUP_CONCAT(DISTINCT up.Phone SEPARATOR ', ') AS Phones,
-                   c.VIN, c.Model, c.Car_Type, c.Color, ct.Daily_Rate,
-                   p.Amount AS Payment_Amount, p.Payment_Date
-            FROM Reservation r
-            JOIN User u ON r.License_No = u.License_No
-            LEFT JOIN User_Phone up ON up.License_No = u.License_No
-            JOIN Car c ON r.VIN = c.VIN
-            LEFT JOIN Car_Type ct ON c.Car_Type = ct.Car_Type
-            LEFT JOIN Payment p ON p.Reservation_ID = r.Reservation_ID
-            WHERE r.Reservation_ID = %s
-            GROUP BY r.Reservation_ID
-        """, (reservation_id,))
-        row = cur.fetchone()
-    except Exception:
-        # Fallback query: omit Payment_Date/other optional columns in case schema differs
-        cur.execute("""
-            SELECT r.*, u.FName, u.LName, u.Email, u.Address, u.DOB, u.User_Type,
-                   GROUP_CONCAT(DISTINCT up.Phone SEPARATOR ', ') AS Phones,
-                   c.VIN, c.Model, c.Car_Type, c.Color, ct.Daily_Rate
-            FROM Reservation r
-            JOIN User u ON r.License_No = u.License_No
-            LEFT JOIN User_Phone up ON up.License_No = u.License_No
-            JOIN Car c ON r.VIN = c.VIN
-            LEFT JOIN Car_Type ct ON c.Car_Type = ct.Car_Type
-            WHERE r.Reservation_ID = %s
-            GROUP BY r.Reservation_ID
-        """, (reservation_id,))
-        row = cur.fetchone()
-
-    if not row:
-        cur.close(); conn.close()
-        return jsonify({'error':'Reservation not found'}), 404
+    with get_db_connection(read_only=True) as conn:
+        cur = conn.cursor(dictionary=True)
+        try:
+            # Try the rich query first (may reference optional Payment columns)
+            cur.execute("""
+                SELECT r.*, u.FName, u.LName, u.Email, u.Address, u.DOB, u.User_Type,
+                       GROUP_CONCAT(DISTINCT up.Phone SEPARATOR ', ') AS Phones,
+                       c.VIN, c.Model, c.Car_Type, c.Color, ct.Daily_Rate,
+                       p.Amount AS Payment_Amount, p.Payment_Date
+                FROM Reservation r
+                JOIN User u ON r.License_No = u.License_No
+                LEFT JOIN User_Phone up ON up.License_No = u.License_No
+                JOIN Car c ON r.VIN = c.VIN
+                LEFT JOIN Car_Type ct ON c.Car_Type = ct.Car_Type
+                LEFT JOIN Payment p ON p.Reservation_ID = r.Reservation_ID
+                WHERE r.Reservation_ID = %s
+                GROUP BY r.Reservation_ID
+            """, (reservation_id,))
+            row = cur.fetchone()
+        except Exception:
+            # Fallback query: omit Payment_Date/other optional columns in case schema differs
+            cur.execute("""
+                SELECT r.*, u.FName, u.LName, u.Email, u.Address, u.DOB, u.User_Type,
+                       GROUP_CONCAT(DISTINCT up.Phone SEPARATOR ', ') AS Phones,
+                       c.VIN, c.Model, c.Car_Type, c.Color, ct.Daily_Rate
+                FROM Reservation r
+                JOIN User u ON r.License_No = u.License_No
+                LEFT JOIN User_Phone up ON up.License_No = u.License_No
+                JOIN Car c ON r.VIN = c.VIN
+                LEFT JOIN Car_Type ct ON c.Car_Type = ct.Car_Type
+                WHERE r.Reservation_ID = %s
+                GROUP BY r.Reservation_ID
+            """, (reservation_id,))
+            row = cur.fetchone()
+
+        if not row:
+            cur.close()
+            return jsonify({'error':'Reservation not found'}), 404
 
-    # Coerce numbers to python types if needed
-    cur.close(); conn.close()
+        # Coerce numbers to python types if needed
+        cur.close()
     return jsonify(row)
 
+@app.route('/api/admin/search')
+@query_budget(1)
+@admin_required
+def api_admin_search():
+    # ?q= matches users by license, name, email or phone, cars by VIN, plate or
+    # model, and reservations by ID; best matches first (see admin_search.py)
+    try:
+        q = admin_search.validate(request.args.get('q', ''))
+        limit = int(request.args.get('limit', admin_search.SEARCH_LIMIT))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if limit < 1 or limit > admin_search.SEARCH_MAX_LIMIT:
+        return jsonify({'error': f'limit must be between 1 and {admin_search.SEARCH_MAX_LIMIT}'}), 400
+
+    with get_db_connection(read_only=True) as conn:
+        results = admin_search.search(conn, q, limit)
+    return jsonify({'query': q, 'results': results})
+
 @app.route('/api/admin/revenue')
+@query_budget(1)
 @admin_required
 def api_admin_revenue():
-    conn = get_db_connection()
-    cur = conn.cursor(dictionary=True)
-    
-    # Get daily revenue for last 30 days
-    cur.execute("""
-        SELECT DATE(Start_Date) as date, 
-               COALESCE(SUM(Total_Amount), 0) as revenue
-        FROM Reservation
-        WHERE Start_Date >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
-        AND Status IN ('Confirmed', 'Completed')
-        GROUP BY DATE(Start_Date)
-        ORDER BY date
-    """)
-    revenue_data = cur.fetchall()
-    
-    # Fill in missing dates with zero revenue
-    all_dates = []
-    all_revenue = []
-    
-    start_date = date.today() - timedelta(days=30)
-    current_date = start_date
-    
-    revenue_by_date = {r['date'].strftime('%Y-%m-%d'): float(r['revenue']) for r in revenue_data}
-    
-    while current_date <= date.today():
-        date_str = current_date.strftime('%Y-%m-%d')
-        all_dates.append(date_str)
-        all_revenue.append(revenue_by_date.get(date_str, 0))
-        current_date += timedelta(days=1)
-    
-    cur.close()
-    conn.close()
-    
-    return jsonify({
-        'labels': all_dates,
-        'values': all_revenue
-    })
+    # optional query params: days=30 (window ending today) and granularity=day|week|month
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in revenue.GRANULARITIES:
+        return jsonify({'error':'granularity must be day, week or month'}), 400
+    try:
+        days = int(request.args.get('days', 30))
+    except ValueError:
+        return jsonify({'error':'days must be an integer'}), 400
+    if not 1 <= days <= REVENUE_MAX_DAYS:
+        return jsonify({'error':f'days must be between 1 and {REVENUE_MAX_DAYS}'}), 400
+
+    with get_db_connection(read_only=True) as conn:
+        result = revenue_series(conn, days, granularity)
+    return jsonify(result)
 
 @app.route('/api/admin/car-status')
+@query_budget(1)
 @admin_required
 def api_admin_car_status():
-    conn = get_db_connection()
-    cur = conn.cursor(dictionary=True)
-    
-    cur.execute("""
-        SELECT c.Car_Type,
-               COUNT(*) as total,
-               SUM(CASE WHEN c.Status = 'Available' THEN 1 ELSE 0 END) as available
-        FROM Car c
-        GROUP BY c.Car_Type
-    """)
-    status = cur.fetchall()
-    
-    result = {
-        row['Car_Type']: {
-            'total': row['total'],
-            'available': row['available']
-        }
-        for row in status
-    }
-    
-    cur.close()
-    conn.close()
-    return jsonify(result)
+    try:
+        locations = location_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return cached_json(location_key('car_status', locations), lambda: car_status_summary(locations))
+
+@app.route('/api/admin/dashboard')
+@query_budget(6)
+@admin_required
+def api_admin_dashboard():
+    # Every admin panel section from one connection; 'versions' seeds the stream below
+    with get_db_connection() as conn:
+        versions = current_versions(conn)
+        sections = build_sections(conn, SECTIONS)
+    return jsonify({'versions': encode_versions(versions), 'sections': sections})
+
+@app.route('/api/admin/dashboard/stream')
+@admin_required
+def api_admin_dashboard_stream():
+    # Server-sent events carrying only the sections that changed. EventSource
+    # resends the last event id (the versions it has) when it reconnects.
+    since = decode_versions(request.headers.get('Last-Event-ID') or request.args.get('versions'))
+    return app.response_class(dashboard_hub.stream(app.json.dumps, since), mimetype='text/event-stream',
+                              headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/admin/fleet/import/<kind>', methods=['POST'])
+@query_budget(15)  # one CHUNK of cars, committed
+@admin_required
+def api_admin_fleet_import(kind):
+    # CSV as a multipart 'file' field or the raw request body; ?mode=insert
+    # rejects existing keys, ?dry_run=1 validates without writing
+    if kind not in FLEET_FORMATS:
+        return jsonify({'error': f"kind must be one of {', '.join(sorted(FLEET_FORMATS))}"}), 404
+    upload = request.files.get('file')
+    source = io.TextIOWrapper(upload.stream if upload else request.stream, encoding='utf-8-sig', newline='')
+    try:
+        with get_db_connection() as conn:
+            report = import_fleet_csv(conn, kind, source, mode=request.args.get('mode', 'upsert'),
+                                      dry_run=request.args.get('dry_run') == '1')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(report), 400 if report['error_count'] else 200
+
+@app.route('/api/admin/fleet/export/<kind>')
+@query_budget(1)
+@admin_required
+def api_admin_fleet_export(kind):
+    if kind not in FLEET_FORMATS:
+        return jsonify({'error': f"kind must be one of {', '.join(sorted(FLEET_FORMATS))}"}), 404
+
+    def generate():
+        with get_db_connection(read_only=True) as conn:
+            yield from export_fleet_csv(conn, kind)
+
+    return app.response_class(stream_with_context(generate()), mimetype='text/csv',
+                              headers={'Content-Disposition': f'attachment; filename={kind}.csv'})
 
 @app.route('/api/admin/confirm-reservation/<int:reservation_id>', methods=['POST'])
+@query_budget(11)
 @admin_required
 def api_admin_confirm_reservation(reservation_id):
     conn = get_db_connection()
     cur = conn.cursor()
     
     try:
+        before = stats.fetch_reservation(conn, reservation_id)
         cur.callproc('ConfirmReservation', [reservation_id])
+        if before:
+            after = stats.fetch_reservation(conn, reservation_id)
+            stats.record_reservation_change(conn, before, after)
+            stats.record_car_status_change(conn, before['Car_Status'], after['Car_Status'])
+            outbox.reservation_changed(conn, before, after)
+        bump_catalog_version(conn)
         conn.commit()
+        # ConfirmReservation marks the car Unavailable
+        invalidate_fleet()
+        availability_index.refresh_reservation(conn, reservation_id)
         return jsonify({'message': 'Reservation confirmed successfully'})
     except Exception as e:
         conn.rollback()
@@ -291,12 +367,12 @@ def api_admin_confirm_reservation(reservation_id):
         conn.close()
 
 @app.route('/api/reservations/<int:reservation_id>/cancel', methods=['POST'])
+@query_budget(7)
 def api_cancel_reservation(reservation_id):
     # optional: ensure user owns this reservation if using sessions
     conn = get_db_connection(); cur = conn.cursor(dictionary=True)
     try:
-        cur.execute("SELECT Reservation_ID, Start_Date FROM Reservation WHERE Reservation_ID=%s", (reservation_id,))
-        row = cur.fetchone()
+        row = stats.fetch_reservation(conn, reservation_id)
         if not row:
             return jsonify({"error":"Reservation not found"}), 404
 
@@ -306,7 +382,11 @@ def api_cancel_reservation(reservation_id):
 
         # Deleting the reservation will invoke AfterReservationDelete trigger to free the car
         cur.execute("DELETE FROM Reservation WHERE Reservation_ID=%s", (reservation_id,))
+        stats.record_reservation_change(conn, row, None)
+        outbox.reservation_changed(conn, row, None)
         conn.commit()
+        availability_index.remove(reservation_id)
+        invalidate_fleet()
         return jsonify({"message":"Reservation cancelled and car released"}), 200
     except Exception as e:
         conn.rollback()
@@ -321,58 +401,55 @@ from datetime import date, datetime
 from flask import request
 
 @app.route('/api/metrics/summary', methods=['GET'])
+@query_budget(1)
 def api_metrics_summary():
-    # optional query params: start_date=YYYY-MM-DD&end_date=YYYY-MM-DD
+    # optional query params: start_date=YYYY-MM-DD&end_date=YYYY-MM-DD&granularity=day|week|month
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in revenue.GRANULARITIES:
+        return jsonify({'error':'granularity must be day, week or month'}), 400
     if not start_date or not end_date:
         today = date.today()
         start_date = date(today.year, today.month, 1).isoformat()
         # crude month end: next month first - 1 day via SQL, keep end_date as today for simplicity
         end_date = today.isoformat()
 
-    conn = get_db_connection(); cur = conn.cursor(dictionary=True)
+    try:
+        start = date.fromisoformat(start_date)
+        end = date.fromisoformat(end_date)
+    except ValueError:
+        return jsonify({'error':'start_date and end_date must be YYYY-MM-DD'}), 400
+    if end < start:
+        return jsonify({'error':'end_date cannot be before start_date'}), 400
+    if (end - start).days >= REVENUE_MAX_DAYS:
+        return jsonify({'error':f'The range can cover at most {REVENUE_MAX_DAYS} days'}), 400
+
+    # Everything below comes from one Revenue_Daily range read
+    with get_db_connection(read_only=True) as conn:
+        facts = revenue.load_range(conn, start, end, ('Pending', 'Confirmed'))
+
+    # 1) Revenue by Car Type
+    by_type = sorted((
+        {
+            'Car_Type': car_type,
+            'bookings': bookings,
+            'total_revenue': amount,
+            'avg_booking_value': (amount / bookings).quantize(Decimal('0.000001')) if bookings else Decimal(0)
+        }
+        for car_type, (bookings, amount) in facts.by_type.items() if bookings
+    ), key=lambda row: row['total_revenue'], reverse=True)
 
-    # 1) Revenue by Car Type (joins Reservation->Car->Car_Type)
-    cur.execute("""
-        SELECT ct.Car_Type,
-               COUNT(r.Reservation_ID) AS bookings,
-               COALESCE(SUM(r.Total_Amount),0) AS total_revenue,
-               COALESCE(AVG(r.Total_Amount),0) AS avg_booking_value
-        FROM Reservation r
-        JOIN Car c ON r.VIN = c.VIN
-        JOIN Car_Type ct ON c.Car_Type = ct.Car_Type
-        WHERE r.Status IN ('Pending','Confirmed') 
-          AND r.Start_Date >= %s AND r.Start_Date <= %s
-        GROUP BY ct.Car_Type
-        ORDER BY total_revenue DESC
-    """, (start_date, end_date))
-    by_type = cur.fetchall()
-
-    # 2) Revenue per Day
-    cur.execute("""
-        SELECT r.Start_Date AS day,
-               COUNT(r.Reservation_ID) AS bookings,
-               COALESCE(SUM(r.Total_Amount),0) AS total_revenue
-        FROM Reservation r
-        WHERE r.Status IN ('Pending','Confirmed')
-          AND r.Start_Date >= %s AND r.Start_Date <= %s
-        GROUP BY r.Start_Date
-        ORDER BY r.Start_Date
-    """, (start_date, end_date))
-    per_day = cur.fetchall()
+    # 2) Revenue per Day (or per week/month bucket)
+    per_day = [
+        {'day': day, 'bookings': bookings, 'total_revenue': amount}
+        for day, bookings, amount in facts.buckets(granularity) if bookings
+    ]
 
     # 3) Headline metrics
-    cur.execute("""
-        SELECT COALESCE(SUM(Total_Amount),0) AS total_revenue,
-               COUNT(*) AS total_bookings
-        FROM Reservation
-        WHERE Status IN ('Pending','Confirmed')
-          AND Start_Date >= %s AND Start_Date <= %s
-    """, (start_date, end_date))
-    headline = cur.fetchone()
-
-    cur.close(); conn.close()
+    total_bookings, total_revenue = facts.total()
+    headline = {'total_revenue': total_revenue, 'total_bookings': total_bookings}
+
     return jsonify({
         "range": {"start_date": start_date, "end_date": end_date},
         "headline": headline,
@@ -380,38 +457,72 @@ def api_metrics_summary():
         "per_day": per_day
     })
 
+@app.route('/api/metrics/runtime', methods=['GET'])
+@query_budget(0)
+def api_metrics_runtime():
+    # In-process counters for scraping; per worker, not aggregated across processes
+    return jsonify({
+        'db_pool': pool_stats(),
+        'db_replicas': replica_stats(),
+        'availability_index': availability_index.stats(),
+        'role_cache': role_cache_stats(),
+        'sessions': session_store.stats() if session_store else {'backend': 'filesystem'},
+        'password_hashing': hash_pool.stats(),
+        'etags': etag_stats(),
+        'catalog': catalog_stats(),
+        'dashboard': dashboard_hub.stats(),
+        'outbox': outbox.dispatcher.stats()
+    })
+
+@app.route('/api/admin/perf', methods=['GET'])
+@query_budget(0)
+@admin_required
+def api_admin_perf():
+    # Per-route latency and DB time over the last PERF_WINDOW_MINUTES plus the
+    # slow-request log; ?format=prometheus gives lifetime counters as text
+    if request.args.get('format') == 'prometheus':
+        return app.response_class(perf.prometheus_text(), mimetype='text/plain; version=0.0.4')
+    return jsonify(perf.perf_report())
+
 # ROUTES: Pages
 @app.route('/')
+@query_budget(0)
 def index():
     if session.get('license_no'):
         return redirect(url_for('dashboard'))
     return render_template('login.html')
 
 @app.route('/login', methods=['GET'])
+@query_budget(0)
 def login_page():
     return render_template('login.html')
 
 @app.route('/register', methods=['GET'])
+@query_budget(0)
 def register_page():
     return render_template('register.html')
 
 @app.route('/dashboard')
+@query_budget(0)
 def dashboard():
     if not session.get('license_no'):
         return redirect(url_for('login_page'))
     return render_template('dashboard.html', license_no=session.get('license_no'))
 
 @app.route('/cars')
+@query_budget(0)
 def cars_page():
     return render_template('cars.html')
 
 @app.route('/reserve')
+@query_budget(0)
 def reserve_page():
     if not session.get('license_no'):
         return redirect(url_for('login_page'))
     return render_template('reserve.html', license_no=session.get('license_no'))
 
 @app.route('/my_reservations')
+@query_budget(0)
 def my_reservations_page():
     if not session.get('license_no'):
         return redirect(url_for('login_page'))
@@ -419,6 +530,7 @@ def my_reservations_page():
 
 # API endpoints
 @app.route('/api/register', methods=['POST'])
+@query_budget(6)
 def api_register():
     data = request.json
     required = ['License_No','FName','LName','Email','Address','DOB','Password','Phone']
@@ -431,46 +543,47 @@ def api_register():
     # Set User_Type to Admin if email contains admin
     user_type = 'Admin' if 'admin' in email.lower() else 'Customer'
     password = data['Password']; phone = data['Phone']
+    # Hash before taking a DB connection; the pool answers 503 when saturated
+    try:
+        hashed = hash_pool.hash_password(password)
+    except HashPoolBusy as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
+    conn = get_db_connection()
+    cur = conn.cursor()
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        print(f"Inserting user with license: {license_no}")  # Debug log
-        
         # Insert into User
         cur.execute("""INSERT INTO User (License_No, FName, MName, LName, Email, Address, DOB, User_Type)
                        VALUES (%s,%s,%s,%s,%s,%s,%s,%s)""",
                     (license_no,fname,mname,lname,email,address,dob,user_type))
-        print("User inserted successfully")  # Debug log
-        
+
         # Insert credential with hashed password
-        hashed = generate_password_hash(password)
         cur.execute("""INSERT INTO User_Credential (Password, Year_Of_Membership, License_No)
                        VALUES (%s, YEAR(CURDATE()), %s)""", (hashed, license_no))
-        print("Credentials inserted successfully")  # Debug log
-        
+
         # Insert phone
         cur.execute("""INSERT INTO User_Phone (License_No, Phone) VALUES (%s,%s)""", (license_no, phone))
-        print("Phone inserted successfully")  # Debug log
-        
+
         # Verify the insertion
         cur.execute("SELECT License_No FROM User WHERE License_No = %s", (license_no,))
         if cur.fetchone():
-            print("User verified in database")  # Debug log
+            app.logger.debug("Registered a new %s user", user_type)
+            stats.record_user_added(conn)
             conn.commit()
             return jsonify({'message':'registered'}), 201
         else:
-            print("User not found after insertion!")  # Debug log
+            app.logger.warning("Registration failed: user row missing after insert")
             conn.rollback()
             return jsonify({'error': 'User creation failed'}), 500
             
     except Exception as e:
-        print(f"Error during registration: {str(e)}")  # Debug log
+        app.logger.warning("Registration failed (%s)", type(e).__name__)
         conn.rollback()
         return jsonify({'error': str(e)}), 500
     finally:
         cur.close(); conn.close()
 
 @app.route('/api/login', methods=['POST'])
+@query_budget(2, round_trips=3)
 def api_login():
     data = request.json
     password = data.get('Password')
@@ -479,10 +592,9 @@ def api_login():
     if not password:
         return jsonify({'error':'Password is required'}), 400
 
+    conn = get_db_connection()
+    cur = conn.cursor(dictionary=True)
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(dictionary=True)
-        
         if is_admin:
             email = data.get('Email')
             if not email:
@@ -490,20 +602,16 @@ def api_login():
             
             # Find user by email for admin login
             cur.execute("""
-                SELECT u.License_No, u.User_Type, u.FName, u.Email, uc.Password 
+                SELECT u.License_No, u.User_Type, u.FName, u.Email, uc.Password, COALESCE(uv.Version, 0) AS Version
                 FROM User u 
                 JOIN User_Credential uc ON u.License_No = uc.License_No 
+                LEFT JOIN User_Version uv ON uv.License_No = u.License_No
                 WHERE u.Email=%s AND u.User_Type='Admin'
             """, (email,))
             user = cur.fetchone()
             
             if not user:
                 return jsonify({'error':'Invalid admin credentials'}), 401
-            
-            license_no = user['License_No']
-            stored = user['Password']
-            session['name'] = user['FName']
-            session['email'] = user['Email']
         else:
             license_no = data.get('License_No')
             if not license_no:
@@ -511,87 +619,121 @@ def api_login():
             
             # Find user by license
             cur.execute("""
-                SELECT u.License_No, u.FName, u.Email, uc.Password
+                SELECT u.License_No, u.User_Type, u.FName, u.Email, uc.Password, COALESCE(uv.Version, 0) AS Version
                 FROM User u
                 JOIN User_Credential uc ON u.License_No = uc.License_No
+                LEFT JOIN User_Version uv ON uv.License_No = u.License_No
                 WHERE u.License_No = %s
             """, (license_no,))
             user = cur.fetchone()
             
             if not user:
                 return jsonify({'error':'Invalid license or password'}), 401
-            
-            stored = user['Password']
-            session['name'] = user['FName']
-            session['email'] = user['Email']
-        
-        # Check password
-        ok = False
-        try:
-            ok = check_password_hash(stored, password)
-        except Exception:
-            ok = (stored == password)
-        
-        if ok:
-            session['license_no'] = license_no
-            return jsonify({'message':'ok'}), 200
-        else:
-            return jsonify({'error':'Invalid credentials'}), 401
-            
     except Exception as e:
-        print(f"Login error: {str(e)}")  # Debug log
+        app.logger.warning("Login lookup failed (%s)", type(e).__name__)
         return jsonify({'error': 'An error occurred during login'}), 500
     finally:
+        # Released before hashing so slow checks don't hold DB connections
         cur.close()
         conn.close()
 
+    # Check password off-thread; also upgrades hashes made with an old method or cost
+    try:
+        ok, new_hash = hash_pool.verify_password(user['Password'], password)
+    except HashPoolBusy as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
+
+    if not ok:
+        return jsonify({'error':'Invalid credentials'}), 401
+
+    license_no = user['License_No']
+    if new_hash:
+        try:
+            with get_db_connection() as conn:
+                cur = conn.cursor()
+                cur.execute("UPDATE User_Credential SET Password=%s WHERE License_No=%s AND Password=%s",
+                            (new_hash, license_no, user['Password']))
+                conn.commit()
+                cur.close()
+        except Exception as e:
+            # the old hash still works; try again next login
+            app.logger.warning("Password rehash failed (%s)", type(e).__name__)
+    # Start from an empty session under a fresh sid: nothing from before login
+    # carries over, and a sid fixed on the browser beforehand stops working
+    session.clear()
+    session['name'] = user['FName']
+    session['email'] = user['Email']
+    session['license_no'] = license_no
+    remember_role(session, license_no, user['User_Type'], user['Version'])
+    app.session_interface.regenerate(session)
+    return jsonify({'message':'ok'}), 200
+
 
 @app.route('/api/users/current', methods=['GET'])
+@query_budget(2)
 def api_users_current():
     license_no = session.get('license_no')
     if not license_no:
         return jsonify({'error': 'Not authenticated'}), 401
     conn = get_db_connection(); cur = conn.cursor(dictionary=True)
     try:
+        # A matching If-None-Match costs one User_Version lookup
+        etag = user_etag(license_no, user_version(conn, license_no))
+        if check_not_modified(etag):
+            return not_modified(etag)
         cur.execute("SELECT License_No, FName, LName, Email, Address, DOB, User_Type FROM User WHERE License_No=%s", (license_no,))
         user = cur.fetchone()
         if not user:
             return jsonify({'error':'User not found'}), 404
-        return jsonify(user)
+        return tag_response(jsonify(user), etag)
     finally:
         cur.close(); conn.close()
 
 @app.route('/api/logout', methods=['POST'])
+@query_budget(0)
 def api_logout():
-    session.pop('license_no', None)
+    # An emptied session has its stored row and cookie deleted on save
+    session.clear()
     return jsonify({'message':'logged out'})
 
 @app.route('/api/cars/available', methods=['GET'])
+@query_budget(1)
 def api_available_cars_by_date():
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    conn = get_db_connection()
-    cur = conn.cursor(dictionary=True)
-    query = """
-        SELECT c.VIN, c.Model, c.Car_Type, c.Color, ct.Daily_Rate, c.Status, c.Year
-        FROM Car c
-        JOIN Car_Type ct ON c.Car_Type = ct.Car_Type
-        WHERE c.Status = 'Available'
-        AND c.VIN NOT IN (
-            SELECT r.VIN FROM Reservation r
-            WHERE r.Status IN ('Pending','Confirmed')
-              AND r.Start_Date <= %s AND r.End_Date >= %s
-        )
-    """
-    cur.execute(query, (end_date, start_date))
-    cars = cur.fetchall()
-    cur.close()
-    conn.close()
+    try:
+        start_date = date.fromisoformat(request.args.get('start_date', ''))
+        end_date = date.fromisoformat(request.args.get('end_date', ''))
+    except ValueError:
+        return jsonify({'error':'start_date and end_date must be YYYY-MM-DD'}), 400
+    try:
+        locations = location_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    cars = available_cars(start_date, end_date, check=app.config['AVAILABILITY_CONSISTENCY_CHECK'],
+                          locations=locations)
     return jsonify(cars)
 
+@app.route('/api/cars/calendar', methods=['GET'])
+@query_budget(1)
+def api_cars_calendar():
+    # ?from=YYYY-MM-DD (default today)&days=N (default 30)&car_type=... plus the
+    # location filters
+    try:
+        start = date.fromisoformat(request.args['from']) if request.args.get('from') else date.today()
+        days = int(request.args.get('days', 30))
+    except ValueError:
+        return jsonify({'error':'from must be YYYY-MM-DD and days a whole number'}), 400
+    if not 1 <= days <= CALENDAR_MAX_DAYS:
+        return jsonify({'error':f'days must be between 1 and {CALENDAR_MAX_DAYS}'}), 400
+    try:
+        locations = location_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(availability_calendar(start, days, request.args.get('car_type') or None, locations))
+
 
 
 @app.route('/api/reservations/add', methods=['POST'])
+@query_budget(6)
 def api_add_reservation():
     data = request.json
     license_no = data.get('License_No')
@@ -599,30 +741,24 @@ def api_add_reservation():
     start_d = data.get('Start_Date')
     end_d = data.get('End_Date')
     insurance = data.get('Insurance_Type')
-    # ... your existing validation
-
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        # (User creation logic omitted for brevity)
+        start_d, end_d = parse_dates(start_d, end_d)
+    except ValueError:
+        return jsonify({'error':'Start_Date and End_Date must be YYYY-MM-DD'}), 400
 
-        # Call stored procedure AddReservation
-        cur.callproc('AddReservation', [license_no, vin, start_d, end_d, insurance])
+    conn = get_db_connection()
+    try:
+        # One CALL locks the car, checks overlaps, prices and returns the new row
+        reservation = book_reservation(conn, license_no, vin, start_d, end_d, insurance)
+        stats.record_reservation_change(conn, None, reservation)
+        outbox.reservation_changed(conn, None, reservation)
         conn.commit()
-
-        # Get the created reservation ID
-        cur.execute("""
-            SELECT Reservation_ID FROM Reservation 
-            WHERE License_No = %s AND VIN = %s 
-            ORDER BY Reservation_ID DESC LIMIT 1
-        """, (license_no, vin))
-        reservation = cur.fetchone()
+        availability_index.add(reservation['Reservation_ID'], vin, start_d, end_d)
 
         # Return reservation ID and redirect URL for payment page
         return jsonify({
             'message': 'reservation_added',
-            'reservation_id': reservation[0],
+            'reservation_id': reservation['Reservation_ID'],
             'payment_url': url_for('payment_page')
         }), 200
 
@@ -630,23 +766,73 @@ def api_add_reservation():
         conn.rollback()
         return jsonify({'error': str(e)}), 500
     finally:
-        cur.close()
         conn.close()
 
 
+@app.route('/api/reservations/batch', methods=['POST'])
+@query_budget(12, round_trips=14)  # two-row batch: 10 + one INSERT per row; rollback + commit
+@admin_required
+def api_batch_reservations():
+    data = request.json or {}
+    rows = data.get('reservations')
+    if not isinstance(rows, list) or not rows:
+        return jsonify({'error':'reservations must be a non-empty list'}), 400
+    if len(rows) > BATCH_MAX_ROWS:
+        return jsonify({'error':f'At most {BATCH_MAX_ROWS} reservations per batch'}), 400
+    results = book_batch(rows)
+    succeeded = sum(1 for r in results if r['ok'])
+    return jsonify({
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'results': results
+    }), 200
+
+
+@app.route('/api/quotes', methods=['POST'])
+@query_budget(2)
+def api_quotes():
+    # Prices every VIN x insurance type x date range in one call
+    data = request.json or {}
+    vins = data.get('VINs') or []
+    insurance_types = data.get('Insurance_Types') or []
+    try:
+        ranges = [(date.fromisoformat(r['Start_Date']), date.fromisoformat(r['End_Date']))
+                  for r in data.get('Ranges') or []]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error':'Ranges must be a list of {Start_Date, End_Date} in YYYY-MM-DD'}), 400
+    if not vins or not ranges:
+        return jsonify({'error':'VINs and Ranges are required'}), 400
+    if len(vins) * max(len(insurance_types), 1) * len(ranges) > QUOTE_MAX_CELLS:
+        return jsonify({'error':f'At most {QUOTE_MAX_CELLS} quotes per request'}), 400
+    try:
+        return jsonify(quote_cars(vins, insurance_types, ranges))
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
+
+
 @app.route('/api/my_reservations', methods=['GET'])
+@query_budget(2)
 def api_my_reservations():
     license_no = session.get('license_no') or request.args.get('license_no')
     if not license_no:
         return jsonify({'error':'Not logged in'}), 401
-    conn = get_db_connection(); cur = conn.cursor(dictionary=True)
-    cur.execute("""SELECT r.Reservation_ID, r.Start_Date, r.End_Date, r.Status, r.Total_Amount, c.Model
-                   FROM Reservation r JOIN Car c ON r.VIN = c.VIN WHERE r.License_No=%s ORDER BY r.Reservation_ID DESC""", (license_no,))
-    rows = cur.fetchall()
-    cur.close(); conn.close()
-    return jsonify(rows)
+    try:
+        limit, after = page_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    # Replica reads; a session that just booked, paid or cancelled is pinned
+    # to the primary, so it always sees its own change
+    with get_db_connection(read_only=True) as conn:
+        etag = user_etag(license_no, user_version(conn, license_no))
+    if check_not_modified(etag):
+        return not_modified(etag)
+    sql, params = keyset_query("""SELECT r.Reservation_ID, r.Start_Date, r.End_Date, r.Status, r.Total_Amount, c.Model
+                   FROM Reservation r JOIN Car c ON r.VIN = c.VIN""",
+                               'r.Reservation_ID', limit, after, where='r.License_No=%s', params=(license_no,))
+    return tag_response(stream_page(sql, params, 'Reservation_ID', limit, read_only=True), etag)
 
 @app.route('/payment')
+@query_budget(0)
 def payment_page():
     if not session.get('license_no'):
         return redirect(url_for('login_page'))
@@ -654,66 +840,87 @@ def payment_page():
 
 
 @app.route('/api/payments/add', methods=['POST'])
+@query_budget(10)
 def api_payments_add():
     data = request.json or {}
-    amount = data.get('Amount')
-    card_no = data.get('Card_No')
-    name_on_card = data.get('Name_on_Card')
-    expiry = data.get('Expiry_Date')
-    cvv = data.get('CVV')
-    billing = data.get('Billing_Address')
-    paid_by_cash = data.get('Paid_By_Cash', False)
+    paid_by_cash = bool(data.get('Paid_By_Cash', False))
     reservation_id = data.get('Reservation_ID')
-
-    conn = get_db_connection()
-    cur = conn.cursor()
     try:
-        # Try to insert into Payment table if it exists
+        amount = Decimal(str(data.get('Amount')))
+    except InvalidOperation:
+        return jsonify({'error':'Amount must be a number'}), 400
+    if not amount.is_finite() or amount <= 0:
+        return jsonify({'error':'Amount must be a positive number'}), 400
+    card = None
+    if not paid_by_cash:
+        fields = ('Card_No', 'Name_on_Card', 'Expiry_Date', 'CVV', 'Billing_Address')
+        missing = [f for f in fields if not data.get(f)]
+        if missing:
+            return jsonify({'error': f'Missing {missing[0]}'}), 400
+        card = tuple(data[f] for f in fields)
+    # A card is filed under the payer's login, and only the reservation's
+    # owner may pay for (and so confirm) it
+    license_no = session.get('license_no')
+    if (card or reservation_id) and not license_no:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    with get_db_connection() as conn:
+        cur = conn.cursor()
         try:
+            before = None
+            if reservation_id:
+                before = stats.fetch_reservation(conn, reservation_id)
+                if not before:
+                    return jsonify({'error':'Reservation not found'}), 404
+                if before['License_No'] != license_no:
+                    return jsonify({'error':'Reservation belongs to another user'}), 403
+            if card:
+                # Payment.Card_No references Card_Details: file the card under the
+                # paying user's login first (a known card keeps its stored details)
+                cur.execute("""
+                    INSERT INTO Card_Details (Card_No, Login_ID, Name_on_Card, Expiry_Date, CVV, Billing_Address)
+                    SELECT %s, Login_ID, %s, %s, %s, %s FROM User_Credential WHERE License_No = %s
+                    ON DUPLICATE KEY UPDATE Card_No = Card_No
+                """, card + (license_no,))
             cur.execute("""
-                INSERT INTO Payment (Amount, Card_No, Name_on_Card, Expiry_Date, CVV, Billing_Address, Paid_By_Cash, Reservation_ID, Payment_Date)
-                VALUES (%s,%s,%s,%s,%s,%s,%s,%s, NOW())
-            """, (amount, card_no, name_on_card, expiry, cvv, billing, int(bool(paid_by_cash)), reservation_id))
-        except Exception:
-            # If Payment table/columns differ, attempt minimal insert into a generic table or skip
-            pass
-
-        # If reservation id is provided, mark it as Confirmed and set Total_Amount
+                INSERT INTO Payment (Amount, Card_No, Name_on_Card, Expiry_Date, CVV, Billing_Address, Paid_By_Cash)
+                VALUES (%s,%s,%s,%s,%s,%s,%s)
+            """, (amount,) + (card or (None,) * 5) + (int(paid_by_cash),))
+            # The event and rollup writes commit with the payment or not at all
+            events = [outbox.payment_event(reservation_id, cur.lastrowid, amount, paid_by_cash)]
+            if before:
+                cur.execute("UPDATE Reservation SET Status='Confirmed', Total_Amount=%s WHERE Reservation_ID=%s",
+                            (amount, reservation_id))
+                after = dict(before, Status='Confirmed', Total_Amount=amount)
+                stats.record_reservation_change(conn, before, after)
+                events.append(outbox.reservation_event(before, after))
+            outbox.emit_many(conn, events)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            app.logger.warning("Payment failed (%s)", type(e).__name__)
+            return jsonify({'error': 'Payment could not be recorded'}), 500
+        finally:
+            cur.close()
         if reservation_id:
-            try:
-                cur.execute("UPDATE Reservation SET Status='Confirmed', Total_Amount=%s WHERE Reservation_ID=%s", (amount, reservation_id))
-            except Exception:
-                pass
-
-        conn.commit()
-        return jsonify({'message':'payment recorded'}), 200
-    except Exception as e:
-        conn.rollback()
-        return jsonify({'error': str(e)}), 500
-    finally:
-        cur.close(); conn.close()
+            availability_index.refresh_reservation(conn, reservation_id)
+    return jsonify({'message':'payment recorded'}), 200
 
 @app.route('/api/cars', methods=['GET'])
+@query_budget(1)
 def api_cars():
+    # Serialized once per catalog change (or CATALOG_TTL) and location filter,
+    # see catalog.py
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(dictionary=True)
-        print("Fetching cars from database...")  # Debug log
-        
-        cur.execute("""
-          SELECT c.VIN, c.Model, c.Car_Type, c.Color, ct.Daily_Rate, c.Status, c.Year
-          FROM Car c JOIN Car_Type ct ON c.Car_Type = ct.Car_Type
-        """)
-        rows = cur.fetchall()
-        print(f"Found {len(rows)} cars")  # Debug log
-        
-        return jsonify(rows)
-    except Exception as e:
-        print(f"Error fetching cars: {str(e)}")  # Debug log
-        return jsonify({"error": str(e)}), 500
-    finally:
-        cur.close()
-        conn.close()
+        locations = location_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return cached_json(location_key('cars', locations), lambda: fleet_for(locations))
+
+@app.route('/api/locations', methods=['GET'])
+@query_budget(1)
+def api_locations():
+    return cached_json('locations', locations_summary)
 
 
 if __name__ == '__main__':
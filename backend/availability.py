@@ -0,0 +1,296 @@
+import base64
+import os
+import threading
+import time
+from bisect import bisect_right
+from datetime import date, timedelta
+import numpy as np
+from catalog import fleet_for
+from db import get_db_connection
+
+ACTIVE_STATUSES = ('Pending', 'Confirmed')
+
+# The original anti-join; still used for past date ranges and for consistency
+# checks. _location_clause() can narrow it to some branches.
+AVAILABLE_QUERY = """
+    SELECT c.VIN, c.Model, c.Car_Type, c.Color, ct.Daily_Rate, c.Status, c.Year,
+           c.Rental_Location_ID, l.State, l.Zip_Code
+    FROM Car c
+    JOIN Car_Type ct ON c.Car_Type = ct.Car_Type
+    JOIN Rental_Location l ON c.Rental_Location_ID = l.Rental_Location_ID
+    WHERE c.Status = 'Available'
+    AND c.VIN NOT IN (
+        SELECT r.VIN FROM Reservation r
+        WHERE r.Status IN ('Pending','Confirmed')
+          AND r.Start_Date <= %s AND r.End_Date >= %s
+    )
+"""
+
+
+class AvailabilityMismatch(AssertionError):
+    pass
+
+
+def _as_date(value):
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value))
+
+
+class AvailabilityIndex:
+    # Per-VIN sorted start/end arrays of Pending/Confirmed reservations.
+    # The BI/BU_Reservation_NoOverlap triggers guarantee that active bookings of
+    # one car never overlap, so sorting by start also sorts the ends and a single
+    # bisect answers "is this car booked anywhere in [start, end]".
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._by_vin = {}
+        self._by_id = {}
+        self._horizon = None
+        self._loaded_at = 0.0
+        self._columns = None
+        self._counters = {'loads': 0, 'lookups': 0, 'fallbacks': 0, 'adds': 0, 'removes': 0}
+
+    def _load(self):
+        today = date.today()
+        by_vin = {}
+        by_id = {}
+        # Reservations that ended before today can never collide with a search
+        # starting today or later, so they are left out of memory entirely.
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT Reservation_ID, VIN, Start_Date, End_Date FROM Reservation
+                WHERE Status IN ('Pending','Confirmed') AND End_Date >= %s
+                ORDER BY VIN, Start_Date
+            """, (today,))
+            for res_id, vin, start, end in cur:
+                starts, ends, ids = by_vin.setdefault(vin, ([], [], []))
+                starts.append(start); ends.append(end); ids.append(res_id)
+                by_id[res_id] = (vin, start, end)
+            cur.close()
+        self._by_vin = by_vin
+        self._by_id = by_id
+        self._horizon = today
+        self._loaded_at = time.monotonic()
+        self._columns = None
+        self._counters['loads'] += 1
+
+    def _ensure_loaded(self):
+        if self._horizon is None or time.monotonic() - self._loaded_at >= self.ttl:
+            self._load()
+
+    def covers(self, start):
+        with self._lock:
+            self._ensure_loaded()
+            if start >= self._horizon:
+                return True
+            self._counters['fallbacks'] += 1
+            return False
+
+    def booked_vins(self, start, end, vins=None):
+        # vins limits the check to those cars (one branch's fleet, say)
+        with self._lock:
+            self._ensure_loaded()
+            self._counters['lookups'] += 1
+            booked = set()
+            if vins is None:
+                entries = self._by_vin.items()
+            else:
+                entries = [(vin, self._by_vin[vin]) for vin in vins if vin in self._by_vin]
+            for vin, (starts, ends, _) in entries:
+                i = bisect_right(starts, end)
+                if i and ends[i - 1] >= start:
+                    booked.add(vin)
+            return booked
+
+    def columns(self):
+        # The indexed bookings as NumPy arrays (VIN list, per-booking VIN code,
+        # start and end day ordinals) for vectorized range scans. Rebuilt on
+        # first use after a load, add or remove.
+        with self._lock:
+            self._ensure_loaded()
+            self._counters['lookups'] += 1
+            if self._columns is None:
+                vins = list(self._by_vin)
+                code_of = {vin: i for i, vin in enumerate(vins)}
+                n = len(self._by_id)
+                entries = self._by_id.values()
+                self._columns = (
+                    vins,
+                    np.fromiter((code_of[vin] for vin, _, _ in entries), dtype=np.int64, count=n),
+                    np.fromiter((start.toordinal() for _, start, _ in entries), dtype=np.int64, count=n),
+                    np.fromiter((end.toordinal() for _, _, end in entries), dtype=np.int64, count=n),
+                )
+            return self._columns
+
+    def add(self, reservation_id, vin, start, end):
+        start, end = _as_date(start), _as_date(end)
+        with self._lock:
+            if self._horizon is None:
+                return
+            self._remove(reservation_id)
+            if end < self._horizon:
+                return
+            starts, ends, ids = self._by_vin.setdefault(vin, ([], [], []))
+            i = bisect_right(starts, start)
+            starts.insert(i, start); ends.insert(i, end); ids.insert(i, reservation_id)
+            self._by_id[reservation_id] = (vin, start, end)
+            self._columns = None
+            self._counters['adds'] += 1
+
+    def _remove(self, reservation_id):
+        entry = self._by_id.pop(reservation_id, None)
+        if entry is None:
+            return
+        starts, ends, ids = self._by_vin[entry[0]]
+        i = ids.index(reservation_id)
+        del starts[i]; del ends[i]; del ids[i]
+        self._columns = None
+        self._counters['removes'] += 1
+
+    def remove(self, reservation_id):
+        with self._lock:
+            self._remove(reservation_id)
+
+    def refresh_reservation(self, conn, reservation_id):
+        # Re-read one reservation after a status change made by a stored procedure
+        # or UPDATE, and add or drop it depending on whether it still blocks the car.
+        cur = conn.cursor()
+        cur.execute("SELECT VIN, Start_Date, End_Date, Status FROM Reservation WHERE Reservation_ID=%s",
+                    (reservation_id,))
+        row = cur.fetchone()
+        cur.close()
+        if row and row[3] in ACTIVE_STATUSES:
+            self.add(reservation_id, row[0], row[1], row[2])
+        else:
+            self.remove(reservation_id)
+
+    def invalidate(self):
+        with self._lock:
+            self._horizon = None
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._counters)
+            data['cars_indexed'] = len(self._by_vin)
+            data['reservations_indexed'] = len(self._by_id)
+            data['horizon'] = self._horizon.isoformat() if self._horizon else None
+        return data
+
+
+availability_index = AvailabilityIndex(ttl=float(os.getenv('AVAILABILITY_INDEX_TTL','300')))
+
+
+def _location_clause(column, locations):
+    # SQL condition and params restricting column to the given location IDs
+    if locations is None:
+        return '', ()
+    if not locations:
+        return ' AND FALSE', ()
+    return f" AND {column} IN ({', '.join(['%s'] * len(locations))})", tuple(locations)
+
+
+def apply_reservation_events(events):
+    # Outbox subscriber (outbox.py): keeps this process's index in step with
+    # bookings, payments and cancellations made by other processes. Events this
+    # process made itself were already applied after commit; replaying them is
+    # a no-op.
+    for event in events:
+        before, after = event['Payload']['before'], event['Payload']['after']
+        if after and after['Status'] in ACTIVE_STATUSES:
+            availability_index.add(after['Reservation_ID'], after['VIN'], after['Start_Date'], after['End_Date'])
+        else:
+            availability_index.remove((after or before)['Reservation_ID'])
+
+
+def _query_available(start, end, locations=None):
+    clause, params = _location_clause('c.Rental_Location_ID', locations)
+    with get_db_connection() as conn:
+        cur = conn.cursor(dictionary=True)
+        cur.execute(AVAILABLE_QUERY + clause, (end, start) + params)
+        rows = cur.fetchall()
+        cur.close()
+    return rows
+
+
+def available_cars(start, end, check=False, locations=None):
+    # locations: Rental_Location_IDs to search (catalog.match_locations), None for all
+    start, end = _as_date(start), _as_date(end)
+    if not availability_index.covers(start):
+        return _query_available(start, end, locations)
+    fleet = fleet_for(locations)
+    booked = availability_index.booked_vins(start, end, None if locations is None else [car['VIN'] for car in fleet])
+    cars = [car for car in fleet if car['Status'] == 'Available' and car['VIN'] not in booked]
+    if check:
+        check_consistency(start, end, cars, locations)
+    return cars
+
+
+def _query_columns(start, end, locations=None):
+    # Same shape as AvailabilityIndex.columns(), for ranges before its horizon
+    clause, params = _location_clause('c.Rental_Location_ID', locations)
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT r.VIN, r.Start_Date, r.End_Date FROM Reservation r
+            JOIN Car c ON r.VIN = c.VIN
+            WHERE r.Status IN ('Pending','Confirmed') AND r.Start_Date <= %s AND r.End_Date >= %s
+        """ + clause, (end, start) + params)
+        rows = cur.fetchall()
+        cur.close()
+    vins = list({vin for vin, _, _ in rows})
+    code_of = {vin: i for i, vin in enumerate(vins)}
+    return (vins,
+            np.array([code_of[vin] for vin, _, _ in rows], dtype=np.int64),
+            np.array([s.toordinal() for _, s, _ in rows], dtype=np.int64),
+            np.array([e.toordinal() for _, _, e in rows], dtype=np.int64))
+
+
+def calendar(start, days, car_type=None, locations=None):
+    # Free/booked bitmap per car for days [start, start + days). Each booking
+    # in range adds +1 on its first day and -1 after its last one in a flat
+    # (cars x days+1) step array; a running sum along each row is then 0 on
+    # free days. np.packbits turns the rows into one block of ceil(days/8)
+    # bytes per car, in the order of 'cars': bit i of a car's bytes (most
+    # significant first) is set when the car is free on start + i.
+    start = _as_date(start)
+    end = start + timedelta(days=days - 1)
+    cars = [car for car in fleet_for(locations) if car['Status'] == 'Available'
+            and (car_type is None or car['Car_Type'] == car_type)]
+    row_of = {car['VIN']: i for i, car in enumerate(cars)}
+    if availability_index.covers(start):
+        vins, codes, starts, ends = availability_index.columns()
+    else:
+        vins, codes, starts, ends = _query_columns(start, end, locations)
+
+    base = start.toordinal()
+    row_for_code = np.array([row_of.get(vin, -1) for vin in vins], dtype=np.int64)
+    hit = (starts <= end.toordinal()) & (ends >= base)
+    rows = row_for_code[codes[hit]]
+    keep = rows >= 0
+    width = days + 1
+    rows = rows[keep] * width
+    size = len(cars) * width
+    steps = (np.bincount(rows + np.clip(starts[hit][keep] - base, 0, days), minlength=size)
+             - np.bincount(rows + np.clip(ends[hit][keep] - base + 1, 0, days), minlength=size))
+    free = np.cumsum(steps.reshape(len(cars), width)[:, :days], axis=1) == 0
+    return {
+        'from': start.isoformat(),
+        'days': days,
+        'bytes_per_car': (days + 7) // 8,
+        'bitmap': base64.b64encode(np.packbits(free, axis=1).tobytes()).decode('ascii'),
+        'cars': [{'VIN': car['VIN'], 'Car_Type': car['Car_Type'], 'free_days': free_days}
+                 for car, free_days in zip(cars, free.sum(axis=1).tolist())],
+    }
+
+
+def check_consistency(start, end, cars, locations=None):
+    expected = {row['VIN'] for row in _query_available(start, end, locations)}
+    actual = {car['VIN'] for car in cars}
+    if expected != actual:
+        raise AvailabilityMismatch(
+            f'Availability index disagrees with DB for {start}..{end}: '
+            f'missing={sorted(expected - actual)} extra={sorted(actual - expected)}'
+        )
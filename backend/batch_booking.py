@@ -0,0 +1,205 @@
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from availability import availability_index
+from db import get_db_connection
+import outbox
+import stats
+
+REQUIRED = ('License_No', 'VIN', 'Start_Date', 'End_Date', 'Insurance_Type')
+CHUNK_SIZE = 100
+RESERVED = 'Car already reserved for selected dates'
+
+INSERT_RESERVATION = """
+    INSERT INTO Reservation (
+        License_No, VIN, Start_Date, End_Date, Meter_Start,
+        Rental_Amount, Insurance_Amount, Total_Amount, Insurance_Type, Status
+    ) VALUES (%s, %s, %s, %s, 0, %s, %s, %s, %s, 'Confirmed')
+"""
+
+
+def _placeholders(values):
+    return ','.join(['%s'] * len(values))
+
+
+def _parse(index, raw):
+    missing = [f for f in REQUIRED if not raw.get(f)]
+    if missing:
+        raise ValueError(f'Missing {missing[0]}')
+    start = date.fromisoformat(str(raw['Start_Date']))
+    end = date.fromisoformat(str(raw['End_Date']))
+    if end < start:
+        raise ValueError('End date cannot be before start date')
+    return {
+        'row': index,
+        'License_No': raw['License_No'],
+        'VIN': raw['VIN'],
+        'Start_Date': start,
+        'End_Date': end,
+        'Insurance_Type': raw['Insurance_Type'],
+    }
+
+
+def _load_rates(cur, vins):
+    # Same lookups AddReservation/CalculateTotalCost do per booking, once per batch
+    cur.execute(f"""
+        SELECT c.VIN, c.Car_Type, ct.Daily_Rate
+        FROM Car c JOIN Car_Type ct ON c.Car_Type = ct.Car_Type
+        WHERE c.VIN IN ({_placeholders(vins)})
+    """, list(vins))
+    cars = {vin: (car_type, rate) for vin, car_type, rate in cur.fetchall()}
+    car_types = {car_type for car_type, _ in cars.values()}
+    insurance = {}
+    if car_types:
+        cur.execute(f"""
+            SELECT Car_Type, Insurance_Type, Insurance_Price FROM Insurance_Price
+            WHERE Car_Type IN ({_placeholders(car_types)})
+        """, list(car_types))
+        insurance = {(ct, it): price for ct, it, price in cur.fetchall()}
+    return cars, insurance
+
+
+def _load_booked(cur, vins, first, last, lock=False):
+    # lock=True reads the latest committed rows (and locks them) rather than
+    # the transaction's snapshot; use it once the cars are locked
+    cur.execute(f"""
+        SELECT VIN, Start_Date, End_Date FROM Reservation
+        WHERE VIN IN ({_placeholders(vins)})
+          AND Status IN ('Pending','Confirmed')
+          AND Start_Date <= %s AND End_Date >= %s
+    """ + (" FOR UPDATE" if lock else ""), list(vins) + [last, first])
+    booked = defaultdict(list)
+    for vin, start, end in cur.fetchall():
+        booked[vin].append((start, end))
+    return booked
+
+
+def _price(item, cars, insurance):
+    car = cars.get(item['VIN'])
+    if car is None:
+        raise ValueError('Car not found')
+    car_type, daily_rate = car
+    days = (item['End_Date'] - item['Start_Date']).days + 1
+    ins_rate = insurance.get((car_type, item['Insurance_Type']), Decimal('0.00'))
+    item['Car_Type'] = car_type
+    item['Rental_Amount'] = daily_rate * days
+    item['Insurance_Amount'] = ins_rate * days
+    item['Total_Amount'] = days * (daily_rate + ins_rate)
+
+
+def _lock_cars(cur, vins):
+    # Same per-car row lock BookReservation takes, so the overlap trigger cannot
+    # race a concurrent single booking; sorted to keep lock order consistent
+    vins = sorted(vins)
+    cur.execute(f"SELECT VIN FROM Car WHERE VIN IN ({_placeholders(vins)}) ORDER BY VIN FOR UPDATE", vins)
+    cur.fetchall()
+
+
+def _overlaps(item, taken):
+    return any(s <= item['End_Date'] and e >= item['Start_Date'] for s, e in taken)
+
+
+def _lock_and_recheck(cur, items):
+    # Locks the cars, then re-runs the overlap check against committed rows:
+    # the pre-check ran before the locks, so a concurrent booking may have
+    # taken a slot since. Returns (still free, taken since the pre-check).
+    vins = {item['VIN'] for item in items}
+    _lock_cars(cur, vins)
+    booked = _load_booked(cur, vins, min(item['Start_Date'] for item in items),
+                          max(item['End_Date'] for item in items), lock=True)
+    free, taken = [], []
+    for item in items:
+        (taken if _overlaps(item, booked[item['VIN']]) else free).append(item)
+    return free, taken
+
+
+def _insert(cur, item):
+    cur.execute(INSERT_RESERVATION, (
+        item['License_No'], item['VIN'], item['Start_Date'], item['End_Date'],
+        item['Rental_Amount'], item['Insurance_Amount'], item['Total_Amount'], item['Insurance_Type'],
+    ))
+    item['Reservation_ID'] = cur.lastrowid
+
+
+def _stats_row(item):
+    return {'License_No': item['License_No'], 'Start_Date': item['Start_Date'], 'End_Date': item['End_Date'],
+            'Car_Type': item['Car_Type'], 'Status': 'Confirmed', 'Total_Amount': item['Total_Amount']}
+
+
+def _event_row(item):
+    return dict(_stats_row(item), Reservation_ID=item['Reservation_ID'], VIN=item['VIN'])
+
+
+def book_batch(rows, chunk_size=CHUNK_SIZE):
+    # Validates, prices and overlap-checks every row up front, then inserts the
+    # survivors chunk_size rows per transaction. Returns one result per input row.
+    results = [None] * len(rows)
+    pending = []
+    for i, raw in enumerate(rows):
+        try:
+            pending.append(_parse(i, raw or {}))
+        except (ValueError, TypeError, AttributeError) as e:
+            results[i] = {'row': i, 'ok': False, 'error': str(e)}
+    if not pending:
+        return results
+
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        vins = {item['VIN'] for item in pending}
+        cars, insurance = _load_rates(cur, vins)
+        booked = _load_booked(cur, vins,
+                              min(item['Start_Date'] for item in pending),
+                              max(item['End_Date'] for item in pending))
+
+        # Rows are accepted in input order; each one also blocks later rows in the batch
+        accepted = []
+        for item in pending:
+            try:
+                _price(item, cars, insurance)
+                taken = booked[item['VIN']]
+                if _overlaps(item, taken):
+                    raise ValueError(RESERVED)
+                taken.append((item['Start_Date'], item['End_Date']))
+                accepted.append(item)
+            except ValueError as e:
+                results[item['row']] = {'row': item['row'], 'ok': False, 'error': str(e)}
+        # end the pre-check snapshot; each chunk re-checks under its car locks
+        conn.rollback()
+
+        for n in range(0, len(accepted), chunk_size):
+            chunk = accepted[n:n + chunk_size]
+            try:
+                chunk, lost = _lock_and_recheck(cur, chunk)
+                for item in lost:
+                    results[item['row']] = {'row': item['row'], 'ok': False, 'error': RESERVED}
+                for item in chunk:
+                    _insert(cur, item)
+                stats.record_reservations_added(conn, [_stats_row(item) for item in chunk])
+                outbox.reservations_created(conn, [_event_row(item) for item in chunk])
+                conn.commit()
+                inserted = chunk
+            except Exception:
+                # Something changed under us (concurrent booking, missing user or
+                # insurance type); redo this chunk one row per transaction so
+                # only the offending rows fail.
+                conn.rollback()
+                inserted = []
+                for item in chunk:
+                    try:
+                        if not _lock_and_recheck(cur, [item])[0]:
+                            raise ValueError(RESERVED)
+                        _insert(cur, item)
+                        stats.record_reservation_change(conn, None, _stats_row(item))
+                        outbox.reservation_changed(conn, None, _event_row(item))
+                        conn.commit()
+                        inserted.append(item)
+                    except Exception as e:
+                        conn.rollback()
+                        results[item['row']] = {'row': item['row'], 'ok': False, 'error': str(e)}
+            for item in inserted:
+                availability_index.add(item['Reservation_ID'], item['VIN'], item['Start_Date'], item['End_Date'])
+                results[item['row']] = {'row': item['row'], 'ok': True,
+                                        'reservation_id': item['Reservation_ID'],
+                                        'total_amount': float(item['Total_Amount'])}
+        cur.close()
+    return results
@@ -0,0 +1,119 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from admin_search import search
+from cache_versions import bump_versions
+from db import get_db_connection
+import stats
+
+# Latency of admin_search.search() (the /api/admin/search query) over a seeded
+# user table. Inserts --users synthetic users with an AS license prefix and one
+# phone each, runs --queries searches mixing name, email, phone, license and
+# VIN fragments, prints p50/p95/p99, then deletes the users again. Needs
+# migration 009's FULLTEXT indexes.
+
+PREFIX = 'AS'
+FIRST = ['Aarav', 'Vivaan', 'Aditya', 'Ishaan', 'Priya', 'Ananya', 'Diya', 'Meera', 'Rohan', 'Kavya',
+         'Arjun', 'Saanvi', 'Kabir', 'Riya', 'Vihaan', 'Aisha', 'Neel', 'Tara', 'Dev', 'Zara']
+LAST = ['Sharma', 'Verma', 'Iyer', 'Reddy', 'Nair', 'Patel', 'Gupta', 'Menon', 'Rao', 'Khan',
+        'Singh', 'Das', 'Bose', 'Pillai', 'Joshi', 'Kulkarni', 'Mehta', 'Chopra', 'Kapoor', 'Sen']
+
+
+def _seed(count, chunk=5000):
+    rng = random.Random(7)
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        for start in range(0, count, chunk):
+            users = []
+            phones = []
+            for i in range(start, min(start + chunk, count)):
+                license_no = f'{PREFIX}{i:08d}'
+                first, last = rng.choice(FIRST), rng.choice(LAST)
+                users.append((license_no, first, last, f'{first}.{last}{i}@example.invalid'.lower()))
+                phones.append((license_no, f'9{rng.randrange(10 ** 9):09d}'))
+            cur.executemany("""INSERT INTO User (License_No, FName, LName, Email, Address, DOB, User_Type)
+                               VALUES (%s, %s, %s, %s, 'n/a', '1990-01-01', 'Customer')""", users)
+            cur.executemany("INSERT INTO User_Phone (License_No, Phone) VALUES (%s, %s)", phones)
+            conn.commit()
+        cur.close()
+
+
+def _cleanup():
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        for table in ('User_Phone', 'User'):
+            while True:
+                cur.execute(f"DELETE FROM {table} WHERE License_No LIKE %s LIMIT 10000", (PREFIX + '%',))
+                conn.commit()
+                if cur.rowcount == 0:
+                    break
+        stats.rebuild(conn)
+        bump_versions(conn, ['users'])
+        conn.commit()
+        cur.close()
+
+
+def _queries(count, users):
+    rng = random.Random(11)
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT Phone FROM User_Phone WHERE License_No LIKE %s LIMIT 200", (PREFIX + '%',))
+        phones = [row[0] for row in cur.fetchall()]
+        cur.execute("SELECT VIN FROM Car LIMIT 200")
+        vins = [row[0] for row in cur.fetchall()]
+        cur.execute("SELECT MAX(Reservation_ID) FROM Reservation")
+        top = cur.fetchone()[0] or 1
+        cur.close()
+    makers = [
+        lambda: rng.choice(FIRST)[:rng.randint(2, 5)],
+        lambda: rng.choice(LAST)[1:rng.randint(3, 6)],
+        lambda: f'{rng.choice(FIRST)} {rng.choice(LAST)[:3]}',
+        lambda: f'{rng.choice(LAST).lower()}{rng.randrange(users)}@',
+        lambda: f'{PREFIX}{rng.randrange(users):08d}',
+        lambda: str(rng.randrange(1, top + 1)),
+    ]
+    if phones:
+        makers.append(lambda: rng.choice(phones)[-rng.randint(4, 7):])
+    if vins:
+        makers.append(lambda: rng.choice(vins)[rng.randint(0, 8):][:6])
+    return [rng.choice(makers)() for _ in range(count)]
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda q: samples[min(int(q * len(samples)), len(samples) - 1)] * 1000
+    return f"n={len(samples)} p50={pick(0.5):.1f}ms p95={pick(0.95):.1f}ms p99={pick(0.99):.1f}ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Admin search latency over seeded users')
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    _cleanup()
+    started = time.perf_counter()
+    _seed(args.users)
+    print(f"seeded {args.users} users in {time.perf_counter() - started:.1f}s")
+    try:
+        queries = _queries(args.queries, args.users)
+        samples = []
+        hits = 0
+        with get_db_connection() as conn:
+            for q in queries:
+                t0 = time.perf_counter()
+                hits += bool(search(conn, q, args.limit))
+                samples.append(time.perf_counter() - t0)
+        print(f"search: {_percentiles(samples)}, {hits}/{len(queries)} queries with results")
+    finally:
+        _cleanup()
+
+
+if __name__ == "__main__":
+    main()
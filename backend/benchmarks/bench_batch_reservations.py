@@ -0,0 +1,104 @@
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import get_db_connection
+from batch_booking import book_batch
+import stats
+
+# Books --rows reservations far in the future against the cars already in the
+# database, once through POST /api/reservations/batch's book_batch() and once
+# through the per-row AddReservation path, reports rows/sec for each and then
+# deletes everything it created.
+
+FAR_FUTURE = date(2200, 1, 1)
+
+
+def _fixtures(count_cars):
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT VIN FROM Car ORDER BY VIN LIMIT %s", (count_cars,))
+        vins = [r[0] for r in cur.fetchall()]
+        cur.execute("SELECT License_No FROM User LIMIT 1")
+        license_no = cur.fetchone()[0]
+        cur.execute("SELECT Insurance_Type FROM Insurance_Type LIMIT 1")
+        insurance = cur.fetchone()[0]
+        cur.close()
+    return vins, license_no, insurance
+
+
+def _rows(n, vins, license_no, insurance, offset_days):
+    rows = []
+    for i in range(n):
+        start = FAR_FUTURE + timedelta(days=offset_days + (i // len(vins)) * 3)
+        rows.append({
+            'License_No': license_no,
+            'VIN': vins[i % len(vins)],
+            'Start_Date': start.isoformat(),
+            'End_Date': (start + timedelta(days=1)).isoformat(),
+            'Insurance_Type': insurance,
+        })
+    return rows
+
+
+def _per_row(rows):
+    ids = []
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        for row in rows:
+            cur.callproc('AddReservation', [row['License_No'], row['VIN'], row['Start_Date'],
+                                            row['End_Date'], row['Insurance_Type']])
+            conn.commit()
+            cur.execute("SELECT LAST_INSERT_ID()")
+            ids.append(cur.fetchone()[0])
+        cur.close()
+    return ids
+
+
+def _cleanup(ids):
+    with get_db_connection() as conn:
+        for res_id in ids:
+            row = stats.fetch_reservation(conn, res_id)
+            if row:
+                cur = conn.cursor()
+                cur.execute("DELETE FROM Reservation WHERE Reservation_ID=%s", (res_id,))
+                cur.close()
+                stats.record_reservation_change(conn, row, None)
+        conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Batch vs per-row reservation throughput')
+    parser.add_argument('--rows', type=int, default=500)
+    parser.add_argument('--cars', type=int, default=50)
+    parser.add_argument('--chunk', type=int, default=100)
+    args = parser.parse_args()
+
+    vins, license_no, insurance = _fixtures(args.cars)
+    if not vins:
+        sys.exit('No cars in the database; load Car_rental_system.sql first')
+
+    batch_rows = _rows(args.rows, vins, license_no, insurance, 0)
+    started = time.perf_counter()
+    results = book_batch(batch_rows, chunk_size=args.chunk)
+    batch_secs = time.perf_counter() - started
+    batch_ids = [r['reservation_id'] for r in results if r['ok']]
+
+    single_rows = _rows(args.rows, vins, license_no, insurance, 100000)
+    started = time.perf_counter()
+    single_ids = _per_row(single_rows)
+    single_secs = time.perf_counter() - started
+
+    _cleanup(batch_ids + single_ids)
+
+    print(f"rows={args.rows} cars={len(vins)} chunk={args.chunk}")
+    print(f"batch:   {len(batch_ids)} ok in {batch_secs:.3f}s -> {len(batch_ids) / batch_secs:.0f} rows/s")
+    print(f"per-row: {len(single_ids)} ok in {single_secs:.3f}s -> {len(single_ids) / single_secs:.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
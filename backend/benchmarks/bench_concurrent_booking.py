@@ -0,0 +1,130 @@
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import get_db_connection
+from booking import book_reservation
+import stats
+
+# Hammers one car from --threads threads, each trying --attempts bookings of
+# 1-3 days inside a --window day range far in the future, so most attempts
+# collide. Reports bookings/sec and the number of overlapping active
+# reservations left behind (must be 0), then deletes everything it created.
+# --path trigger-only inserts without the car lock, relying on the
+# overlap trigger alone, for comparison. Set DB_POOL_SIZE to at least --threads.
+
+FAR_FUTURE = date(2300, 1, 1)
+
+
+def _fixtures():
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT VIN FROM Car ORDER BY VIN LIMIT 1")
+        car = cur.fetchone()
+        cur.execute("SELECT License_No FROM User LIMIT 1")
+        user = cur.fetchone()
+        cur.execute("SELECT Insurance_Type FROM Insurance_Type LIMIT 1")
+        insurance = cur.fetchone()
+        cur.close()
+    if not (car and user and insurance):
+        sys.exit('Need at least one car, user and insurance type; load Car_rental_system.sql first')
+    return car[0], user[0], insurance[0]
+
+
+def _insert_unlocked(conn, license_no, vin, start, end, insurance):
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO Reservation (License_No, VIN, Start_Date, End_Date, Meter_Start,
+                                 Rental_Amount, Insurance_Amount, Total_Amount, Insurance_Type, Status)
+        VALUES (%s, %s, %s, %s, 0, 0, 0, 0, %s, 'Confirmed')
+    """, (license_no, vin, start, end, insurance))
+    res_id = cur.lastrowid
+    cur.close()
+    return stats.fetch_reservation(conn, res_id)
+
+
+def _worker(book, attempts, window, vin, license_no, insurance, seed, out):
+    rng = random.Random(seed)
+    for _ in range(attempts):
+        start = FAR_FUTURE + timedelta(days=rng.randrange(window))
+        end = start + timedelta(days=rng.randrange(3))
+        with get_db_connection() as conn:
+            try:
+                row = book(conn, license_no, vin, start, end, insurance)
+                stats.record_reservation_change(conn, None, row)
+                conn.commit()
+                with out['lock']:
+                    out['ids'].append(row['Reservation_ID'])
+            except Exception:
+                conn.rollback()
+                with out['lock']:
+                    out['rejected'] += 1
+
+
+def _double_bookings(vin):
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT COUNT(*) FROM Reservation a
+            JOIN Reservation b ON a.VIN = b.VIN AND a.Reservation_ID < b.Reservation_ID
+            WHERE a.VIN = %s AND a.Start_Date >= %s AND b.Start_Date >= %s
+              AND a.Status IN ('Pending','Confirmed') AND b.Status IN ('Pending','Confirmed')
+              AND a.Start_Date <= b.End_Date AND a.End_Date >= b.Start_Date
+        """, (vin, FAR_FUTURE, FAR_FUTURE))
+        count = cur.fetchone()[0]
+        cur.close()
+    return count
+
+
+def _cleanup(ids):
+    with get_db_connection() as conn:
+        for res_id in ids:
+            row = stats.fetch_reservation(conn, res_id)
+            if row:
+                cur = conn.cursor()
+                cur.execute("DELETE FROM Reservation WHERE Reservation_ID=%s", (res_id,))
+                cur.close()
+                stats.record_reservation_change(conn, row, None)
+        conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent bookings against one car')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--attempts', type=int, default=50, help='booking attempts per thread')
+    parser.add_argument('--window', type=int, default=60, help='days the attempts are spread over')
+    parser.add_argument('--path', choices=['locked', 'trigger-only'], default='locked')
+    args = parser.parse_args()
+
+    vin, license_no, insurance = _fixtures()
+    book = book_reservation if args.path == 'locked' else _insert_unlocked
+    out = {'ids': [], 'rejected': 0, 'lock': threading.Lock()}
+    threads = [threading.Thread(target=_worker, args=(book, args.attempts, args.window, vin,
+                                                      license_no, insurance, n, out))
+               for n in range(args.threads)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    secs = time.perf_counter() - started
+
+    doubles = _double_bookings(vin)
+    _cleanup(out['ids'])
+
+    attempts = args.threads * args.attempts
+    print(f"path={args.path} threads={args.threads} attempts={attempts} vin={vin}")
+    print(f"booked {len(out['ids'])}, rejected {out['rejected']} in {secs:.3f}s "
+          f"-> {attempts / secs:.0f} attempts/s")
+    print(f"double bookings: {doubles}")
+    sys.exit(1 if doubles else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import bump_catalog_version
+from db import get_db_connection, get_direct_connection
+from fleet_io import export_csv, import_csv
+import stats
+
+# Rows/sec of the bulk car import (executemany staging, and LOAD DATA LOCAL
+# INFILE with --load-data) and of the streaming export. Writes --rows cars with
+# an FI VIN prefix to a temporary CSV, imports them twice (the second pass is an
+# all-update upsert), exports the table, then deletes the cars again.
+
+PREFIX = 'FI'
+
+
+def _write_csv(path, rows, location_id, car_type):
+    with open(path, 'w', newline='') as f:
+        f.write('VIN,Rental_Location_ID,Reg_No,Status,Seating_Capacity,Disability_Friendly,Car_Type,Model,Year,Color\n')
+        for i in range(rows):
+            f.write(f'{PREFIX}{i:015d},{location_id},{PREFIX}{i:09d},Available,5,N,{car_type},Bench Model,2024,White\n')
+
+
+def _cleanup():
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        while True:
+            cur.execute("DELETE FROM Car WHERE VIN LIKE %s LIMIT 10000", (PREFIX + '%',))
+            conn.commit()
+            if cur.rowcount == 0:
+                break
+        stats.refresh_car_gauges(conn)
+        bump_catalog_version(conn)
+        conn.commit()
+        cur.close()
+
+
+def _import(path, load_data):
+    conn = get_direct_connection(allow_local_infile=True) if load_data else get_db_connection()
+    try:
+        with open(path, newline='') as f:
+            return import_csv(conn, 'cars', f, load_data_path=path if load_data else None)
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk car import/export throughput')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--load-data', action='store_true', help='also time LOAD DATA LOCAL INFILE')
+    args = parser.parse_args()
+
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT Rental_Location_ID FROM Rental_Location LIMIT 1")
+        location = cur.fetchone()
+        cur.execute("SELECT Car_Type FROM Car_Type LIMIT 1")
+        car_type = cur.fetchone()
+        cur.close()
+    if not (location and car_type):
+        sys.exit('Need a Rental_Location and a Car_Type; load Car_rental_system.sql first')
+
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    os.close(fd)
+    try:
+        _write_csv(path, args.rows, location[0], car_type[0])
+        paths = [('executemany', False)] + ([('load-data', True)] if args.load_data else [])
+        for name, load_data in paths:
+            _cleanup()
+            for label in ('insert', 'upsert'):
+                report = _import(path, load_data)
+                if report['error_count']:
+                    sys.exit(f"Import failed: {report['errors'][:5]}")
+                print(f"{name:12s} {label:7s} {report['rows']} rows in {report['seconds']:.2f}s "
+                      f"-> {report['rows_per_sec']:.0f} rows/s")
+
+        started = time.perf_counter()
+        out = io.StringIO()
+        with get_db_connection() as conn:
+            for text in export_csv(conn, 'cars'):
+                out.write(text)
+        secs = time.perf_counter() - started
+        lines = out.getvalue().count('\n') - 1
+        print(f"export               {lines} rows in {secs:.2f}s -> {lines / secs:.0f} rows/s")
+    finally:
+        os.remove(path)
+        _cleanup()
+
+
+if __name__ == "__main__":
+    main()
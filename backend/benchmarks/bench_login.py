@@ -0,0 +1,97 @@
+import argparse
+import json
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+# Login latency under concurrent load against a running server. --threads
+# clients post /api/login in a loop while one prober keeps fetching a cheap
+# page (/login) to show whether hashing blocks unrelated requests. Compare a
+# server started with PASSWORD_HASH_WORKERS=0 (hashing on the request thread,
+# the old behaviour) against the default pool.
+
+
+def _post(url, body):
+    req = urllib.request.Request(url, data=json.dumps(body).encode(),
+                                 headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(req) as resp:
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def _get(url):
+    try:
+        with urllib.request.urlopen(url) as resp:
+            resp.read()
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return 'no samples'
+    pick = lambda q: samples[min(int(q * len(samples)), len(samples) - 1)] * 1000
+    return f"n={len(samples)} p50={pick(0.5):.1f}ms p95={pick(0.95):.1f}ms p99={pick(0.99):.1f}ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Login latency under concurrent load')
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--license', required=True, help='License_No of an existing user')
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--logins', type=int, default=20, help='logins per thread')
+    args = parser.parse_args()
+
+    login_url = args.base_url.rstrip('/') + '/api/login'
+    probe_url = args.base_url.rstrip('/') + '/login'
+    body = {'License_No': args.license, 'Password': args.password}
+    lock = threading.Lock()
+    logins, probes, codes = [], [], {}
+    done = threading.Event()
+
+    def client():
+        for _ in range(args.logins):
+            started = time.perf_counter()
+            code = _post(login_url, body)
+            elapsed = time.perf_counter() - started
+            with lock:
+                codes[code] = codes.get(code, 0) + 1
+                if code == 200:
+                    logins.append(elapsed)
+
+    def prober():
+        while not done.is_set():
+            started = time.perf_counter()
+            _get(probe_url)
+            probes.append(time.perf_counter() - started)
+            time.sleep(0.01)
+
+    probe_thread = threading.Thread(target=prober)
+    probe_thread.start()
+    threads = [threading.Thread(target=client) for _ in range(args.threads)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    secs = time.perf_counter() - started
+    done.set()
+    probe_thread.join()
+
+    print(f"threads={args.threads} logins={args.threads * args.logins} in {secs:.2f}s "
+          f"-> {args.threads * args.logins / secs:.1f} req/s  status codes: {codes}")
+    print(f"login  {_percentiles(logins)}")
+    print(f"probe  {_percentiles(probes)}")
+    if not logins:
+        sys.exit('No successful logins; check --license/--password')
+
+
+if __name__ == "__main__":
+    main()
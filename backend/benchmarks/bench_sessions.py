@@ -0,0 +1,89 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, session
+from flask_session import Session
+from session_store import SqliteSessionStore, StoreSessionInterface
+
+# Per-request session read and write latency through a bare Flask app, once
+# with the Flask-Session filesystem store and once with the SQLite + LRU store.
+# --sessions clients each hold a session; reads and writes then hit random
+# clients. Needs no database; everything lives in a temporary directory.
+
+
+def _app(backend, workdir):
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'bench'
+    if backend == 'filesystem':
+        app.config['SESSION_TYPE'] = 'filesystem'
+        app.config['SESSION_FILE_DIR'] = os.path.join(workdir, 'flask_session')
+        Session(app)
+    else:
+        app.session_interface = StoreSessionInterface(SqliteSessionStore(os.path.join(workdir, 'sessions.sqlite3')))
+
+    @app.route('/login/<int:n>')
+    def login(n):
+        session['license_no'] = f'BENCH{n:06d}'
+        session['name'] = 'Bench'
+        session['role'] = {'license_no': session['license_no'], 'user_type': 'Guest', 'version': 0,
+                           'expires': time.time() + 300}
+        return 'ok'
+
+    @app.route('/read')
+    def read():
+        return session.get('license_no', '')
+
+    @app.route('/write')
+    def write():
+        session['last_seen'] = time.time()
+        return 'ok'
+
+    return app
+
+
+def _timed(clients, path, n, rng):
+    samples = []
+    for _ in range(n):
+        client = rng.choice(clients)
+        started = time.perf_counter()
+        client.get(path)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def _summary(label, samples):
+    samples = sorted(samples)
+    pick = lambda q: samples[min(int(q * len(samples)), len(samples) - 1)] * 1e6
+    print(f"  {label:5} p50={pick(0.5):7.0f}us p95={pick(0.95):7.0f}us p99={pick(0.99):7.0f}us "
+          f"mean={statistics.mean(samples) * 1e6:7.0f}us -> {len(samples) / sum(samples):.0f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Session store read/write latency')
+    parser.add_argument('--sessions', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--backend', choices=['filesystem', 'sqlite', 'both'], default='both')
+    args = parser.parse_args()
+
+    backends = ['filesystem', 'sqlite'] if args.backend == 'both' else [args.backend]
+    for backend in backends:
+        with tempfile.TemporaryDirectory() as workdir:
+            app = _app(backend, workdir)
+            clients = [app.test_client() for _ in range(args.sessions)]
+            for n, client in enumerate(clients):
+                client.get(f'/login/{n}')
+            rng = random.Random(0)
+            print(f"{backend}: sessions={args.sessions} requests={args.requests}")
+            _summary('read', _timed(clients, '/read', args.requests, rng))
+            _summary('write', _timed(clients, '/write', args.requests, rng))
+
+
+if __name__ == "__main__":
+    main()
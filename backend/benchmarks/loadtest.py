@@ -0,0 +1,567 @@
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash
+from cache_versions import bump_versions
+from db import get_db_connection
+from passwords import HASH_METHOD
+import revenue
+import stats
+
+# Reproducible load test for the HTTP API.
+#
+#   seed     fills the local database with a synthetic fleet: Rental_Locations,
+#            cars, users with credentials, phones and cards, back-to-back
+#            reservations per car and payments for the confirmed ones. All rows
+#            use an LT prefix (or the LT card range) so they can be removed
+#            again; the same --seed and --anchor give the same data.
+#   run      drives the real endpoints of a running server with --concurrency
+#            clients, one endpoint at a time, and writes p50/p95/p99 latency,
+#            throughput, status codes and DB statements per endpoint as JSON.
+#   compare  prints two reports side by side and exits non-zero when an
+#            endpoint's p95 got worse by more than --threshold percent.
+#   reset    deletes everything seed created and rebuilds the rollups.
+#
+# DB statements are the change in MySQL's global Questions counter over each
+# endpoint's phase, so run against a database nothing else is using. Restart
+# the server after seed or reset (the availability index is loaded at start).
+#
+#   python benchmarks/loadtest.py seed --cars 5000 --users 20000 --reservations 2000000
+#   python benchmarks/loadtest.py run --out before.json
+#   python benchmarks/loadtest.py compare before.json after.json
+
+PREFIX = 'LT'
+CARD_BASE = 9100000000000000
+EMAIL_DOMAIN = 'loadtest.invalid'
+CHUNK = 5000
+DEFAULT_PASSWORD = 'loadtest'
+MODELS = {
+    'SUV': ['Toyota Fortuner', 'Mahindra XUV700', 'Hyundai Creta'],
+    'Sedan': ['Honda City', 'Hyundai Verna', 'Skoda Slavia'],
+    'Hatchback': ['Maruti Swift', 'Tata Altroz', 'Hyundai i20'],
+}
+COLORS = ['White', 'Black', 'Silver', 'Red', 'Blue', 'Grey']
+STATES = [('Karnataka', '560'), ('Telangana', '500'), ('Maharashtra', '400'), ('Tamil Nadu', '600'),
+          ('Delhi', '110'), ('Kerala', '682')]
+FIRST_NAMES = ['Asha', 'Ravi', 'Meera', 'Arjun', 'Priya', 'Kiran', 'Neha', 'Vikram', 'Divya', 'Rahul']
+LAST_NAMES = ['Rao', 'Sharma', 'Iyer', 'Patel', 'Reddy', 'Nair', 'Gupta', 'Das', 'Menon', 'Singh']
+
+
+def license_no(i):
+    return f'{PREFIX}{i:08d}'
+
+
+def vin(i):
+    return f'{PREFIX}{i:015d}'
+
+
+def _insert_chunks(cur, sql, rows):
+    for i in range(0, len(rows), CHUNK):
+        cur.executemany(sql, rows[i:i + CHUNK])
+
+
+def _seeded(cur):
+    cur.execute("SELECT COUNT(*) FROM Car WHERE VIN LIKE %s", (PREFIX + '%',))
+    return cur.fetchone()[0]
+
+
+def seed(conn, args):
+    rng = random.Random(args.seed)
+    anchor = args.anchor
+    cur = conn.cursor()
+    if _seeded(cur):
+        cur.close()
+        sys.exit('Synthetic data already present; run reset first')
+    cur.execute("SELECT Car_Type, Daily_Rate FROM Car_Type ORDER BY Car_Type")
+    rates = dict(cur.fetchall())
+    cur.execute("SELECT Car_Type, Insurance_Type, Insurance_Price FROM Insurance_Price")
+    insurance = {}
+    for car_type, ins_type, price in cur.fetchall():
+        insurance.setdefault(car_type, []).append((ins_type, price))
+    if not rates or not all(t in insurance for t in rates):
+        sys.exit('Load Car_rental_system.sql first (needs Car_Type and Insurance_Price rows)')
+    car_types = sorted(rates)
+
+    started = time.perf_counter()
+    _insert_chunks(cur, """
+        INSERT INTO Rental_Location (Phone, Email, Street_Name, State, Zip_Code)
+        VALUES (%s, %s, %s, %s, %s)
+    """, [(f'{PREFIX}{i:08d}', f'lt-loc{i}@{EMAIL_DOMAIN}', f'Street {i}', *_state(rng))
+          for i in range(args.locations)])
+    cur.execute("SELECT Rental_Location_ID FROM Rental_Location WHERE Email LIKE %s ORDER BY Rental_Location_ID",
+                ('%@' + EMAIL_DOMAIN,))
+    location_ids = [r[0] for r in cur.fetchall()]
+
+    cars = []
+    for i in range(args.cars):
+        car_type = rng.choice(car_types)
+        cars.append((vin(i), rng.choice(location_ids), f'{PREFIX}{i:08d}', 'Available', rng.choice([5, 5, 7]),
+                     rng.choice('YN'), car_type, rng.choice(MODELS.get(car_type, ['Generic'])),
+                     str(rng.randint(2015, anchor.year)), rng.choice(COLORS)))
+    _insert_chunks(cur, """
+        INSERT INTO Car (VIN, Rental_Location_ID, Reg_No, Status, Seating_Capacity, Disability_Friendly,
+                         Car_Type, Model, Year, Color)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """, cars)
+    conn.commit()
+
+    # every seeded user shares one hash so seeding does not pay the hash cost per row
+    password_hash = generate_password_hash(args.password, method=HASH_METHOD)
+    users, phones, credentials = [], [], []
+    for i in range(args.users):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        dob = date(rng.randint(1960, 2004), rng.randint(1, 12), rng.randint(1, 28))
+        users.append((license_no(i), first, last, f'lt{i}@{EMAIL_DOMAIN}', f'{i} Test Lane', dob, 'Customer'))
+        phones.append((license_no(i), f'9{i:09d}'))
+        credentials.append((password_hash, anchor.year - rng.randint(0, 5), license_no(i)))
+    _insert_chunks(cur, """
+        INSERT INTO User (License_No, FName, LName, Email, Address, DOB, User_Type)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """, users)
+    _insert_chunks(cur, "INSERT INTO User_Phone (License_No, Phone) VALUES (%s, %s)", phones)
+    _insert_chunks(cur, """
+        INSERT INTO User_Credential (Password, Year_Of_Membership, License_No) VALUES (%s, %s, %s)
+    """, credentials)
+    cur.execute("SELECT License_No, Login_ID FROM User_Credential WHERE License_No LIKE %s", (PREFIX + '%',))
+    login_ids = dict(cur.fetchall())
+    _insert_chunks(cur, """
+        INSERT INTO Card_Details (Card_No, Login_ID, Name_on_Card, Expiry_Date, CVV, Billing_Address)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, [(CARD_BASE + i, login_ids[u[0]], f'{u[1]} {u[2]}', anchor.replace(day=1) + timedelta(days=1100),
+           rng.randint(100, 999), u[4]) for i, u in enumerate(users)])
+    conn.commit()
+
+    reservations = payments = 0
+    per_car, extra = divmod(args.reservations, max(args.cars, 1))
+    res_rows, pay_rows = [], []
+    for i, car in enumerate(cars):
+        car_type = car[6]
+        # walk back from the end of the future window so the latest bookings are still ahead
+        cursor_day = anchor + timedelta(days=args.future_days)
+        for _ in range(per_car + (i < extra)):
+            days = rng.randint(1, 7)
+            end = cursor_day - timedelta(days=rng.randint(0, 3))
+            start = end - timedelta(days=days)
+            cursor_day = start - timedelta(days=1)
+            ins_type, ins_price = rng.choice(insurance[car_type])
+            rental = rates[car_type] * (days + 1)
+            total = rental + ins_price
+            status = _status(rng, start, anchor)
+            user = rng.randrange(args.users)
+            res_rows.append((start, end, rental, ins_price, status, license_no(user), car[0], total, ins_type))
+            if status == 'Confirmed' and rng.random() < args.payments:
+                pay_rows.append((total, CARD_BASE + user, users[user][1] + ' ' + users[user][2],
+                                 anchor.replace(day=1) + timedelta(days=1100), rng.randint(100, 999),
+                                 users[user][4], int(rng.random() < 0.1)))
+            if len(res_rows) >= CHUNK:
+                reservations += _flush(conn, cur, res_rows, pay_rows)
+                payments += len(pay_rows)
+                res_rows, pay_rows = [], []
+                print(f"  {reservations} reservations", end='\r', flush=True)
+    reservations += _flush(conn, cur, res_rows, pay_rows)
+    payments += len(pay_rows)
+
+    _refresh_rollups(conn, cur)
+    cur.close()
+    print(f"Seeded {len(location_ids)} locations, {len(cars)} cars, {len(users)} users, "
+          f"{reservations} reservations, {payments} payments in {time.perf_counter() - started:.1f}s")
+
+
+def _state(rng):
+    state, zip_prefix = rng.choice(STATES)
+    return state, f'{zip_prefix}{rng.randint(0, 999):03d}'
+
+
+def _status(rng, start, anchor):
+    roll = rng.random()
+    if start > anchor:
+        return 'Confirmed' if roll < 0.6 else 'Pending'
+    if roll < 0.75:
+        return 'Confirmed'
+    return 'Cancelled' if roll < 0.95 else 'Pending'
+
+
+def _flush(conn, cur, res_rows, pay_rows):
+    cur.executemany("""
+        INSERT INTO Reservation (Start_Date, End_Date, Rental_Amount, Insurance_Amount, Status,
+                                 License_No, VIN, Total_Amount, Insurance_Type)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """, res_rows)
+    if pay_rows:
+        cur.executemany("""
+            INSERT INTO Payment (Amount, Card_No, Name_on_Card, Expiry_Date, CVV, Billing_Address, Paid_By_Cash)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, pay_rows)
+    conn.commit()
+    return len(res_rows)
+
+
+def _refresh_rollups(conn, cur):
+    # The bulk inserts bypass the write hooks, so rebuild the rollups and
+    # bump the change counters for any running process
+    stats.rebuild(conn)
+    revenue.rebuild(conn)
+    bump_versions(conn, ['reservations', 'users', 'catalog'])
+    conn.commit()
+    cur.execute("ANALYZE TABLE Reservation, Car, User, Payment")
+    cur.fetchall()
+
+
+def reset(conn):
+    cur = conn.cursor()
+    cur.execute("DELETE FROM Payment WHERE Card_No >= %s", (CARD_BASE,))
+    # reservations made during runs may point at seeded cars or users
+    while True:
+        cur.execute("DELETE FROM Reservation WHERE License_No LIKE %s OR VIN LIKE %s LIMIT %s",
+                    (PREFIX + '%', PREFIX + '%', CHUNK * 10))
+        conn.commit()
+        if cur.rowcount == 0:
+            break
+    cur.execute("DELETE FROM Card_Details WHERE Card_No >= %s", (CARD_BASE,))
+    for table in ('User_Rents_Car', 'User_Phone', 'User_Credential', 'User'):
+        cur.execute(f"DELETE FROM {table} WHERE License_No LIKE %s", (PREFIX + '%',))
+    cur.execute("DELETE FROM Car WHERE VIN LIKE %s", (PREFIX + '%',))
+    cur.execute("DELETE FROM Rental_Location WHERE Email LIKE %s", ('%@' + EMAIL_DOMAIN,))
+    conn.commit()
+    _refresh_rollups(conn, cur)
+    cur.close()
+    print("Removed synthetic data")
+
+
+def dataset_counts(conn):
+    cur = conn.cursor()
+    counts = {}
+    for name, sql in (('locations', "SELECT COUNT(*) FROM Rental_Location"),
+                      ('cars', "SELECT COUNT(*) FROM Car"),
+                      ('users', "SELECT COUNT(*) FROM User"),
+                      ('reservations', "SELECT COUNT(*) FROM Reservation"),
+                      ('payments', "SELECT COUNT(*) FROM Payment")):
+        cur.execute(sql)
+        counts[name] = cur.fetchone()[0]
+    cur.close()
+    return counts
+
+
+def questions(conn):
+    cur = conn.cursor()
+    cur.execute("SHOW GLOBAL STATUS LIKE 'Questions'")
+    value = int(cur.fetchone()[1])
+    cur.close()
+    # minus the SHOW itself
+    return value - 1
+
+
+class Client:
+    # One simulated browser: its own cookie jar, so each client has a session
+    def __init__(self, base_url, license_no=None):
+        self.base_url = base_url.rstrip('/')
+        self.license_no = license_no
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'} if data else {})
+        try:
+            with self.opener.open(req, timeout=60) as resp:
+                payload = resp.read()
+                return resp.status, payload
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+        except OSError as e:
+            return 0, str(e).encode()
+
+
+def _percentile(samples, q):
+    return samples[min(int(q * len(samples)), len(samples) - 1)] * 1000
+
+
+def summarize(latencies, codes, seconds, queries):
+    latencies = sorted(latencies)
+    n = sum(codes.values())
+    ok = sum(c for code, c in codes.items() if 200 <= code < 400)
+    result = {
+        'requests': n,
+        'errors': n - ok,
+        'status_codes': {str(code): c for code, c in sorted(codes.items())},
+        'seconds': round(seconds, 3),
+        'throughput_rps': round(n / seconds, 2) if seconds else None,
+        'latency_ms': None,
+        'db_queries': queries,
+        'db_queries_per_request': round(queries / n, 2) if n and queries is not None else None,
+    }
+    if latencies:
+        result['latency_ms'] = {
+            'p50': round(_percentile(latencies, 0.5), 2),
+            'p95': round(_percentile(latencies, 0.95), 2),
+            'p99': round(_percentile(latencies, 0.99), 2),
+            'mean': round(sum(latencies) / len(latencies) * 1000, 2),
+            'max': round(latencies[-1] * 1000, 2),
+        }
+    return result
+
+
+class Scenario:
+    # Request factories per endpoint. Each takes (client, rng) and returns
+    # (method, path, body); on_response lets a phase keep what it created.
+    def __init__(self, args, users, vins):
+        self.args = args
+        self.users = users
+        self.vins = vins
+        self.lock = threading.Lock()
+        self.created = []
+        # bookings land past the seeded window so most of them succeed
+        self.booking_from = args.anchor + timedelta(days=args.future_days + 30)
+
+    def login(self, client, rng):
+        return 'POST', '/api/login', {'License_No': rng.choice(self.users), 'Password': self.args.password}
+
+    def cars_available(self, client, rng):
+        start = self.args.anchor + timedelta(days=rng.randint(1, max(self.args.future_days, 1)))
+        end = start + timedelta(days=rng.randint(1, 7))
+        return 'GET', f'/api/cars/available?start_date={start}&end_date={end}', None
+
+    def reservations_add(self, client, rng):
+        start = self.booking_from + timedelta(days=rng.randint(0, 3650))
+        return 'POST', '/api/reservations/add', {
+            'License_No': client.license_no, 'VIN': rng.choice(self.vins),
+            'Start_Date': str(start), 'End_Date': str(start + timedelta(days=rng.randint(1, 3))),
+            'Insurance_Type': rng.choice(['Basic', 'Standard', 'Premium']),
+        }
+
+    def on_reservation(self, client, status, payload):
+        if status == 200:
+            with self.lock:
+                self.created.append((json.loads(payload)['reservation_id'], client.license_no))
+
+    def payments_add(self, client, rng):
+        with self.lock:
+            reservation_id, owner = self.created[rng.randrange(len(self.created))] if self.created else (None, None)
+        card_no = CARD_BASE + int(owner[len(PREFIX):]) if owner else CARD_BASE
+        return 'POST', '/api/payments/add', {
+            'Amount': '4500.00', 'Card_No': card_no, 'Name_on_Card': 'Load Test',
+            'Expiry_Date': str(self.args.anchor + timedelta(days=1000)), 'CVV': 123,
+            'Billing_Address': 'Test Lane', 'Paid_By_Cash': False, 'Reservation_ID': reservation_id,
+        }
+
+
+def _admin_get(path):
+    return lambda client, rng: ('GET', path, None)
+
+
+def _endpoints(scenario):
+    # (name, request factory, needs admin session, response hook)
+    return [
+        ('login', scenario.login, False, None),
+        ('cars_available', scenario.cars_available, False, None),
+        ('reservations_add', scenario.reservations_add, False, scenario.on_reservation),
+        ('payments_add', scenario.payments_add, False, None),
+        ('admin_stats', _admin_get('/api/admin/stats'), True, None),
+        ('admin_users', _admin_get('/api/admin/users'), True, None),
+        ('admin_reservations', _admin_get('/api/admin/reservations'), True, None),
+        ('admin_revenue', _admin_get('/api/admin/revenue?days=365&granularity=week'), True, None),
+        ('admin_car_status', _admin_get('/api/admin/car-status'), True, None),
+        ('admin_dashboard', _admin_get('/api/admin/dashboard'), True, None),
+    ]
+
+
+def _login(client, body):
+    status, payload = client.request('POST', '/api/login', body)
+    if status != 200:
+        sys.exit(f"Login failed ({status}): {payload[:200]!r}")
+
+
+def _run_phase(args, scenario, make_request, on_response, clients):
+    lock = threading.Lock()
+    latencies, codes = [], {}
+    deadline = time.perf_counter() + args.duration if args.duration else None
+    budget = [args.requests]
+
+    def take():
+        with lock:
+            if deadline is None:
+                if budget[0] <= 0:
+                    return False
+                budget[0] -= 1
+                return True
+            return time.perf_counter() < deadline
+
+    def worker(client, seed):
+        rng = random.Random(seed)
+        while take():
+            method, path, body = make_request(client, rng)
+            started = time.perf_counter()
+            status, payload = client.request(method, path, body)
+            elapsed = time.perf_counter() - started
+            if on_response:
+                on_response(client, status, payload)
+            with lock:
+                codes[status] = codes.get(status, 0) + 1
+                if 200 <= status < 400:
+                    latencies.append(elapsed)
+
+    threads = [threading.Thread(target=worker, args=(c, args.seed * 1000 + n)) for n, c in enumerate(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, codes, time.perf_counter() - started
+
+
+def run(args):
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT License_No FROM User WHERE License_No LIKE %s ORDER BY License_No LIMIT %s",
+                    (PREFIX + '%', args.user_sample))
+        users = [r[0] for r in cur.fetchall()]
+        cur.execute("SELECT VIN FROM Car WHERE VIN LIKE %s ORDER BY VIN", (PREFIX + '%',))
+        vins = [r[0] for r in cur.fetchall()]
+        cur.close()
+        dataset = dataset_counts(conn)
+    if not users or not vins:
+        sys.exit('No synthetic data; run seed first')
+
+    scenario = Scenario(args, users, vins)
+    clients = []
+    for n in range(args.concurrency):
+        client = Client(args.base_url, users[n % len(users)])
+        _login(client, {'License_No': client.license_no, 'Password': args.password})
+        clients.append(client)
+    admins = []
+    for _ in range(args.concurrency):
+        admin = Client(args.base_url)
+        _login(admin, {'Email': args.admin_email, 'Password': args.admin_password, 'isAdmin': True})
+        admins.append(admin)
+
+    only = set(args.endpoints.split(',')) if args.endpoints else None
+    results = {}
+    for name, make_request, admin, on_response in _endpoints(scenario):
+        if only and name not in only:
+            continue
+        if name == 'payments_add' and not scenario.created:
+            print(f"{name:20s} skipped (no reservations created)")
+            continue
+        with get_db_connection() as conn:
+            before = questions(conn)
+            latencies, codes, secs = _run_phase(args, scenario, make_request, on_response,
+                                                admins if admin else clients)
+            after = questions(conn)
+        results[name] = summarize(latencies, codes, secs, after - before)
+        lat = results[name]['latency_ms'] or {}
+        print(f"{name:20s} n={results[name]['requests']:<6d} err={results[name]['errors']:<4d} "
+              f"{results[name]['throughput_rps'] or 0:8.1f} req/s  p50={lat.get('p50', '-')} "
+              f"p95={lat.get('p95', '-')} p99={lat.get('p99', '-')} ms  "
+              f"queries/req={results[name]['db_queries_per_request']}")
+
+    # cancel what the run booked so the next run starts from the same data
+    for reservation_id, owner in scenario.created:
+        clients[0].request('POST', f'/api/reservations/{reservation_id}/cancel')
+
+    report = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'base_url': args.base_url,
+        'config': {'concurrency': args.concurrency, 'requests': args.requests, 'duration': args.duration,
+                   'seed': args.seed, 'anchor': str(args.anchor), 'user_sample': len(users)},
+        'dataset': dataset,
+        'endpoints': results,
+    }
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2, default=lambda o: float(o) if isinstance(o, Decimal) else str(o))
+    print(f"Wrote {args.out}")
+
+
+def compare(args):
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    regressions = []
+    print(f"{'endpoint':20s} {'p95 before':>11s} {'p95 after':>10s} {'change':>8s} "
+          f"{'rps before':>11s} {'rps after':>10s} {'q/req before':>13s} {'q/req after':>12s}")
+    for name in sorted(set(before['endpoints']) | set(after['endpoints'])):
+        b = before['endpoints'].get(name) or {}
+        a = after['endpoints'].get(name) or {}
+        b95 = (b.get('latency_ms') or {}).get('p95')
+        a95 = (a.get('latency_ms') or {}).get('p95')
+        change = (a95 - b95) / b95 * 100 if a95 is not None and b95 else None
+        if change is not None and change > args.threshold:
+            regressions.append(name)
+        print(f"{name:20s} {_fmt(b95):>11s} {_fmt(a95):>10s} {_fmt(change, '%+.1f%%'):>8s} "
+              f"{_fmt(b.get('throughput_rps')):>11s} {_fmt(a.get('throughput_rps')):>10s} "
+              f"{_fmt(b.get('db_queries_per_request')):>13s} {_fmt(a.get('db_queries_per_request')):>12s}")
+    if before.get('dataset') != after.get('dataset'):
+        print(f"Note: datasets differ: {before.get('dataset')} vs {after.get('dataset')}")
+    if regressions:
+        sys.exit(f"p95 regressed by more than {args.threshold}%: {', '.join(regressions)}")
+
+
+def _fmt(value, pattern='%.1f'):
+    return '-' if value is None else pattern % value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Seed synthetic data and load-test the API')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_seed = sub.add_parser('seed', help='insert the synthetic fleet')
+    p_seed.add_argument('--locations', type=int, default=50)
+    p_seed.add_argument('--cars', type=int, default=2000)
+    p_seed.add_argument('--users', type=int, default=10000)
+    p_seed.add_argument('--reservations', type=int, default=200000)
+    p_seed.add_argument('--payments', type=float, default=0.8, help='share of confirmed reservations with a payment')
+    p_seed.add_argument('--future-days', type=int, default=90, help='how far ahead seeded bookings reach')
+    p_seed.add_argument('--password', default=DEFAULT_PASSWORD, help='password of every seeded user')
+
+    sub.add_parser('reset', help='delete the synthetic data')
+
+    p_run = sub.add_parser('run', help='drive a running server and write a JSON report')
+    p_run.add_argument('--base-url', default='http://127.0.0.1:5000')
+    p_run.add_argument('--concurrency', type=int, default=16)
+    p_run.add_argument('--requests', type=int, default=500, help='requests per endpoint')
+    p_run.add_argument('--duration', type=float, default=0, help='seconds per endpoint (overrides --requests)')
+    p_run.add_argument('--endpoints', help='comma-separated subset, e.g. login,cars_available')
+    p_run.add_argument('--user-sample', type=int, default=1000, help='seeded users the clients log in as')
+    p_run.add_argument('--future-days', type=int, default=90)
+    p_run.add_argument('--password', default=DEFAULT_PASSWORD)
+    p_run.add_argument('--admin-email', default='admin@example.com')
+    p_run.add_argument('--admin-password', default='admin123')
+    p_run.add_argument('--out', default='loadtest.json')
+
+    for p in (p_seed, p_run):
+        p.add_argument('--seed', type=int, default=1)
+        p.add_argument('--anchor', type=date.fromisoformat, default=date.today(),
+                       help='day the synthetic history is laid out around (YYYY-MM-DD)')
+
+    p_cmp = sub.add_parser('compare', help='compare two reports')
+    p_cmp.add_argument('before')
+    p_cmp.add_argument('after')
+    p_cmp.add_argument('--threshold', type=float, default=10.0, help='allowed p95 increase in percent')
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        compare(args)
+    elif args.command == 'run':
+        run(args)
+    else:
+        with get_db_connection() as conn:
+            if args.command == 'seed':
+                seed(conn, args)
+            else:
+                reset(conn)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+from datetime import date
+
+# Single-booking path on top of the BookReservation procedure (migration 003):
+# one CALL locks the car row, checks overlaps once, prices, inserts and returns
+# the new row. Callers commit; the car lock is held until they do.
+
+
+def parse_dates(start, end):
+    # Raises ValueError for missing or malformed dates
+    return date.fromisoformat(str(start or '')), date.fromisoformat(str(end or ''))
+
+
+def book_reservation(conn, license_no, vin, start, end, insurance_type):
+    # Returns the new reservation in the shape of stats.fetch_reservation
+    cur = conn.cursor(dictionary=True, buffered=True)
+    cur.execute("CALL BookReservation(%s, %s, %s, %s, %s)",
+                (license_no, vin, start, end, insurance_type))
+    row = cur.fetchone()
+    row['License_No'] = license_no
+    # drain the CALL's trailing status result so the connection can be reused
+    while cur.nextset():
+        pass
+    cur.close()
+    return row
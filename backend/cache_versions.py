@@ -0,0 +1,24 @@
+# Named change counters in Cache_Version (migration 006). Writers bump them in
+# their own transaction; caches and the admin dashboard stream poll them to see
+# what changed in other processes. A missing row reads as 0.
+
+
+def bump_versions(conn, names):
+    rows = [(name,) for name in sorted(set(names))]
+    if not rows:
+        return
+    cur = conn.cursor()
+    cur.executemany("""
+        INSERT INTO Cache_Version (Name, Version) VALUES (%s, 1)
+        ON DUPLICATE KEY UPDATE Version = Version + 1
+    """, rows)
+    cur.close()
+
+
+def read_versions(conn, names):
+    names = list(names)
+    cur = conn.cursor()
+    cur.execute(f"SELECT Name, Version FROM Cache_Version WHERE Name IN ({','.join(['%s'] * len(names))})", names)
+    found = dict(cur.fetchall())
+    cur.close()
+    return {name: found.get(name, 0) for name in names}
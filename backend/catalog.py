@@ -0,0 +1,240 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, request
+from cache_versions import bump_versions, read_versions
+from db import get_db_connection
+
+# Car joined with its Car_Type rate. The fleet changes a few times a day, so
+# every process keeps one copy and reloads it after a write or when it ages out.
+# Catalog responses built from it are kept as serialized bytes in a small LRU
+# (bounded by entry count and total size) so a hit skips both the query and
+# the JSON encoding.
+#
+# Writers that change cars or rates call bump_catalog_version(conn) in their
+# transaction and invalidate_fleet() after commit. The bump reaches other
+# processes (other workers, the release worker): each one re-reads the version
+# at most every CATALOG_VERSION_CHECK seconds and drops its copies when it moved.
+#
+# Branch searches (location ID, state or zip) read per-location partitions of
+# the same copy, so they only touch the cars of the branches they ask for.
+FLEET_QUERY = """
+    SELECT c.VIN, c.Model, c.Car_Type, c.Color, ct.Daily_Rate, c.Status, c.Year,
+           c.Rental_Location_ID, l.State, l.Zip_Code
+    FROM Car c
+    JOIN Car_Type ct ON c.Car_Type = ct.Car_Type
+    JOIN Rental_Location l ON c.Rental_Location_ID = l.Rental_Location_ID
+"""
+
+FLEET_TTL = float(os.getenv('CATALOG_TTL','60'))
+VERSION_CHECK = float(os.getenv('CATALOG_VERSION_CHECK','2'))
+CACHE_ENTRIES = int(os.getenv('CATALOG_CACHE_ENTRIES','256'))
+CACHE_BYTES = int(os.getenv('CATALOG_CACHE_BYTES', str(8 * 1024 * 1024)))
+
+_lock = threading.Lock()
+_fleet = None
+_loaded_at = 0.0
+_version = None
+_version_checked_at = 0.0
+# (fleet list they were built from, location ID -> cars, state -> IDs, zip -> IDs)
+_partitions = None
+
+
+class ByteCache:
+    def __init__(self, max_entries=CACHE_ENTRIES, max_bytes=CACHE_BYTES, ttl=FLEET_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # key -> (expires, body)
+        self._entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry:
+                self._drop(key)
+            self.misses += 1
+            return None
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, body)
+            self.bytes += len(body)
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        _, body = self._entries.pop(key)
+        self.bytes -= len(body)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+response_cache = ByteCache()
+
+
+def _read_version():
+    with get_db_connection() as conn:
+        return read_versions(conn, ['catalog'])['catalog']
+
+
+def _check_version():
+    # Drops the local copies when another process bumped the catalog version
+    global _fleet, _version, _version_checked_at
+    with _lock:
+        if time.monotonic() - _version_checked_at < VERSION_CHECK:
+            return
+        _version_checked_at = time.monotonic()
+    version = _read_version()
+    with _lock:
+        if _version is not None and version != _version:
+            _fleet = None
+            response_cache.clear()
+        _version = version
+
+
+def bump_catalog_version(conn):
+    bump_versions(conn, ['catalog'])
+
+
+def get_fleet():
+    # Returns the shared list of car rows; callers must treat it as read-only.
+    global _fleet, _loaded_at
+    _check_version()
+    fleet = _fleet
+    if fleet is not None and time.monotonic() - _loaded_at < FLEET_TTL:
+        return fleet
+    with _lock:
+        if _fleet is None or time.monotonic() - _loaded_at >= FLEET_TTL:
+            with get_db_connection() as conn:
+                cur = conn.cursor(dictionary=True)
+                cur.execute(FLEET_QUERY)
+                _fleet = cur.fetchall()
+                cur.close()
+            _loaded_at = time.monotonic()
+        return _fleet
+
+
+def _get_partitions():
+    # Rebuilt whenever get_fleet() hands out a new list
+    global _partitions
+    fleet = get_fleet()
+    parts = _partitions
+    if parts is not None and parts[0] is fleet:
+        return parts
+    by_location, by_state, by_zip = {}, {}, {}
+    for car in fleet:
+        location_id = car['Rental_Location_ID']
+        if location_id not in by_location:
+            by_location[location_id] = []
+            by_state.setdefault(car['State'].casefold(), []).append(location_id)
+            by_zip.setdefault(car['Zip_Code'], []).append(location_id)
+        by_location[location_id].append(car)
+    parts = _partitions = (fleet, by_location, by_state, by_zip)
+    return parts
+
+
+def match_locations(location_ids=None, state=None, zip_code=None):
+    # Sorted tuple of the Rental_Location_IDs matching every given filter (each
+    # may be empty), or None when no filter was given at all
+    if not (location_ids or state or zip_code):
+        return None
+    _, by_location, by_state, by_zip = _get_partitions()
+    matched = set(by_location)
+    if location_ids:
+        matched &= set(location_ids)
+    if state:
+        matched &= set(by_state.get(state.strip().casefold(), ()))
+    if zip_code:
+        matched &= set(by_zip.get(zip_code.strip(), ()))
+    return tuple(sorted(matched))
+
+
+def location_args():
+    # Reads ?location_id=1,2&state=&zip= into match_locations(); raises
+    # ValueError on a malformed location_id
+    ids = request.args.get('location_id', '')
+    try:
+        ids = [int(part) for part in ids.split(',') if part.strip()]
+    except ValueError:
+        raise ValueError('location_id must be a comma-separated list of integers')
+    return match_locations(ids, request.args.get('state'), request.args.get('zip'))
+
+
+def fleet_for(locations):
+    # Cars of the given locations (as from match_locations); None means all
+    if locations is None:
+        return get_fleet()
+    by_location = _get_partitions()[1]
+    return [car for location_id in locations for car in by_location.get(location_id, ())]
+
+
+def locations_summary():
+    # Branches that have cars, with their fleet size
+    _, by_location, _, _ = _get_partitions()
+    return [{'Rental_Location_ID': location_id, 'State': cars[0]['State'], 'Zip_Code': cars[0]['Zip_Code'],
+             'cars': len(cars), 'available': sum(car['Status'] == 'Available' for car in cars)}
+            for location_id, cars in sorted(by_location.items())]
+
+
+def location_key(key, locations):
+    # cached_json key for a location-filtered variant of a catalog response
+    return key if locations is None else f"{key}@{','.join(map(str, locations))}"
+
+
+def cached_json(key, build):
+    # Response for a catalog endpoint; build() returns the JSON-able payload
+    # and only runs on a miss
+    _check_version()
+    body = response_cache.get(key)
+    if body is None:
+        body = current_app.json.dumps(build()).encode()
+        response_cache.put(key, body)
+    return current_app.response_class(body, mimetype='application/json')
+
+
+def invalidate_fleet():
+    global _fleet
+    with _lock:
+        _fleet = None
+    response_cache.clear()
+
+
+def catalog_stats():
+    return dict(response_cache.stats(), fleet_loaded=_fleet is not None, version=_version)
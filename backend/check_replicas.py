@@ -0,0 +1,144 @@
+import os
+os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+os.environ.setdefault('OUTBOX_DISPATCH', '0')
+
+import argparse
+import sys
+import time
+import db
+from app import app
+from cache_versions import bump_versions, read_versions
+from db import ConnectionPool, Replica, ReplicaSet, get_db_connection, get_replicas, parse_dsn
+from flask import session
+
+# Checks read routing against a real primary and replica(s), e.g. two local
+# MySQL servers:
+#   DB_PORT=3306 DB_REPLICAS=127.0.0.1:3307 python check_replicas.py
+# Both need the schema (Car_rental_system.sql plus `python migrate.py`). The
+# second server may be a real replica of the first or a standalone copy; the
+# replication-visibility step only runs when it reports replica status.
+#
+#   1. a read_only connection lands on a replica, a plain one on the primary
+#   2. a pinned request reads from the primary
+#   3. a request that commits pins its session, and the next request of that
+#      session reads from the primary
+#   4. an unreachable replica is marked down and reads fall back
+#   5. (replicating servers) a write on the primary shows up on the replica
+#      within --lag seconds
+# Exits 1 when any step fails.
+
+CHECK_VERSION = 'replica_check'
+
+
+def server_id(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT @@hostname, @@port, @@server_id")
+    row = cur.fetchone()
+    cur.close()
+    return '%s:%s/%s' % row
+
+
+def read_target():
+    with get_db_connection(read_only=True) as conn:
+        return server_id(conn)
+
+
+def run(down_dsn, lag_timeout):
+    failures = []
+
+    def step(name, ok, detail=''):
+        print(f"{'ok' if ok else 'FAIL':4} {name}" + (f"  ({detail})" if detail else ''))
+        if not ok:
+            failures.append(name)
+
+    replicas = get_replicas()
+    # wait for the health thread's first pass
+    deadline = time.monotonic() + 10
+    while any(r.checked_at is None for r in replicas.replicas) and time.monotonic() < deadline:
+        time.sleep(0.1)
+    for r in replicas.replicas:
+        print(f"     replica {r.name}: healthy={r.healthy} lag={r.lag} error={r.error}")
+    healthy = [r for r in replicas.replicas if r.healthy]
+
+    with get_db_connection() as conn:
+        primary = server_id(conn)
+    replica_ids = set()
+    for r in healthy:
+        with r.pool.acquire() as conn:
+            replica_ids.add(server_id(conn))
+    if primary in replica_ids:
+        step('replicas are separate servers', False, f'{primary} is also listed as a replica')
+
+    db.route_request(False)
+    target = read_target()
+    if healthy:
+        step('read_only goes to a replica', target in replica_ids, target)
+    else:
+        step('read_only falls back to the primary (no healthy replica)', target == primary, target)
+
+    db.route_request(True)
+    target = read_target()
+    step('pinned request reads the primary', target == primary, target)
+
+    with app.test_request_context('/'):
+        session['license_no'] = 'REPLCHECK'
+        app.preprocess_request()
+        with get_db_connection() as conn:
+            bump_versions(conn, [CHECK_VERSION])
+            conn.commit()
+        app.process_response(app.response_class())
+        pinned_until = session.get('db_primary_until', 0)
+        step('write pins the session', pinned_until > time.time(), f'{pinned_until - time.time():.1f}s left')
+        stored = dict(session)
+    with app.test_request_context('/'):
+        session.update(stored)
+        app.preprocess_request()
+        target = read_target()
+        step('next request of the session reads the primary', target == primary, target)
+
+    down = ReplicaSet([Replica(down_dsn, ConnectionPool(size=1, timeout=1, ping_after=30, primary=False,
+                                                        connection_timeout=db.REPLICA_CONNECT_TIMEOUT,
+                                                        **parse_dsn(down_dsn, db._connect_args())))])
+    conn = down.acquire()
+    step('unreachable replica is skipped', conn is None and not down.replicas[0].healthy,
+         down.replicas[0].error or 'connected')
+    if conn is not None:
+        conn.close()
+
+    replicating = [r for r in healthy if r.lag is not None]
+    if not replicating:
+        print("skip replication visibility: no replica reports replica status")
+    for r in replicating:
+        with get_db_connection() as conn:
+            bump_versions(conn, [CHECK_VERSION])
+            conn.commit()
+            want = read_versions(conn, [CHECK_VERSION])[CHECK_VERSION]
+        started = time.monotonic()
+        seen = None
+        while time.monotonic() - started < lag_timeout:
+            with r.pool.acquire() as conn:
+                seen = read_versions(conn, [CHECK_VERSION])[CHECK_VERSION]
+            if seen >= want:
+                break
+            time.sleep(0.05)
+        step(f'write visible on {r.name}', seen is not None and seen >= want,
+             f'after {time.monotonic() - started:.2f}s')
+
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM Cache_Version WHERE Name=%s", (CHECK_VERSION,))
+        conn.commit()
+        cur.close()
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check read-replica routing and read-your-writes pinning')
+    parser.add_argument('--down-dsn', default='127.0.0.1:1', help='a DSN nothing listens on, for the failover step')
+    parser.add_argument('--lag', type=float, default=5.0, help='seconds to wait for a write to replicate')
+    args = parser.parse_args()
+    if get_replicas() is None:
+        sys.exit('Set DB_REPLICAS to one or more replica DSNs first')
+    failed = run(args.down_dsn, args.lag)
+    print(f"{len(failed)} step(s) failing")
+    sys.exit(1 if failed else 0)
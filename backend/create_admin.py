@@ -1,5 +1,7 @@
 from db import get_db_connection
+import stats
 from werkzeug.security import generate_password_hash
+from passwords import HASH_METHOD
 
 def create_admin_user():
     conn = get_db_connection()
@@ -20,7 +22,7 @@ def create_admin_user():
         """)
 
         # Create admin credentials
-        hashed_password = generate_password_hash('admin123')
+        hashed_password = generate_password_hash('admin123', method=HASH_METHOD)
         cur.execute("""
             INSERT INTO User_Credential 
             (License_No, Password, Year_Of_Membership)
@@ -36,6 +38,7 @@ def create_admin_user():
             ('ADMIN001', '0000000000')
         """)
 
+        stats.record_user_added(conn)
         conn.commit()
         print("Admin user created successfully!")
         print("Login credentials:")
@@ -0,0 +1,204 @@
+import logging
+import os
+import threading
+import time
+from datetime import date, timedelta
+from cache_versions import read_versions
+from catalog import fleet_for
+from db import get_db_connection
+from pagination import keyset_query
+import revenue
+import stats
+
+# Sections of the admin dashboard, each built from one DB session, and a
+# per-process hub behind the SSE stream. The hub polls the Cache_Version
+# counters every DASHBOARD_POLL seconds while at least one admin tab is
+# connected (one query per poll however many tabs are open), rebuilds only the
+# sections whose inputs changed and pushes them to every tab. Idle tabs only
+# receive a keepalive comment every DASHBOARD_HEARTBEAT seconds.
+
+logger = logging.getLogger(__name__)
+
+POLL = float(os.getenv('DASHBOARD_POLL','2'))
+HEARTBEAT = float(os.getenv('DASHBOARD_HEARTBEAT','15'))
+
+ADMIN_USERS_SELECT = """
+    SELECT u.*, COUNT(r.Reservation_ID) as total_reservations,
+           SUM(CASE WHEN r.Status = 'Confirmed' THEN 1 ELSE 0 END) as active_reservations
+    FROM User u
+    LEFT JOIN Reservation r ON u.License_No = r.License_No
+"""
+
+ADMIN_RESERVATIONS_SELECT = """
+    SELECT r.Reservation_ID, r.License_No, u.FName, u.LName, u.Email,
+           GROUP_CONCAT(DISTINCT up.Phone SEPARATOR ', ') AS Phones,
+           c.VIN, c.Model, c.Car_Type, c.Color,
+           r.Start_Date, r.End_Date, r.Status, r.Total_Amount, r.Insurance_Type
+    FROM Reservation r
+    JOIN User u ON r.License_No = u.License_No
+    LEFT JOIN User_Phone up ON up.License_No = u.License_No
+    JOIN Car c ON r.VIN = c.VIN
+"""
+
+USERS_PAGE = 100
+RESERVATIONS_PAGE = 200
+
+# Cache_Version counters read on every poll, plus the calendar day (revenue
+# windows and "new today" move at midnight)
+TRACKED = ('reservations', 'users', 'catalog')
+SECTION_DEPS = {
+    'stats': ('reservations', 'users', 'catalog', 'day'),
+    'users': ('users', 'reservations'),
+    'reservations': ('reservations',),
+    'revenue': ('reservations', 'day'),
+    'car_status': ('catalog',),
+}
+SECTIONS = tuple(SECTION_DEPS)
+
+
+def revenue_series(conn, days=30, granularity='day'):
+    end_date = date.today()
+    start_date = end_date - timedelta(days=max(days, 0))
+    facts = revenue.load_range(conn, start_date, end_date, ('Confirmed', 'Completed'))
+    buckets = list(facts.buckets(granularity))
+    return {
+        'labels': [b[0].strftime('%Y-%m-%d') for b in buckets],
+        'values': [float(b[2]) for b in buckets]
+    }
+
+
+def car_status_summary(locations=None):
+    result = {}
+    for car in fleet_for(locations):
+        counts = result.setdefault(car['Car_Type'], {'total': 0, 'available': 0})
+        counts['total'] += 1
+        counts['available'] += car['Status'] == 'Available'
+    return result
+
+
+def _first_page(conn, select, key_column, key_field, limit, group_by):
+    sql, params = keyset_query(select, key_column, limit, group_by=group_by)
+    cur = conn.cursor(dictionary=True)
+    cur.execute(sql, params)
+    rows = cur.fetchall()
+    cur.close()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {'items': rows, 'next_cursor': rows[-1][key_field] if has_more else None}
+
+
+def build_sections(conn, names):
+    builders = {
+        'stats': lambda: stats.read_admin_stats(conn),
+        'users': lambda: _first_page(conn, ADMIN_USERS_SELECT, 'u.License_No', 'License_No',
+                                     USERS_PAGE, 'u.License_No'),
+        'reservations': lambda: _first_page(conn, ADMIN_RESERVATIONS_SELECT, 'r.Reservation_ID',
+                                            'Reservation_ID', RESERVATIONS_PAGE, 'r.Reservation_ID'),
+        'revenue': lambda: revenue_series(conn),
+        'car_status': car_status_summary,
+    }
+    return {name: builders[name]() for name in names}
+
+
+def current_versions(conn):
+    versions = read_versions(conn, TRACKED)
+    versions['day'] = date.today().isoformat()
+    return versions
+
+
+def changed_sections(old, new):
+    return [name for name, deps in SECTION_DEPS.items() if any(old.get(d) != new.get(d) for d in deps)]
+
+
+def encode_versions(versions):
+    return ','.join(f'{name}={versions[name]}' for name in sorted(versions))
+
+
+def decode_versions(text):
+    # Inverse of encode_versions; counters come back as ints, anything
+    # malformed is dropped (and so treated as changed)
+    versions = {}
+    for part in (text or '').split(','):
+        name, _, value = part.partition('=')
+        if name in TRACKED and value.isdigit():
+            versions[name] = int(value)
+        elif name == 'day' and value:
+            versions[name] = value
+    return versions
+
+
+def _sse(dumps, versions, sections):
+    return f"id: {encode_versions(versions)}\ndata: {dumps({'sections': sections})}\n\n"
+
+
+class DashboardHub:
+    def __init__(self, poll=POLL, heartbeat=HEARTBEAT):
+        self.poll = poll
+        self.heartbeat = heartbeat
+        self._cond = threading.Condition()
+        self._subscribers = 0
+        self._thread = None
+        # (seq, versions, sections) of the latest push
+        self._event = None
+        self._seq = 0
+        self.polls = 0
+        self.pushes = 0
+
+    def _run(self):
+        versions = None
+        while True:
+            with self._cond:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+            try:
+                with get_db_connection() as conn:
+                    latest = current_versions(conn)
+                    names = changed_sections(versions, latest) if versions is not None else []
+                    sections = build_sections(conn, names) if names else None
+                with self._cond:
+                    self.polls += 1
+                    if sections:
+                        self._seq += 1
+                        self.pushes += 1
+                        self._event = (self._seq, latest, sections)
+                        self._cond.notify_all()
+                versions = latest
+            except Exception:
+                logger.exception("Dashboard poll failed")
+            time.sleep(self.poll)
+
+    def stream(self, dumps, since):
+        # SSE generator for one tab. since: the versions the tab last rendered
+        # (from /api/admin/dashboard or Last-Event-ID); anything newer is sent first.
+        with self._cond:
+            self._subscribers += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='dashboard-hub', daemon=True)
+                self._thread.start()
+            seq = self._seq
+        try:
+            yield "retry: 3000\n\n"
+            if since:
+                with get_db_connection() as conn:
+                    latest = current_versions(conn)
+                    names = changed_sections(since, latest)
+                    if names:
+                        yield _sse(dumps, latest, build_sections(conn, names))
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._seq != seq, timeout=self.heartbeat)
+                    event = self._event if self._seq != seq else None
+                    seq = self._seq
+                yield _sse(dumps, event[1], event[2]) if event else ": keepalive\n\n"
+        finally:
+            with self._cond:
+                self._subscribers -= 1
+
+    def stats(self):
+        with self._cond:
+            return {'subscribers': self._subscribers, 'polls': self.polls, 'pushes': self.pushes,
+                    'running': self._thread is not None}
+
+
+dashboard_hub = DashboardHub()
@@ -0,0 +1,356 @@
+import argparse
+import csv
+import io
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+from catalog import bump_catalog_version, invalidate_fleet
+from db import get_db_connection, get_direct_connection
+from pricing import invalidate_rates
+import stats
+
+# Bulk CSV import/export for the fleet and rate tables. An import streams the
+# file into a TEMPORARY staging table (executemany in CHUNK-row batches, or
+# LOAD DATA LOCAL INFILE from the CLI), validates keys and foreign keys with a
+# handful of set-based queries over the whole file, and only then merges it
+# into the real table with one INSERT ... SELECT in the same transaction. A
+# file with any bad row changes nothing. Exports stream the same format back
+# out from an unbuffered cursor.
+
+CHUNK = 5000
+MAX_ERRORS = 100
+
+
+def _text(size, required=True):
+    def parse(value):
+        value = value.strip()
+        if not value:
+            if required:
+                raise ValueError('is required')
+            return None
+        if len(value) > size:
+            raise ValueError(f'is longer than {size} characters')
+        return value
+    return parse
+
+
+def _int(low, high):
+    def parse(value):
+        number = int(value)
+        if not low <= number <= high:
+            raise ValueError(f'must be between {low} and {high}')
+        return number
+    return parse
+
+
+def _money(value):
+    try:
+        amount = Decimal(value)
+    except InvalidOperation:
+        raise ValueError('is not a number')
+    if amount < 0 or amount != amount.quantize(Decimal('0.01')):
+        raise ValueError('must be a non-negative amount with at most 2 decimals')
+    return amount
+
+
+def _vin(value):
+    value = value.strip()
+    if len(value) != 17:
+        raise ValueError('must be 17 characters')
+    return value
+
+
+def _year(value):
+    value = value.strip()
+    if not value:
+        return None
+    if len(value) != 4 or not value.isdigit():
+        raise ValueError('must be a 4-digit year')
+    return value
+
+
+def _flag(value):
+    value = value.strip().upper()
+    if value not in ('Y', 'N', ''):
+        raise ValueError('must be Y or N')
+    return value or None
+
+
+# columns in export order, with the parser each CSV value goes through
+FORMATS = {
+    'cars': {
+        'table': 'Car',
+        'key': ('VIN',),
+        'columns': [('VIN', _vin), ('Rental_Location_ID', _int(1, 2**31 - 1)), ('Reg_No', _text(15, False)),
+                    ('Status', _text(15)), ('Seating_Capacity', _int(1, 99)), ('Disability_Friendly', _flag),
+                    ('Car_Type', _text(30)), ('Model', _text(50, False)), ('Year', _year),
+                    ('Color', _text(20, False))],
+    },
+    'car_types': {
+        'table': 'Car_Type',
+        'key': ('Car_Type',),
+        'columns': [('Car_Type', _text(30)), ('Daily_Rate', _money)],
+    },
+    'insurance_prices': {
+        'table': 'Insurance_Price',
+        'key': ('Car_Type', 'Insurance_Type'),
+        'columns': [('Car_Type', _text(30)), ('Insurance_Type', _text(30)), ('Insurance_Price', _money)],
+    },
+}
+
+# (message, query over the staging table returning offending Line_No values)
+FOREIGN_KEY_CHECKS = {
+    'cars': [
+        ('unknown Car_Type', """SELECT s.Line_No FROM {stage} s LEFT JOIN Car_Type t ON t.Car_Type = s.Car_Type
+                                WHERE t.Car_Type IS NULL"""),
+        ('unknown Rental_Location_ID', """SELECT s.Line_No FROM {stage} s
+                                          LEFT JOIN Rental_Location l ON l.Rental_Location_ID = s.Rental_Location_ID
+                                          WHERE l.Rental_Location_ID IS NULL"""),
+        ('Reg_No appears more than once in the file', """SELECT MAX(Line_No) FROM {stage} WHERE Reg_No IS NOT NULL
+                                                        GROUP BY Reg_No HAVING COUNT(*) > 1"""),
+        ('Reg_No belongs to another car', """SELECT s.Line_No FROM {stage} s JOIN Car c ON c.Reg_No = s.Reg_No
+                                             WHERE c.VIN <> s.VIN"""),
+    ],
+    'car_types': [],
+    'insurance_prices': [
+        ('unknown Car_Type', """SELECT s.Line_No FROM {stage} s LEFT JOIN Car_Type t ON t.Car_Type = s.Car_Type
+                                WHERE t.Car_Type IS NULL"""),
+        ('unknown Insurance_Type', """SELECT s.Line_No FROM {stage} s
+                                      LEFT JOIN Insurance_Type i ON i.Insurance_Type = s.Insurance_Type
+                                      WHERE i.Insurance_Type IS NULL"""),
+    ],
+}
+
+MODES = ('upsert', 'insert')
+
+
+def _stage_name(fmt):
+    return f"Stage_{fmt['table']}"
+
+
+def _column_names(fmt):
+    return [name for name, _ in fmt['columns']]
+
+
+def _create_stage(cur, fmt):
+    # Same column types as the target, none of its constraints; Line_No points
+    # errors back at the file (header is line 1)
+    stage = _stage_name(fmt)
+    cur.execute(f"DROP TEMPORARY TABLE IF EXISTS {stage}")
+    cur.execute(f"""CREATE TEMPORARY TABLE {stage} AS
+                    SELECT 0 AS Line_No, {', '.join(_column_names(fmt))} FROM {fmt['table']} WHERE 1 = 0""")
+    cur.execute(f"ALTER TABLE {stage} ADD PRIMARY KEY (Line_No), ADD INDEX (" + ', '.join(fmt['key']) + ")")
+    return stage
+
+
+def _read_header(reader, fmt):
+    header = [h.strip() for h in next(reader, [])]
+    expected = _column_names(fmt)
+    if sorted(header) != sorted(expected):
+        raise ValueError(f"CSV header must contain exactly: {','.join(expected)}")
+    return header
+
+
+def _stage_rows(cur, fmt, stage, reader, header, errors, chunk):
+    # Parses and inserts; bad rows are reported and left out of the stage
+    order = [header.index(name) for name in _column_names(fmt)]
+    sql = (f"INSERT INTO {stage} (Line_No, {', '.join(_column_names(fmt))}) "
+           f"VALUES ({', '.join(['%s'] * (len(order) + 1))})")
+    batch = []
+    rows = 0
+    for line_no, record in enumerate(reader, start=2):
+        if not any(v.strip() for v in record):
+            continue
+        rows += 1
+        if len(record) != len(header):
+            errors.append({'line': line_no, 'error': f'expected {len(header)} fields, got {len(record)}'})
+            continue
+        values = [line_no]
+        for index, (name, parse) in zip(order, fmt['columns']):
+            try:
+                values.append(parse(record[index]))
+            except ValueError as e:
+                errors.append({'line': line_no, 'error': f'{name} {e}'})
+                break
+        else:
+            batch.append(values)
+        if len(batch) >= chunk:
+            cur.executemany(sql, batch)
+            batch = []
+    if batch:
+        cur.executemany(sql, batch)
+    return rows
+
+
+def _load_data(cur, fmt, stage, path, header):
+    # Needs a connection opened with allow_local_infile=True. Values are read
+    # into variables so empty fields become NULL; conversion problems come back
+    # as warnings and are reported like validation errors.
+    variables = [f'@c{i}' for i in range(len(header))]
+    assignments = ', '.join(f"{name} = NULLIF(TRIM(REPLACE({var}, '\\r', '')), '')"
+                            for name, var in zip(header, variables))
+    cur.execute("SET @line_no = 1")
+    cur.execute(f"""
+        LOAD DATA LOCAL INFILE %s INTO TABLE {stage}
+        CHARACTER SET utf8mb4
+        FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+        LINES TERMINATED BY '\\n'
+        IGNORE 1 LINES
+        ({', '.join(variables)})
+        SET Line_No = (@line_no := @line_no + 1), {assignments}
+    """, (path,))
+    rows = cur.rowcount
+    cur.execute(f"SHOW WARNINGS LIMIT {MAX_ERRORS}")
+    errors = [{'line': None, 'error': w[2]} for w in cur.fetchall()]
+    return rows, errors
+
+
+def _validate(cur, kind, fmt, stage, mode):
+    key = ', '.join(fmt['key'])
+    join = ' AND '.join(f't.{k} = s.{k}' for k in fmt['key'])
+    checks = [(f'{key} appears more than once in the file',
+               f"SELECT MAX(Line_No) FROM {{stage}} GROUP BY {key} HAVING COUNT(*) > 1")]
+    if mode == 'insert':
+        checks.append((f'{key} already exists',
+                       f"SELECT s.Line_No FROM {{stage}} s JOIN {fmt['table']} t ON {join}"))
+    errors = []
+    for message, sql in checks + FOREIGN_KEY_CHECKS[kind]:
+        cur.execute(sql.format(stage=stage) + f" LIMIT {MAX_ERRORS}")
+        errors += [{'line': row[0], 'error': message} for row in cur.fetchall()]
+    return errors
+
+
+def _merge(cur, fmt, stage, mode):
+    columns = ', '.join(_column_names(fmt))
+    join = ' AND '.join(f't.{k} = s.{k}' for k in fmt['key'])
+    cur.execute(f"SELECT COUNT(*) FROM {stage} s JOIN {fmt['table']} t ON {join}")
+    existing = cur.fetchone()[0]
+    sql = f"INSERT INTO {fmt['table']} ({columns}) SELECT {columns} FROM {stage} ORDER BY Line_No"
+    if mode == 'upsert':
+        sql += " ON DUPLICATE KEY UPDATE " + ', '.join(
+            f'{name} = VALUES({name})' for name in _column_names(fmt) if name not in fmt['key'])
+    cur.execute(sql)
+    return existing
+
+
+def import_csv(conn, kind, source, mode='upsert', dry_run=False, chunk=CHUNK, load_data_path=None):
+    # source: text stream of CSV. With load_data_path the file at that path is
+    # loaded server-side instead and source is only used for its header.
+    # Returns a report; nothing is written unless report['committed'].
+    fmt = FORMATS[kind]
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {', '.join(MODES)}")
+    started = time.perf_counter()
+    reader = csv.reader(source)
+    header = _read_header(reader, fmt)
+    report = {'kind': kind, 'mode': mode, 'rows': 0, 'inserted': 0, 'updated': 0,
+              'errors': [], 'error_count': 0, 'committed': False}
+    cur = conn.cursor()
+    stage = _create_stage(cur, fmt)
+    try:
+        errors = []
+        if load_data_path:
+            report['rows'], errors = _load_data(cur, fmt, stage, load_data_path, header)
+        else:
+            report['rows'] = _stage_rows(cur, fmt, stage, reader, header, errors, chunk)
+        errors += _validate(cur, kind, fmt, stage, mode)
+        report['error_count'] = len(errors)
+        report['errors'] = sorted(errors, key=lambda e: e['line'] or 0)[:MAX_ERRORS]
+        if errors or dry_run:
+            conn.rollback()
+        else:
+            existing = _merge(cur, fmt, stage, mode)
+            report['updated'] = existing
+            report['inserted'] = report['rows'] - existing
+            if kind == 'cars':
+                stats.refresh_car_gauges(conn)
+            if kind != 'insurance_prices':
+                # the fleet listing carries Car_Type's Daily_Rate
+                bump_catalog_version(conn)
+            conn.commit()
+            report['committed'] = True
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.execute(f"DROP TEMPORARY TABLE IF EXISTS {stage}")
+        cur.close()
+    if report['committed']:
+        invalidate_fleet()
+        invalidate_rates()
+    seconds = time.perf_counter() - started
+    report['seconds'] = round(seconds, 3)
+    report['rows_per_sec'] = round(report['rows'] / seconds, 1) if seconds else None
+    return report
+
+
+def export_csv(conn, kind, batch=1000):
+    # Generator of CSV text in the import format, batch rows per chunk
+    fmt = FORMATS[kind]
+    columns = _column_names(fmt)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(columns)
+    cur = conn.cursor()
+    cur.execute(f"SELECT {', '.join(columns)} FROM {fmt['table']} ORDER BY {', '.join(fmt['key'])}")
+    done = False
+    try:
+        while not done:
+            rows = cur.fetchmany(batch)
+            done = len(rows) < batch
+            writer.writerows(['' if v is None else v for v in row] for row in rows)
+            if buffer.tell():
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+    finally:
+        if not done:
+            # reader went away mid-export; drain so the connection can be reused
+            cur.fetchall()
+        cur.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk CSV import/export of cars and rate tables')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_import = sub.add_parser('import')
+    p_import.add_argument('kind', choices=sorted(FORMATS))
+    p_import.add_argument('path')
+    p_import.add_argument('--mode', choices=MODES, default='upsert',
+                          help='insert rejects rows whose key already exists')
+    p_import.add_argument('--dry-run', action='store_true', help='validate only')
+    p_import.add_argument('--chunk', type=int, default=CHUNK)
+    p_import.add_argument('--load-data', action='store_true',
+                          help='use LOAD DATA LOCAL INFILE (server needs local_infile=ON)')
+    p_export = sub.add_parser('export')
+    p_export.add_argument('kind', choices=sorted(FORMATS))
+    p_export.add_argument('-o', '--output', help='file to write (default stdout)')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        out = open(args.output, 'w', newline='') if args.output else sys.stdout
+        with get_db_connection() as conn:
+            for text in export_csv(conn, args.kind):
+                out.write(text)
+        if args.output:
+            out.close()
+        return
+
+    conn = get_direct_connection(allow_local_infile=True) if args.load_data else get_db_connection()
+    try:
+        with open(args.path, newline='', encoding='utf-8-sig') as f:
+            report = import_csv(conn, args.kind, f, mode=args.mode, dry_run=args.dry_run, chunk=args.chunk,
+                                load_data_path=args.path if args.load_data else None)
+    finally:
+        conn.close()
+    for error in report['errors']:
+        print(f"line {error['line'] or '?'}: {error['error']}")
+    print(f"{report['rows']} rows in {report['seconds']}s ({report['rows_per_sec']} rows/s): "
+          f"{report['inserted']} inserted, {report['updated']} updated, {report['error_count']} errors, "
+          f"{'committed' if report['committed'] else 'nothing written'}")
+    if report['error_count']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
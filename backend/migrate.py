@@ -0,0 +1,104 @@
+import argparse
+import os
+import re
+from db import get_db_connection
+
+# Versioned schema changes applied on top of Car_rental_system.sql.
+# Each file in migrations/ is named NNN_description.sql and runs once; applied
+# versions are recorded in Schema_Migrations. Files may use DELIMITER lines
+# for procedures and triggers, as the base script does.
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+FILE_PATTERN = re.compile(r'^(\d+)_([\w-]+)\.sql$')
+
+
+def discover():
+    found = []
+    for name in sorted(os.listdir(MIGRATIONS_DIR)):
+        m = FILE_PATTERN.match(name)
+        if m:
+            found.append((int(m.group(1)), m.group(2), os.path.join(MIGRATIONS_DIR, name)))
+    return found
+
+
+def split_statements(sql):
+    statements = []
+    delimiter = ';'
+    buf = []
+    for line in sql.splitlines():
+        stripped = line.strip()
+        if stripped.upper().startswith('DELIMITER '):
+            delimiter = stripped.split(None, 1)[1]
+            continue
+        if not buf and (not stripped or stripped.startswith('--')):
+            continue
+        buf.append(line)
+        if stripped.endswith(delimiter):
+            statement = '\n'.join(buf).rstrip()
+            statements.append(statement[:-len(delimiter)].strip())
+            buf = []
+    if buf and '\n'.join(buf).strip():
+        statements.append('\n'.join(buf).strip())
+    return statements
+
+
+def _ensure_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS Schema_Migrations (
+            Version INT PRIMARY KEY,
+            Name VARCHAR(100) NOT NULL,
+            Applied_At DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def applied_versions(cur):
+    _ensure_table(cur)
+    cur.execute("SELECT Version FROM Schema_Migrations")
+    return {r[0] for r in cur.fetchall()}
+
+
+def migrate(conn, target=None, dry_run=False):
+    cur = conn.cursor()
+    done = applied_versions(cur)
+    ran = []
+    for version, name, path in discover():
+        if version in done or (target is not None and version > target):
+            continue
+        with open(path) as f:
+            statements = split_statements(f.read())
+        print(f"{'Would apply' if dry_run else 'Applying'} {version:03d}_{name} ({len(statements)} statements)")
+        if not dry_run:
+            # DDL commits implicitly in MySQL, so a failed migration is not rolled
+            # back; it stays unrecorded and must be fixed up by hand before rerunning.
+            for statement in statements:
+                cur.execute(statement)
+                if cur.with_rows:
+                    cur.fetchall()
+            cur.execute("INSERT INTO Schema_Migrations (Version, Name) VALUES (%s, %s)", (version, name))
+            conn.commit()
+        ran.append(version)
+    cur.close()
+    return ran
+
+
+def status(conn):
+    cur = conn.cursor()
+    done = applied_versions(cur)
+    cur.close()
+    for version, name, _ in discover():
+        print(f"[{'x' if version in done else ' '}] {version:03d}_{name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Apply versioned schema migrations')
+    parser.add_argument('command', nargs='?', default='up', choices=['up', 'status'])
+    parser.add_argument('--target', type=int, help='apply migrations up to and including this version')
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+    with get_db_connection() as conn:
+        if args.command == 'status':
+            status(conn)
+        else:
+            ran = migrate(conn, target=args.target, dry_run=args.dry_run)
+            print(f"{len(ran)} migration(s) {'pending' if args.dry_run else 'applied'}")
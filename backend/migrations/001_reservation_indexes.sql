@@ -0,0 +1,15 @@
+-- Composite indexes for the hot Reservation filters.
+-- Overlap checks (BI/BU_Reservation_NoOverlap, AddReservation, availability)
+-- filter on VIN + Status + date range; this also serves the VIN foreign key.
+CREATE INDEX idx_reservation_vin_status_dates ON Reservation (VIN, Status, Start_Date, End_Date);
+
+-- Revenue and metrics queries range over Start_Date for a set of statuses
+CREATE INDEX idx_reservation_start_status ON Reservation (Start_Date, Status);
+
+-- Loading the availability index and releasing cars look for active
+-- reservations by End_Date
+CREATE INDEX idx_reservation_status_end ON Reservation (Status, End_Date);
+
+-- api_my_reservations and the admin user listing look reservations up by
+-- License_No; replaces the implicit License_No foreign key index
+CREATE INDEX idx_reservation_license_status ON Reservation (License_No, Status);
@@ -0,0 +1,16 @@
+-- Daily revenue facts by car type and reservation status, maintained on every
+-- reservation/payment write; rebuild with `python revenue.py rebuild`
+CREATE TABLE IF NOT EXISTS Revenue_Daily (
+    Fact_Date DATE NOT NULL,
+    Car_Type VARCHAR(30) NOT NULL,
+    Status VARCHAR(15) NOT NULL,
+    Bookings INT NOT NULL DEFAULT 0,
+    Revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (Fact_Date, Car_Type, Status)
+);
+
+-- Backfill from existing reservations
+INSERT INTO Revenue_Daily (Fact_Date, Car_Type, Status, Bookings, Revenue)
+SELECT r.Start_Date, c.Car_Type, r.Status, COUNT(*), COALESCE(SUM(r.Total_Amount), 0)
+FROM Reservation r JOIN Car c ON r.VIN = c.VIN
+GROUP BY r.Start_Date, c.Car_Type, r.Status;
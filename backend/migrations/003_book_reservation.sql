@@ -0,0 +1,95 @@
+-- BookReservation: lock the car row, price once, insert, and return the new
+-- reservation in the same call. Locking Car serializes bookings of one VIN
+-- (and only that VIN), so the overlap check in BI_Reservation_NoOverlap can no
+-- longer race with a concurrent booking and is the only check that runs.
+DELIMITER //
+DROP PROCEDURE IF EXISTS BookReservation //
+CREATE PROCEDURE BookReservation(
+    IN p_License_No VARCHAR(20),
+    IN p_VIN CHAR(17),
+    IN p_Start_Date DATE,
+    IN p_End_Date DATE,
+    IN p_Insurance_Type VARCHAR(30)
+)
+BEGIN
+    DECLARE v_car_type VARCHAR(30);
+    DECLARE v_days INT;
+    DECLARE v_daily DECIMAL(10,2) DEFAULT 0.00;
+    DECLARE v_ins DECIMAL(10,2) DEFAULT 0.00;
+
+    IF p_End_Date < p_Start_Date THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT='End date cannot be before start date';
+    END IF;
+
+    -- held until the caller commits or rolls back
+    SELECT Car_Type INTO v_car_type FROM Car WHERE VIN = p_VIN FOR UPDATE;
+    IF v_car_type IS NULL THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT='Car not found';
+    END IF;
+
+    -- same arithmetic as CalculateTotalCost
+    SET v_days = GREATEST(DATEDIFF(p_End_Date, p_Start_Date) + 1, 0);
+    SELECT IFNULL(Daily_Rate,0.00) INTO v_daily FROM Car_Type WHERE Car_Type = v_car_type LIMIT 1;
+    SELECT IFNULL(Insurance_Price,0.00) INTO v_ins FROM Insurance_Price
+      WHERE Car_Type = v_car_type AND Insurance_Type = p_Insurance_Type LIMIT 1;
+
+    INSERT INTO Reservation (
+        License_No, VIN, Start_Date, End_Date, Meter_Start,
+        Rental_Amount, Insurance_Amount, Total_Amount, Insurance_Type, Status
+    )
+    VALUES (
+        p_License_No, p_VIN, p_Start_Date, p_End_Date, 0,
+        v_days * v_daily, v_days * v_ins, v_days * (v_daily + v_ins), p_Insurance_Type, 'Confirmed'
+    );
+
+    -- same columns as stats.fetch_reservation
+    SELECT r.Reservation_ID, r.VIN, r.Start_Date, r.End_Date, r.Status, r.Total_Amount,
+           v_car_type AS Car_Type
+    FROM Reservation r WHERE r.Reservation_ID = LAST_INSERT_ID();
+END //
+DELIMITER ;
+
+-- AddReservation keeps its signature for existing callers but takes the
+-- locked path; its own overlap pre-check is dropped.
+DELIMITER //
+DROP PROCEDURE IF EXISTS AddReservation //
+CREATE PROCEDURE AddReservation(
+    IN p_License_No VARCHAR(20),
+    IN p_VIN CHAR(17),
+    IN p_Start_Date DATE,
+    IN p_End_Date DATE,
+    IN p_Insurance_Type VARCHAR(30)
+)
+BEGIN
+    CALL BookReservation(p_License_No, p_VIN, p_Start_Date, p_End_Date, p_Insurance_Type);
+END //
+DELIMITER ;
+
+-- Only re-check overlaps when an update can create one: the car or dates
+-- change, or the reservation becomes active again. Payment updates (amount
+-- only) skip the scan.
+DELIMITER //
+DROP TRIGGER IF EXISTS BU_Reservation_NoOverlap //
+CREATE TRIGGER BU_Reservation_NoOverlap
+BEFORE UPDATE ON Reservation
+FOR EACH ROW
+BEGIN
+  IF NEW.Status IN ('Pending','Confirmed')
+     AND (NEW.VIN <> OLD.VIN
+          OR NEW.Start_Date <> OLD.Start_Date
+          OR NEW.End_Date <> OLD.End_Date
+          OR IFNULL(OLD.Status,'') NOT IN ('Pending','Confirmed'))
+     AND EXISTS (
+    SELECT 1
+    FROM Reservation r
+    WHERE r.VIN = NEW.VIN
+      AND r.Reservation_ID <> OLD.Reservation_ID
+      AND r.Status IN ('Pending','Confirmed')
+      AND r.Start_Date <= NEW.End_Date
+      AND r.End_Date >= NEW.Start_Date
+  ) THEN
+    SIGNAL SQLSTATE '45000'
+      SET MESSAGE_TEXT = 'Overlapping reservation exists for this car';
+  END IF;
+END //
+DELIMITER ;
@@ -0,0 +1,14 @@
+-- Progress of the incremental car release worker (release_worker.py). Every
+-- confirmed reservation with End_Date <= Watermark has been processed.
+CREATE TABLE IF NOT EXISTS Release_Watermark (
+    Name VARCHAR(30) PRIMARY KEY,
+    Watermark DATE NOT NULL,
+    Last_Run_At DATETIME NULL,
+    Last_Scanned INT NOT NULL DEFAULT 0,
+    Last_Changed INT NOT NULL DEFAULT 0,
+    Total_Scanned BIGINT NOT NULL DEFAULT 0,
+    Total_Changed BIGINT NOT NULL DEFAULT 0
+);
+
+-- The worker replaces the daily full-join release event
+DROP EVENT IF EXISTS release_cars_after_end_date;
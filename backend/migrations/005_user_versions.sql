@@ -0,0 +1,7 @@
+-- Per-user change counter behind the ETags of /api/users/current and
+-- /api/my_reservations; bumped in the same transaction as every write that
+-- changes what those endpoints return. A missing row means version 0.
+CREATE TABLE IF NOT EXISTS User_Version (
+    License_No VARCHAR(20) PRIMARY KEY,
+    Version BIGINT NOT NULL DEFAULT 0
+);
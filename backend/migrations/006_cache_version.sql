@@ -0,0 +1,6 @@
+-- Version counters for caches kept in every app process (catalog.py). A
+-- writer bumps the row in its transaction; processes poll it to invalidate.
+CREATE TABLE IF NOT EXISTS Cache_Version (
+    Name VARCHAR(30) PRIMARY KEY,
+    Version BIGINT NOT NULL DEFAULT 0
+);
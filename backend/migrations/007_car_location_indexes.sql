@@ -0,0 +1,5 @@
+-- Branch-restricted fleet queries (the availability anti-join and calendar
+-- fallbacks with a location filter) look cars up by location and status.
+-- Also serves the Rental_Location_ID foreign key, whose implicit index MySQL
+-- then drops.
+CREATE INDEX idx_car_location_status ON Car (Rental_Location_ID, Status, Car_Type);
@@ -0,0 +1,19 @@
+-- Transactional outbox (outbox.py). Every reservation, payment and car
+-- release state change writes an event here in its own transaction; the
+-- dispatcher hands them to subscribers in Event_ID order.
+CREATE TABLE IF NOT EXISTS Outbox_Event (
+    Event_ID BIGINT AUTO_INCREMENT PRIMARY KEY,
+    Event_Type VARCHAR(40) NOT NULL,
+    Aggregate_ID VARCHAR(40) NULL,
+    Payload JSON NOT NULL,
+    Created_At DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    KEY idx_outbox_created (Created_At)
+);
+
+-- Last event each durable subscriber has fully handled
+CREATE TABLE IF NOT EXISTS Outbox_Offset (
+    Subscriber VARCHAR(50) PRIMARY KEY,
+    Last_Event_ID BIGINT NOT NULL DEFAULT 0,
+    Delivered BIGINT NOT NULL DEFAULT 0,
+    Updated_At DATETIME NULL
+);
@@ -0,0 +1,15 @@
+-- n-gram FULLTEXT indexes behind /api/admin/search (admin_search.py). The
+-- ngram parser indexes every ngram_token_size-character run (2 by default), so
+-- a quoted phrase matches anywhere inside a name, email, phone, VIN or plate,
+-- not just at word starts. InnoDB maintains them on every committed write.
+--
+-- With stopwords on, the ngram parser drops every token containing one, and
+-- the default list includes 'a' and 'i'; that would make most names
+-- unsearchable, so these indexes are built without a stopword list.
+SET SESSION innodb_ft_enable_stopword = OFF;
+
+CREATE FULLTEXT INDEX ft_user_search ON User (License_No, FName, MName, LName, Email) WITH PARSER ngram;
+
+CREATE FULLTEXT INDEX ft_user_phone_search ON User_Phone (Phone) WITH PARSER ngram;
+
+CREATE FULLTEXT INDEX ft_car_search ON Car (VIN, Reg_No, Model) WITH PARSER ngram;
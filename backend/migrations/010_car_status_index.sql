@@ -0,0 +1,3 @@
+-- release_worker.py sweeps Unavailable cars every pass for bookings that were
+-- confirmed only after the watermark had moved past their End_Date
+CREATE INDEX idx_car_status ON Car (Status);
@@ -0,0 +1,8 @@
+-- Cash payments have no card: the card columns of Payment become optional
+-- (Card_No still references Card_Details when it is set)
+ALTER TABLE Payment
+    MODIFY Card_No BIGINT NULL,
+    MODIFY Expiry_Date DATE NULL,
+    MODIFY Name_on_Card VARCHAR(100) NULL,
+    MODIFY CVV INT NULL,
+    MODIFY Billing_Address VARCHAR(200) NULL;
@@ -0,0 +1,39 @@
+-- Stats_Rollup: the daily counters behind /api/admin/stats, kept up to date by
+-- every write path (stats.py). Databases loaded from an older copy of
+-- Car_rental_system.sql may already have the table; it is only backfilled
+-- when empty, so counters recorded since then are kept. Rebuild it at any time
+-- with `python stats.py rebuild`.
+CREATE TABLE IF NOT EXISTS Stats_Rollup (
+    Stat_Date DATE NOT NULL,
+    Metric VARCHAR(40) NOT NULL,
+    Value DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (Stat_Date, Metric)
+);
+
+SET @stats_rollup_empty = (SELECT COUNT(*) = 0 FROM Stats_Rollup);
+
+-- Same rows as stats.rebuild(); 1000-01-01 holds the point-in-time gauges.
+-- HAVING rather than WHERE on the ungrouped counts, which return a row even
+-- when nothing matches
+INSERT INTO Stats_Rollup (Stat_Date, Metric, Value)
+SELECT '1000-01-01', 'users_total', COUNT(*) FROM User HAVING @stats_rollup_empty
+UNION ALL
+SELECT '1000-01-01', 'reservations_pending', COUNT(*) FROM Reservation WHERE Status = 'Pending'
+HAVING @stats_rollup_empty
+UNION ALL
+SELECT '1000-01-01', CONCAT('cars_', LOWER(Status)), COUNT(*) FROM Car WHERE @stats_rollup_empty GROUP BY Status
+UNION ALL
+SELECT '1000-01-01', 'cars_total', COUNT(*) FROM Car HAVING @stats_rollup_empty;
+
+INSERT INTO Stats_Rollup (Stat_Date, Metric, Value)
+SELECT Start_Date, CONCAT('bookings_', LOWER(Status)), COUNT(*)
+FROM Reservation WHERE @stats_rollup_empty GROUP BY Start_Date, Status;
+
+INSERT INTO Stats_Rollup (Stat_Date, Metric, Value)
+SELECT Start_Date, CONCAT('revenue_', LOWER(Status)), COALESCE(SUM(Total_Amount), 0)
+FROM Reservation WHERE Status IN ('Pending','Confirmed') AND @stats_rollup_empty
+GROUP BY Start_Date, Status;
+
+INSERT INTO Stats_Rollup (Stat_Date, Metric, Value)
+SELECT End_Date, 'confirmed_ending', COUNT(*)
+FROM Reservation WHERE Status = 'Confirmed' AND @stats_rollup_empty GROUP BY End_Date;
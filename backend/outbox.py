@@ -0,0 +1,369 @@
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import mysql.connector
+from db import get_db_connection
+
+# Transactional outbox (migration 008). Every reservation, payment, car
+# release and role change inserts an Outbox_Event row in the same transaction as
+# the change, so an event exists exactly when the change committed.
+#
+# The Dispatcher polls Outbox_Event in Event_ID order, BATCH_SIZE rows at a
+# time, and hands each subscriber the events past its offset. A subscriber's
+# offset only moves after its handler returns, so delivery is at-least-once
+# and handlers must be idempotent; a handler that raises gets the same events
+# again after OUTBOX_RETRY_DELAY seconds. Durable subscribers keep their
+# offset in Outbox_Offset and resume where they stopped; process-local ones
+# (cache upkeep in each app worker) start at the newest event.
+#
+# AUTO_INCREMENT IDs are handed out at insert time, not commit time, so an
+# event can become visible after a higher one. The dispatcher stops at a
+# missing ID and only skips it once every transaction that could still commit
+# it has ended: the ID's writer started before the gap was first seen, so when
+# the oldest open transaction in information_schema.innodb_trx started later
+# than that (or none is open), the ID was rolled back. That read needs the
+# PROCESS privilege; without it the dispatcher falls back to waiting
+# OUTBOX_GAP_TIMEOUT seconds per gap.
+
+logger = logging.getLogger(__name__)
+
+POLL = float(os.getenv('OUTBOX_POLL','1'))
+BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE','500'))
+GAP_TIMEOUT = float(os.getenv('OUTBOX_GAP_TIMEOUT','10'))
+RETRY_DELAY = float(os.getenv('OUTBOX_RETRY_DELAY','5'))
+
+RESERVATION_EVENTS = ('reservation.created', 'reservation.status_changed', 'reservation.updated',
+                      'reservation.deleted')
+ROLE_EVENTS = ('user.role_changed',)
+RESERVATION_FIELDS = ('Reservation_ID', 'License_No', 'VIN', 'Start_Date', 'End_Date', 'Status', 'Total_Amount')
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def emit_many(conn, events):
+    # events: (event_type, aggregate_id, payload) tuples; written by the
+    # caller's transaction, so call before its commit
+    if not events:
+        return
+    cur = conn.cursor()
+    cur.executemany("INSERT INTO Outbox_Event (Event_Type, Aggregate_ID, Payload) VALUES (%s, %s, %s)",
+                    [(event_type, None if aggregate_id is None else str(aggregate_id),
+                      json.dumps(payload, default=_json_default))
+                     for event_type, aggregate_id, payload in events])
+    cur.close()
+
+
+def emit(conn, event_type, aggregate_id, payload):
+    emit_many(conn, [(event_type, aggregate_id, payload)])
+
+
+def _reservation(row):
+    return None if row is None else {key: row.get(key) for key in RESERVATION_FIELDS}
+
+
+def reservation_event(before, after):
+    # before/after are stats.fetch_reservation() rows, as for
+    # stats.record_reservation_change; None for an insert or a delete
+    if before is None:
+        event_type = 'reservation.created'
+    elif after is None:
+        event_type = 'reservation.deleted'
+    elif before.get('Status') != after.get('Status'):
+        event_type = 'reservation.status_changed'
+    else:
+        event_type = 'reservation.updated'
+    return event_type, (after or before)['Reservation_ID'], {'before': _reservation(before),
+                                                             'after': _reservation(after)}
+
+
+def reservation_changed(conn, before, after):
+    emit_many(conn, [reservation_event(before, after)])
+
+
+def reservations_created(conn, rows):
+    emit_many(conn, [reservation_event(None, row) for row in rows])
+
+
+def payment_event(reservation_id, payment_id, amount, paid_by_cash):
+    return 'payment.recorded', reservation_id, {'Reservation_ID': reservation_id, 'Payment_ID': payment_id,
+                                                'Amount': amount, 'Paid_By_Cash': bool(paid_by_cash)}
+
+
+def role_changed(conn, license_no, user_type, version):
+    # version is the user's User_Version after the change, see roles.py
+    emit(conn, 'user.role_changed', license_no, {'License_No': license_no, 'User_Type': user_type,
+                                                 'Version': version})
+
+
+def cars_released(conn, vins):
+    emit_many(conn, [('car.released', vin, {'VIN': vin}) for vin in vins])
+
+
+class Subscriber:
+    def __init__(self, name, handler, types, durable):
+        self.name = name
+        self.handler = handler
+        self.types = None if types is None else frozenset(types)
+        self.durable = durable
+        self.offset = None
+        self.retry_at = 0.0
+        self.delivered = 0
+        self.failures = 0
+        self.last_error = None
+
+
+class Dispatcher:
+    def __init__(self, poll=POLL, batch_size=BATCH_SIZE):
+        self.poll = poll
+        self.batch_size = batch_size
+        self.subscribers = []
+        self._lock = threading.Lock()
+        self._thread = None
+        # first missing Event_ID -> [monotonic time it was first seen missing,
+        # server time on the poll after that]
+        self._gaps = {}
+        self._trx_view = True
+        self._counters = {'polls': 0, 'events_read': 0, 'gaps_waited': 0, 'gaps_skipped': 0, 'errors': 0}
+        self._last_error = None
+
+    def subscribe(self, name, handler, types=None, durable=False):
+        # handler(events) receives a list of event dicts (Event_ID, Event_Type,
+        # Aggregate_ID, Payload, Created_At) in Event_ID order, filtered to
+        # types when given
+        with self._lock:
+            self.subscribers.append(Subscriber(name, handler, types, durable))
+
+    def _init_offsets(self, conn):
+        pending = [s for s in self.subscribers if s.offset is None]
+        if not pending:
+            return
+        cur = conn.cursor()
+        cur.execute("SELECT COALESCE(MAX(Event_ID), 0) FROM Outbox_Event")
+        newest = cur.fetchone()[0]
+        for sub in pending:
+            if sub.durable:
+                cur.execute("INSERT IGNORE INTO Outbox_Offset (Subscriber, Last_Event_ID, Updated_At) "
+                            "VALUES (%s, %s, NOW())", (sub.name, newest))
+                cur.execute("SELECT Last_Event_ID FROM Outbox_Offset WHERE Subscriber=%s", (sub.name,))
+                sub.offset = cur.fetchone()[0]
+            else:
+                sub.offset = newest
+        conn.commit()
+        cur.close()
+
+    def _trx_horizon(self, conn):
+        # (server NOW(), start of the oldest other open transaction or None),
+        # or None when innodb_trx can't be read
+        if not self._trx_view:
+            return None
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT NOW(), (SELECT MIN(trx_started) FROM information_schema.innodb_trx
+                               WHERE trx_mysql_thread_id <> CONNECTION_ID())
+            """)
+            return cur.fetchone()
+        except mysql.connector.Error as e:
+            self._trx_view = False
+            logger.warning("Outbox cannot read innodb_trx (%s); skipping gaps after %ss instead", e, GAP_TIMEOUT)
+            return None
+        finally:
+            cur.close()
+
+    def _gap_closed(self, event_id, now, horizon):
+        # True once nothing can still commit event_id. horizon is read before
+        # the rows, so a writer gone by then would have shown up in them.
+        gap = self._gaps.get(event_id)
+        if gap is None:
+            self._gaps[event_id] = [now, None]
+            return False
+        if horizon is None:
+            return now - gap[0] >= GAP_TIMEOUT
+        server_now, oldest = horizon
+        if gap[1] is None:
+            # the first server time known to be after the gap was seen
+            gap[1] = server_now
+        return oldest is None or oldest > gap[1]
+
+    def _ready(self, low, rows, horizon):
+        # The prefix of rows that can be delivered: stops at a missing ID that
+        # may still be committed
+        now = time.monotonic()
+        expected = low + 1
+        ready = []
+        for row in rows:
+            if row['Event_ID'] != expected:
+                if not self._gap_closed(expected, now, horizon):
+                    self._counters['gaps_waited'] += 1
+                    break
+                self._gaps.pop(expected)
+                self._counters['gaps_skipped'] += 1
+            ready.append(row)
+            expected = row['Event_ID'] + 1
+        for event_id in [e for e in self._gaps if e <= low]:
+            del self._gaps[event_id]
+        return ready
+
+    def _deliver(self, conn, sub, events):
+        wanted = events if sub.types is None else [e for e in events if e['Event_Type'] in sub.types]
+        try:
+            if wanted:
+                sub.handler(wanted)
+        except Exception as e:
+            sub.failures += 1
+            sub.last_error = str(e)
+            sub.retry_at = time.monotonic() + RETRY_DELAY
+            logger.exception("Outbox subscriber %s failed at event %s", sub.name, wanted[0]['Event_ID'])
+            return
+        last = events[-1]['Event_ID']
+        if sub.durable:
+            cur = conn.cursor()
+            cur.execute("UPDATE Outbox_Offset SET Last_Event_ID=%s, Delivered=Delivered+%s, Updated_At=NOW() "
+                        "WHERE Subscriber=%s", (last, len(wanted), sub.name))
+            conn.commit()
+            cur.close()
+        sub.offset = last
+        sub.delivered += len(wanted)
+        sub.last_error = None
+
+    def run_once(self, conn):
+        # One batch for every subscriber that is not waiting to retry. Returns
+        # True when a full batch was delivered and more may be waiting.
+        with self._lock:
+            self._init_offsets(conn)
+            now = time.monotonic()
+            active = [s for s in self.subscribers if s.retry_at <= now]
+            if not active:
+                return False
+            low = min(s.offset for s in active)
+            horizon = self._trx_horizon(conn) if self._gaps else None
+            cur = conn.cursor(dictionary=True)
+            cur.execute("""
+                SELECT Event_ID, Event_Type, Aggregate_ID, Payload, Created_At FROM Outbox_Event
+                WHERE Event_ID > %s ORDER BY Event_ID LIMIT %s
+            """, (low, self.batch_size))
+            rows = cur.fetchall()
+            cur.close()
+            conn.commit()
+            self._counters['polls'] += 1
+            self._counters['events_read'] += len(rows)
+            for row in rows:
+                if isinstance(row['Payload'], (str, bytes, bytearray)):
+                    row['Payload'] = json.loads(row['Payload'])
+            ready = self._ready(low, rows, horizon)
+            for sub in active:
+                events = [e for e in ready if e['Event_ID'] > sub.offset]
+                if events:
+                    self._deliver(conn, sub, events)
+            return len(rows) == self.batch_size and len(ready) == len(rows)
+
+    def _run(self):
+        while True:
+            try:
+                with get_db_connection() as conn:
+                    while self.run_once(conn):
+                        pass
+                self._last_error = None
+            except Exception as e:
+                self._counters['errors'] += 1
+                # one line per distinct failure rather than one per poll
+                if str(e) != self._last_error:
+                    logger.exception("Outbox dispatch failed")
+                self._last_error = str(e)
+            time.sleep(self.poll)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='outbox-dispatcher', daemon=True)
+                self._thread.start()
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._counters)
+            data['running'] = self._thread is not None
+            data['pending_gaps'] = len(self._gaps)
+            data['subscribers'] = [{
+                'name': s.name,
+                'durable': s.durable,
+                'offset': s.offset,
+                'delivered': s.delivered,
+                'failures': s.failures,
+                'last_error': s.last_error,
+            } for s in self.subscribers]
+        return data
+
+
+dispatcher = Dispatcher()
+
+
+def prune(conn, keep_days, chunk=10000):
+    # Deletes events older than keep_days that every durable subscriber has
+    # handled. Returns the number of rows removed.
+    cur = conn.cursor()
+    cur.execute("SELECT MIN(Last_Event_ID) FROM Outbox_Offset")
+    handled = cur.fetchone()[0]
+    cutoff = datetime.now() - timedelta(days=keep_days)
+    removed = 0
+    while True:
+        if handled is None:
+            cur.execute("DELETE FROM Outbox_Event WHERE Created_At < %s ORDER BY Event_ID LIMIT %s",
+                        (cutoff, chunk))
+        else:
+            cur.execute("DELETE FROM Outbox_Event WHERE Created_At < %s AND Event_ID <= %s "
+                        "ORDER BY Event_ID LIMIT %s", (cutoff, handled, chunk))
+        conn.commit()
+        removed += cur.rowcount
+        if cur.rowcount < chunk:
+            break
+    cur.close()
+    return removed
+
+
+def status(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*), MIN(Event_ID), MAX(Event_ID), MIN(Created_At) FROM Outbox_Event")
+    count, first, last, oldest = cur.fetchone()
+    print(f"events: {count} (ids {first}..{last}, oldest {oldest})")
+    cur.execute("SELECT Subscriber, Last_Event_ID, Delivered, Updated_At FROM Outbox_Offset ORDER BY Subscriber")
+    for name, offset, delivered, updated in cur.fetchall():
+        print(f"{name}: offset={offset} behind={(last or 0) - offset} delivered={delivered} updated={updated}")
+    cur.close()
+
+
+def _print_events(events):
+    for e in events:
+        print(f"{e['Event_ID']} {e['Created_At']} {e['Event_Type']} {e['Aggregate_ID']} "
+              f"{json.dumps(e['Payload'], sort_keys=True)}", flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Inspect, follow and prune the reservation event outbox')
+    parser.add_argument('command', choices=['status', 'tail', 'prune'])
+    parser.add_argument('--durable', metavar='NAME',
+                        help='with tail: follow as a durable subscriber that resumes where it stopped')
+    parser.add_argument('--keep-days', type=int, default=30, help='with prune: keep events this recent')
+    args = parser.parse_args()
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    if args.command == 'status':
+        with get_db_connection() as conn:
+            status(conn)
+    elif args.command == 'prune':
+        with get_db_connection() as conn:
+            print(f"removed {prune(conn, args.keep_days)} events")
+    else:
+        tail = Dispatcher()
+        tail.subscribe(args.durable or 'tail', _print_events, durable=bool(args.durable))
+        tail._run()
@@ -0,0 +1,86 @@
+from flask import Response, current_app, request, stream_with_context, url_for
+from db import get_db_connection
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+def page_args(key_type=int, default_limit=DEFAULT_LIMIT):
+    # Reads ?limit=&after= ; raises ValueError on malformed input
+    limit = int(request.args.get('limit', default_limit))
+    if limit < 1 or limit > MAX_LIMIT:
+        raise ValueError(f'limit must be between 1 and {MAX_LIMIT}')
+    after = request.args.get('after')
+    if after is not None:
+        after = key_type(after)
+    return limit, after
+
+
+def keyset_query(select, key_column, limit, after=None, where=None, params=(), group_by=None):
+    # Newest first: the next page continues strictly below the last key returned.
+    # One extra row is fetched to tell whether another page exists.
+    clauses = [where] if where else []
+    params = list(params)
+    if after is not None:
+        clauses.append(f"{key_column} < %s")
+        params.append(after)
+    sql = select
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    if group_by:
+        sql += " GROUP BY " + group_by
+    sql += f" ORDER BY {key_column} DESC LIMIT %s"
+    params.append(limit + 1)
+    return sql, params
+
+
+def _next_url(limit, next_cursor):
+    args = dict(request.args, limit=limit, after=next_cursor)
+    args.update(request.view_args or {})
+    return url_for(request.endpoint, **args)
+
+
+def fetch_page(sql, params, key_field, limit, read_only=False):
+    # Same page shape as stream_page, built in memory for responses that get cached
+    with get_db_connection(read_only) as conn:
+        cur = conn.cursor(dictionary=True)
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+        cur.close()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = rows[-1][key_field] if has_more else None
+    return {'items': rows, 'next_cursor': next_cursor,
+            'next': _next_url(limit, next_cursor) if has_more else None}
+
+
+def stream_page(sql, params, key_field, limit, read_only=False):
+    # Rows go from an unbuffered cursor straight to the client, so memory stays
+    # at one row regardless of page size. The connection is held until the
+    # last byte is written and then returned to the pool. read_only as for
+    # get_db_connection().
+    def generate():
+        dumps = current_app.json.dumps
+        with get_db_connection(read_only) as conn:
+            cur = conn.cursor(dictionary=True)
+            cur.execute(sql, params)
+            yield '{"items":['
+            count = 0
+            last_key = None
+            has_more = False
+            for row in cur:
+                if count == limit:
+                    has_more = True
+                    break
+                if count:
+                    yield ','
+                yield dumps(row)
+                last_key = row[key_field]
+                count += 1
+            cur.fetchall()
+            cur.close()
+        next_cursor = last_key if has_more else None
+        next_url = _next_url(limit, next_cursor) if has_more else None
+        yield '],"next_cursor":' + dumps(next_cursor) + ',"next":' + dumps(next_url) + '}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
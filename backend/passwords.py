@@ -0,0 +1,138 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Password hashing runs in a small process pool so a burst of logins cannot
+# pin the request threads (or the GIL) of a worker. At most PASSWORD_HASH_QUEUE
+# hashes may be running or waiting; beyond that callers get HashPoolBusy at
+# once and the route answers 503. PASSWORD_HASH_METHOD is any werkzeug method
+# string (e.g. scrypt:32768:8:1 or pbkdf2:sha256:600000); hashes made with a
+# different method or cost are replaced on the next successful login.
+# PASSWORD_HASH_WORKERS=0 hashes inline on the calling thread.
+HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD','scrypt:32768:8:1')
+HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(min(os.cpu_count() or 1, 4))))
+HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', str(max(HASH_WORKERS, 1) * 8)))
+HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT','10'))
+
+
+class HashPoolBusy(Exception):
+    pass
+
+
+def _method_prefix(method):
+    # werkzeug fills in defaults (scrypt -> scrypt:32768:8:1), so compare
+    # against the prefix it actually writes
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
+
+def _verify(stored, password, method, prefix):
+    # Runs in a pool process. Returns (ok, replacement hash or None).
+    try:
+        ok = check_password_hash(stored, password)
+    except Exception:
+        # legacy rows stored the password itself
+        ok = (stored == password)
+    if ok and stored.split('$', 1)[0] != prefix:
+        return True, generate_password_hash(password, method=method)
+    return ok, None
+
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+class HashPool:
+    def __init__(self, workers=HASH_WORKERS, queue=HASH_QUEUE, timeout=HASH_TIMEOUT, method=HASH_METHOD):
+        self.workers = workers
+        self.timeout = timeout
+        self.method = method
+        self._prefix = None
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(queue)
+        self._lock = threading.Lock()
+        self.queue = queue
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.seconds_total = 0.0
+        self.seconds_max = 0.0
+
+    def _pool(self):
+        # spawn, not fork: the app process holds DB sockets and threads
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def prefix(self):
+        if self._prefix is None:
+            self._prefix = _method_prefix(self.method)
+        return self._prefix
+
+    def _finish(self, started):
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+            self.seconds_total += elapsed
+            self.seconds_max = max(self.seconds_max, elapsed)
+        self._slots.release()
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashPoolBusy('Too many sign-ins in progress, please retry')
+        started = time.monotonic()
+        with self._lock:
+            self.in_flight += 1
+        if not self.workers:
+            try:
+                return fn(*args)
+            finally:
+                self._finish(started)
+        try:
+            future = self._pool().submit(fn, *args)
+        except BaseException:
+            self._finish(started)
+            raise
+        # The slot is held until the hash itself is done, not until the caller
+        # stops waiting, so timed-out hashes still count against the queue
+        future.add_done_callback(lambda _: self._finish(started))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise HashPoolBusy('Password check timed out, please retry')
+
+    def hash_password(self, password):
+        return self._run(_hash, password, self.method)
+
+    def verify_password(self, stored, password):
+        # (ok, new_hash); new_hash is set when the stored hash should be replaced
+        ok, new_hash = self._run(_verify, stored or '', password, self.method, self.prefix())
+        if new_hash:
+            with self._lock:
+                self.rehashed += 1
+        return ok, new_hash
+
+    def stats(self):
+        with self._lock:
+            return {
+                'method': self.method,
+                'workers': self.workers,
+                'queue': self.queue,
+                'in_flight': self.in_flight,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'rehashed': self.rehashed,
+                'avg_seconds': round(self.seconds_total / self.completed, 4) if self.completed else None,
+                'max_seconds': round(self.seconds_max, 4),
+            }
+
+
+hash_pool = HashPool()
@@ -0,0 +1,269 @@
+import contextvars
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from db import set_query_hook
+
+# Per-request latency and DB accounting. start_request() opens a record for the
+# current request, every statement run through a pooled cursor (db.TimedCursor)
+# adds to it, and the callback from request_finisher() folds it into per-route
+# stats once the response body has been sent:
+#   - lifetime counters and latency histograms (for the Prometheus text output)
+#   - PERF_WINDOW_MINUTES one-minute slots, so /api/admin/perf shows recent
+#     behaviour rather than everything since the process started
+#   - the slowest normalized statement seen per route
+# Requests slower than PERF_SLOW_MS go to a bounded slow log (and a warning).
+
+logger = logging.getLogger(__name__)
+
+SLOW_MS = float(os.getenv('PERF_SLOW_MS','500'))
+SLOW_LOG_SIZE = int(os.getenv('PERF_SLOW_LOG_SIZE','200'))
+WINDOW_MINUTES = int(os.getenv('PERF_WINDOW_MINUTES','15'))
+
+# upper bounds in seconds; the last bucket is +Inf
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = contextvars.ContextVar('perf_request', default=None)
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDERS = re.compile(r'\?(?:\s*,\s*\?)+')
+_SPACE = re.compile(r'\s+')
+
+
+def normalize_sql(sql, limit=200):
+    # One shape per statement: literals and %s become ?, IN lists collapse
+    if isinstance(sql, bytes):
+        sql = sql.decode(errors='replace')
+    sql = _SPACE.sub(' ', str(sql)).strip()
+    sql = _STRING.sub('?', sql.replace('%s', '?'))
+    sql = _PLACEHOLDERS.sub('?+', _NUMBER.sub('?', sql))
+    return sql if len(sql) <= limit else sql[:limit] + '...'
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                break
+        else:
+            i = len(BUCKETS)
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th request (max for the last one)
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return self.max
+
+
+class RouteStats:
+    def __init__(self):
+        self.latency = Histogram()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.errors = 0
+        # deque of [minute, latency histogram, queries, db seconds, errors]
+        self.window = deque()
+        self.slowest_sql = None
+        self.slowest_sql_seconds = 0.0
+
+    def add(self, record, seconds, error):
+        self.latency.add(seconds)
+        self.queries += record['queries']
+        self.db_seconds += record['db_seconds']
+        self.errors += error
+        minute = int(time.time() // 60)
+        if not self.window or self.window[-1][0] != minute:
+            self.window.append([minute, Histogram(), 0, 0.0, 0])
+        slot = self.window[-1]
+        slot[1].add(seconds)
+        slot[2] += record['queries']
+        slot[3] += record['db_seconds']
+        slot[4] += error
+        while self.window[0][0] <= minute - WINDOW_MINUTES:
+            self.window.popleft()
+        if record['slowest_seconds'] > self.slowest_sql_seconds:
+            self.slowest_sql_seconds = record['slowest_seconds']
+            self.slowest_sql = record['slowest_sql']
+
+    def recent(self):
+        cutoff = int(time.time() // 60) - WINDOW_MINUTES
+        latency = Histogram()
+        queries = db_seconds = errors = 0
+        for minute, hist, q, db, err in self.window:
+            if minute > cutoff:
+                latency.merge(hist)
+                queries += q
+                db_seconds += db
+                errors += err
+        return latency, queries, db_seconds, errors
+
+
+_lock = threading.Lock()
+_routes = {}
+_slow_log = deque(maxlen=SLOW_LOG_SIZE)
+
+
+def query_budget(statements, round_trips=None):
+    # Declares how many statements one request to the route may run once its
+    # caches are warm, and how many round trips (statements plus commits and
+    # rollbacks, by default statements + 1). Place it directly under
+    # @app.route; tests/test_query_budgets.py enforces it.
+    def decorate(f):
+        f.query_budget = {'statements': statements,
+                          'round_trips': statements + 1 if round_trips is None else round_trips}
+        return f
+    return decorate
+
+
+def _on_query(sql, seconds, statement):
+    record = _current.get()
+    if record is None:
+        return
+    record['queries'] += statement
+    record['db_seconds'] += seconds
+    if seconds > record['slowest_seconds']:
+        record['slowest_seconds'] = seconds
+        record['slowest_sql'] = sql
+
+
+def start_request():
+    _current.set({'started': time.perf_counter(), 'queries': 0, 'db_seconds': 0.0,
+                  'slowest_seconds': 0.0, 'slowest_sql': None})
+
+
+def request_finisher(method, route, path, status):
+    # Returns the callback that closes the current request's record; route is
+    # the URL rule ('/api/admin/reservation/<int:reservation_id>'), so per-ID
+    # paths share one entry
+    record = _current.get()
+    if record is None:
+        return lambda: None
+
+    def finish():
+        if _current.get() is record:
+            _current.set(None)
+        _finish(record, method, route, path, status)
+    return finish
+
+
+def _finish(record, method, route, path, status):
+    seconds = time.perf_counter() - record['started']
+    if record['slowest_sql'] is not None:
+        record['slowest_sql'] = normalize_sql(record['slowest_sql'])
+    with _lock:
+        stats = _routes.get((method, route))
+        if stats is None:
+            stats = _routes[(method, route)] = RouteStats()
+        stats.add(record, seconds, status >= 500)
+    if seconds * 1000 >= SLOW_MS:
+        entry = {
+            'at': datetime.now().isoformat(timespec='seconds'),
+            'method': method,
+            'route': route,
+            'path': path,
+            'status': status,
+            'ms': round(seconds * 1000, 1),
+            'queries': record['queries'],
+            'db_ms': round(record['db_seconds'] * 1000, 1),
+            'slowest_sql': record['slowest_sql'],
+            'slowest_sql_ms': round(record['slowest_seconds'] * 1000, 1),
+        }
+        _slow_log.append(entry)
+        logger.warning("Slow request: %s %s %sms, %s queries (%sms in DB)",
+                       method, path, entry['ms'], entry['queries'], entry['db_ms'])
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def perf_report():
+    # Recent window per route, busiest DB users first
+    routes = []
+    with _lock:
+        for (method, route), stats in _routes.items():
+            latency, queries, db_seconds, errors = stats.recent()
+            if not latency.count:
+                continue
+            routes.append({
+                'method': method,
+                'route': route,
+                'requests': latency.count,
+                'errors': errors,
+                'p50_ms': _ms(latency.quantile(0.5)),
+                'p95_ms': _ms(latency.quantile(0.95)),
+                'p99_ms': _ms(latency.quantile(0.99)),
+                'max_ms': _ms(latency.max),
+                'avg_ms': _ms(latency.sum / latency.count),
+                'queries_per_request': round(queries / latency.count, 2),
+                'db_ms_total': _ms(db_seconds),
+                'db_ms_per_request': _ms(db_seconds / latency.count),
+                'slowest_sql': stats.slowest_sql,
+                'slowest_sql_ms': _ms(stats.slowest_sql_seconds),
+            })
+        slow = list(_slow_log)
+    routes.sort(key=lambda r: r['db_ms_total'], reverse=True)
+    return {'window_minutes': WINDOW_MINUTES, 'slow_ms': SLOW_MS, 'routes': routes, 'slow_requests': slow[::-1]}
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text():
+    lines = [
+        '# HELP carrental_http_request_duration_seconds Request wall time per route.',
+        '# TYPE carrental_http_request_duration_seconds histogram',
+    ]
+    counters = []
+    with _lock:
+        for (method, route), stats in sorted(_routes.items()):
+            labels = f'method="{_label(method)}",route="{_label(route)}"'
+            cumulative = 0
+            for bound, n in zip(BUCKETS + ('+Inf',), stats.latency.counts):
+                cumulative += n
+                lines.append(f'carrental_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'carrental_http_request_duration_seconds_sum{{{labels}}} {stats.latency.sum:.6f}')
+            lines.append(f'carrental_http_request_duration_seconds_count{{{labels}}} {stats.latency.count}')
+            counters.append((labels, stats.queries, stats.db_seconds, stats.errors))
+    lines += ['# HELP carrental_http_request_db_queries_total Statements run while serving the route.',
+              '# TYPE carrental_http_request_db_queries_total counter']
+    lines += [f'carrental_http_request_db_queries_total{{{labels}}} {q}' for labels, q, _, _ in counters]
+    lines += ['# HELP carrental_http_request_db_seconds_total Time spent executing statements for the route.',
+              '# TYPE carrental_http_request_db_seconds_total counter']
+    lines += [f'carrental_http_request_db_seconds_total{{{labels}}} {db:.6f}' for labels, _, db, _ in counters]
+    lines += ['# HELP carrental_http_request_errors_total Responses with a 5xx status.',
+              '# TYPE carrental_http_request_errors_total counter']
+    lines += [f'carrental_http_request_errors_total{{{labels}}} {e}' for labels, _, _, e in counters]
+    return '\n'.join(lines) + '\n'
+
+
+set_query_hook(_on_query)
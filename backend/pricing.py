@@ -0,0 +1,167 @@
+import argparse
+import os
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+import numpy as np
+from catalog import get_fleet
+from db import get_db_connection
+
+# Python port of CalculateTotalCost: total = days * (Daily_Rate + Insurance_Price)
+# with days = max(DATEDIFF(end, start) + 1, 0) and a missing rate counting as 0.
+# Rates are held as integer cents so bulk results match the DECIMAL(12,2)
+# arithmetic of the stored function exactly.
+
+RATES_TTL = float(os.getenv('PRICING_TTL','60'))
+
+
+def _cents(value):
+    return int((Decimal(value) * 100).to_integral_value())
+
+
+class RateTable:
+    def __init__(self, car_types, insurance_types, daily, insurance, checksum):
+        self.car_types = car_types
+        self.insurance_types = insurance_types
+        self.type_index = {t: i for i, t in enumerate(car_types)}
+        self.insurance_index = {t: i for i, t in enumerate(insurance_types)}
+        # daily[t] and insurance[t, i] in cents
+        self.daily = daily
+        self.insurance = insurance
+        self.checksum = checksum
+
+
+def _checksum(cur):
+    cur.execute("CHECKSUM TABLE Car_Type, Insurance_Price")
+    return tuple(row[1] for row in cur.fetchall())
+
+
+def _load(cur):
+    checksum = _checksum(cur)
+    cur.execute("SELECT Car_Type, Daily_Rate FROM Car_Type ORDER BY Car_Type")
+    type_rows = cur.fetchall()
+    cur.execute("SELECT Insurance_Type FROM Insurance_Type ORDER BY Insurance_Type")
+    insurance_types = [r[0] for r in cur.fetchall()]
+    cur.execute("SELECT Car_Type, Insurance_Type, Insurance_Price FROM Insurance_Price")
+    price_rows = cur.fetchall()
+
+    car_types = [r[0] for r in type_rows]
+    daily = np.array([_cents(r[1] or 0) for r in type_rows], dtype=np.int64)
+    table = RateTable(car_types, insurance_types, daily,
+                      np.zeros((len(car_types), len(insurance_types)), dtype=np.int64), checksum)
+    for car_type, insurance_type, price in price_rows:
+        t = table.type_index.get(car_type)
+        i = table.insurance_index.get(insurance_type)
+        if t is not None and i is not None:
+            table.insurance[t, i] = _cents(price or 0)
+    return table
+
+
+_lock = threading.Lock()
+_table = None
+_checked_at = 0.0
+
+
+def get_rates():
+    # After RATES_TTL a CHECKSUM TABLE round trip decides whether to reload;
+    # rate edits made through the app call invalidate_rates() directly.
+    global _table, _checked_at
+    table = _table
+    if table is not None and time.monotonic() - _checked_at < RATES_TTL:
+        return table
+    with _lock:
+        if _table is None or time.monotonic() - _checked_at >= RATES_TTL:
+            with get_db_connection() as conn:
+                cur = conn.cursor()
+                if _table is None or _checksum(cur) != _table.checksum:
+                    _table = _load(cur)
+                cur.close()
+            _checked_at = time.monotonic()
+        return _table
+
+
+def invalidate_rates():
+    global _table
+    with _lock:
+        _table = None
+
+
+def quote_matrix(car_types, insurance_types, ranges, rates=None):
+    # car_types: C names, insurance_types: I names, ranges: D (start, end) dates.
+    # Everything comes back in cents: daily[C], insurance_daily[C, I], days[D],
+    # rental[C, D], insurance[C, I, D] and total[C, I, D].
+    rates = rates or get_rates()
+    t_idx = np.array([rates.type_index.get(t, -1) for t in car_types], dtype=np.int64)
+    i_idx = np.array([rates.insurance_index.get(i, -1) for i in insurance_types], dtype=np.int64)
+    starts = np.array([np.datetime64(s, 'D') for s, _ in ranges], dtype='datetime64[D]')
+    ends = np.array([np.datetime64(e, 'D') for _, e in ranges], dtype='datetime64[D]')
+    days = np.maximum((ends - starts).astype(np.int64) + 1, 0)
+
+    # Unknown car or insurance types price at 0, as the IFNULL defaults do
+    known_t = t_idx >= 0
+    known = known_t[:, None] & (i_idx[None, :] >= 0)
+    daily = np.where(known_t, rates.daily[t_idx], 0)
+    ins_daily = np.where(known, rates.insurance[t_idx[:, None], i_idx[None, :]], 0)
+
+    return {
+        'daily': daily,
+        'insurance_daily': ins_daily,
+        'days': days,
+        'rental': daily[:, None] * days[None, :],
+        'insurance': ins_daily[:, :, None] * days[None, None, :],
+        'total': (daily[:, None, None] + ins_daily[:, :, None]) * days[None, None, :],
+    }
+
+
+def quote_cars(vins, insurance_types, ranges):
+    fleet = {car['VIN']: car for car in get_fleet()}
+    missing = [vin for vin in vins if vin not in fleet]
+    if missing:
+        raise KeyError(f'Unknown VIN {missing[0]}')
+    rates = get_rates()
+    insurance_types = list(insurance_types or rates.insurance_types)
+    car_types = [fleet[vin]['Car_Type'] for vin in vins]
+    q = quote_matrix(car_types, insurance_types, ranges, rates)
+    return {
+        'cars': [{'VIN': vin, 'Car_Type': car_type} for vin, car_type in zip(vins, car_types)],
+        'insurance_types': insurance_types,
+        'ranges': [{'start': s.isoformat(), 'end': e.isoformat(), 'days': int(d)}
+                   for (s, e), d in zip(ranges, q['days'])],
+        'daily_rate': (q['daily'] / 100).tolist(),
+        'insurance_rate': (q['insurance_daily'] / 100).tolist(),
+        'rental_amount': (q['rental'] / 100).tolist(),
+        'insurance_amount': (q['insurance'] / 100).tolist(),
+        'total': (q['total'] / 100).tolist(),
+    }
+
+
+def verify(conn, ranges):
+    # Compares every car type x insurance type x range against the stored function
+    cur = conn.cursor()
+    rates = _load(cur)
+    total = quote_matrix(rates.car_types, rates.insurance_types, ranges, rates)['total']
+    mismatches = []
+    for t, car_type in enumerate(rates.car_types):
+        for i, insurance_type in enumerate(rates.insurance_types):
+            for d, (start, end) in enumerate(ranges):
+                cur.execute("SELECT CalculateTotalCost(%s, %s, %s, %s)", (car_type, insurance_type, start, end))
+                expected = _cents(cur.fetchone()[0])
+                if expected != int(total[t, i, d]):
+                    mismatches.append((car_type, insurance_type, start, end, expected, int(total[t, i, d])))
+    cur.close()
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check the Python pricing engine against CalculateTotalCost')
+    parser.add_argument('command', choices=['verify'])
+    args = parser.parse_args()
+    today = date.today()
+    sample = [(today, today), (today, today + timedelta(days=6)), (today, today + timedelta(days=29)),
+              (today + timedelta(days=3), today)]
+    with get_db_connection() as conn:
+        bad = verify(conn, sample)
+    for row in bad:
+        print("MISMATCH", row)
+    print(f"{len(bad)} mismatches")
@@ -0,0 +1,182 @@
+import argparse
+import os
+import time
+from datetime import date, datetime, timedelta
+from catalog import bump_catalog_version
+from db import get_db_connection
+import outbox
+import stats
+
+# Releases cars whose confirmed reservations have ended (End_Date < today).
+# Release_Watermark (migration 004) records the last End_Date processed, so each
+# pass reads only reservations that ended since the previous one through the
+# (Status, End_Date) index, rather than joining every confirmed reservation
+# ever made. Cars that still have a confirmed booking ending today or later
+# stay Unavailable.
+#
+# A reservation confirmed late (paid after its End_Date, once the watermark is
+# past it) is never in that range, so each pass also sweeps the Unavailable
+# cars (idx_car_status, migration 010) for one whose confirmed reservations
+# all ended on or before the watermark, as the old daily event did.
+#
+# Runs every RELEASE_INTERVAL seconds (default 300), so a
+# car is back on sale within minutes of midnight instead of up to a day.
+# Releases bump the catalog version so app processes drop their cached fleet,
+# and write a car.released outbox event per car.
+
+WORKER = 'car_release'
+START_WATERMARK = date(1000, 1, 1)
+INTERVAL = float(os.getenv('RELEASE_INTERVAL','300'))
+BATCH_SIZE = int(os.getenv('RELEASE_BATCH_SIZE','500'))
+
+
+def _placeholders(values):
+    return ','.join(['%s'] * len(values))
+
+
+def read_watermark(cur):
+    cur.execute("SELECT Watermark FROM Release_Watermark WHERE Name=%s", (WORKER,))
+    row = cur.fetchone()
+    return row[0] if row else START_WATERMARK
+
+
+def run_once(conn, today=None, batch_size=BATCH_SIZE, dry_run=False, since=None):
+    # Returns the pass metrics; dry_run reports what would change without
+    # writing anything, including the watermark. since overrides the stored
+    # watermark to re-check reservations that ended after it.
+    today = today or date.today()
+    cutoff = today - timedelta(days=1)
+    cur = conn.cursor()
+    watermark = since if since is not None else read_watermark(cur)
+    result = {'watermark': watermark, 'cutoff': cutoff, 'scanned': 0, 'late': 0, 'cars': 0,
+              'skipped_follow_on': 0, 'changed': 0}
+
+    ended = []
+    if cutoff > watermark:
+        cur.execute("""
+            SELECT VIN, COUNT(*) FROM Reservation
+            WHERE Status = 'Confirmed' AND End_Date > %s AND End_Date <= %s
+            GROUP BY VIN
+        """, (watermark, cutoff))
+        ended = cur.fetchall()
+    result['scanned'] = sum(n for _, n in ended)
+    cur.execute("""
+        SELECT c.VIN FROM Car c
+        WHERE c.Status = 'Unavailable'
+          AND EXISTS (
+            SELECT 1 FROM Reservation r
+            WHERE r.VIN = c.VIN AND r.Status = 'Confirmed' AND r.End_Date <= %s
+          )
+          AND NOT EXISTS (
+            SELECT 1 FROM Reservation r
+            WHERE r.VIN = c.VIN AND r.Status = 'Confirmed' AND r.End_Date > %s
+          )
+    """, (min(watermark, cutoff), min(watermark, cutoff)))
+    late = {r[0] for r in cur.fetchall()}
+    result['late'] = len(late)
+    vins = sorted(late.union(vin for vin, _ in ended))
+    result['cars'] = len(vins)
+
+    for i in range(0, len(vins), batch_size):
+        batch = vins[i:i + batch_size]
+        cur.execute(f"""
+            SELECT DISTINCT VIN FROM Reservation
+            WHERE Status = 'Confirmed' AND End_Date >= %s AND VIN IN ({_placeholders(batch)})
+        """, [today] + batch)
+        follow_on = {r[0] for r in cur.fetchall()}
+        result['skipped_follow_on'] += len(follow_on)
+        free = [vin for vin in batch if vin not in follow_on]
+        if not free:
+            continue
+        if dry_run:
+            cur.execute(f"SELECT COUNT(*) FROM Car WHERE Status = 'Unavailable' AND VIN IN ({_placeholders(free)})",
+                        free)
+            result['changed'] += cur.fetchone()[0]
+            continue
+        # The NOT EXISTS repeats the follow-on check so a booking confirmed
+        # since the SELECT above still keeps its car blocked. The rows stay
+        # locked until commit, so exactly these cars are released and announced.
+        cur.execute(f"""
+            SELECT c.VIN FROM Car c
+            WHERE c.Status = 'Unavailable' AND c.VIN IN ({_placeholders(free)})
+              AND NOT EXISTS (
+                SELECT 1 FROM Reservation r
+                WHERE r.VIN = c.VIN AND r.Status = 'Confirmed' AND r.End_Date >= %s
+              )
+            FOR UPDATE
+        """, free + [today])
+        released = [r[0] for r in cur.fetchall()]
+        if released:
+            cur.execute(f"UPDATE Car SET Status = 'Available' WHERE VIN IN ({_placeholders(released)})", released)
+        changed = len(released)
+        stats.record_car_status_change(conn, 'Unavailable', 'Available', changed)
+        if changed:
+            bump_catalog_version(conn)
+            outbox.cars_released(conn, released)
+        conn.commit()
+        result['changed'] += changed
+
+    if not dry_run:
+        cur.execute("""
+            INSERT INTO Release_Watermark (Name, Watermark, Last_Run_At, Last_Scanned, Last_Changed,
+                                           Total_Scanned, Total_Changed)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE Watermark = VALUES(Watermark), Last_Run_At = VALUES(Last_Run_At),
+                Last_Scanned = VALUES(Last_Scanned), Last_Changed = VALUES(Last_Changed),
+                Total_Scanned = Total_Scanned + VALUES(Total_Scanned),
+                Total_Changed = Total_Changed + VALUES(Total_Changed)
+        """, (WORKER, max(watermark, cutoff), datetime.now(), result['scanned'], result['changed'],
+              result['scanned'], result['changed']))
+        conn.commit()
+    cur.close()
+    return result
+
+
+def _report(result, dry_run):
+    print(f"{datetime.now():%Y-%m-%d %H:%M:%S} {'[dry-run] ' if dry_run else ''}"
+          f"ended {result['watermark']}..{result['cutoff']}: scanned={result['scanned']} "
+          f"late={result['late']} cars={result['cars']} skipped_follow_on={result['skipped_follow_on']} "
+          f"{'would_change' if dry_run else 'changed'}={result['changed']}", flush=True)
+
+
+def serve(interval=INTERVAL, batch_size=BATCH_SIZE, dry_run=False):
+    while True:
+        try:
+            with get_db_connection() as conn:
+                _report(run_once(conn, batch_size=batch_size, dry_run=dry_run), dry_run)
+        except Exception as e:
+            print("Release pass failed:", e, flush=True)
+        time.sleep(interval)
+
+
+def status(conn):
+    cur = conn.cursor(dictionary=True)
+    cur.execute("SELECT * FROM Release_Watermark WHERE Name=%s", (WORKER,))
+    row = cur.fetchone()
+    cur.close()
+    if not row:
+        print("never run")
+        return
+    for key, value in row.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Incrementally release cars whose reservations have ended')
+    parser.add_argument('command', nargs='?', default='run', choices=['run', 'once', 'status'])
+    parser.add_argument('--interval', type=float, default=INTERVAL, help='seconds between passes')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--rescan-from', type=date.fromisoformat, metavar='YYYY-MM-DD',
+                        help='with once: re-check reservations that ended after this date')
+    args = parser.parse_args()
+
+    if args.command == 'status':
+        with get_db_connection() as conn:
+            status(conn)
+    elif args.command == 'once':
+        with get_db_connection() as conn:
+            _report(run_once(conn, batch_size=args.batch_size, dry_run=args.dry_run, since=args.rescan_from),
+                    args.dry_run)
+    else:
+        serve(args.interval, args.batch_size, args.dry_run)
@@ -0,0 +1,125 @@
+import argparse
+from bisect import bisect_left, bisect_right
+from calendar import monthrange
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import accumulate
+from db import get_db_connection
+
+# Revenue_Daily holds one row per (Start_Date, Car_Type, Status) with the number
+# of bookings and their summed Total_Amount. It is adjusted in the same
+# transaction as every reservation/payment write (via stats.record_*), so
+# revenue views read a few rows per day instead of aggregating Reservation.
+
+GRANULARITIES = ('day', 'week', 'month')
+
+
+def apply_reservation_deltas(conn, rows_with_sign):
+    # rows_with_sign: iterable of (reservation row, +1/-1); rows need
+    # Start_Date, Car_Type, Status and Total_Amount
+    merged = defaultdict(lambda: [0, Decimal(0)])
+    for row, sign in rows_with_sign:
+        key = (row['Start_Date'], row['Car_Type'], row['Status'] or 'Pending')
+        merged[key][0] += sign
+        merged[key][1] += sign * Decimal(row['Total_Amount'] or 0)
+    rows = [(d, t, s, b, r) for (d, t, s), (b, r) in merged.items() if b or r]
+    if not rows:
+        return
+    cur = conn.cursor()
+    cur.executemany("""
+        INSERT INTO Revenue_Daily (Fact_Date, Car_Type, Status, Bookings, Revenue)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE Bookings = Bookings + VALUES(Bookings), Revenue = Revenue + VALUES(Revenue)
+    """, rows)
+    cur.close()
+
+
+def rebuild(conn):
+    cur = conn.cursor()
+    cur.execute("DELETE FROM Revenue_Daily")
+    cur.execute("""
+        INSERT INTO Revenue_Daily (Fact_Date, Car_Type, Status, Bookings, Revenue)
+        SELECT r.Start_Date, c.Car_Type, r.Status, COUNT(*), COALESCE(SUM(r.Total_Amount), 0)
+        FROM Reservation r JOIN Car c ON r.VIN = c.VIN
+        GROUP BY r.Start_Date, c.Car_Type, r.Status
+    """)
+    cur.close()
+
+
+def _bucket_start(d, granularity):
+    if granularity == 'week':
+        return d - timedelta(days=d.weekday())
+    if granularity == 'month':
+        return d.replace(day=1)
+    return d
+
+
+def _bucket_last(d, granularity):
+    # Days from d to the last day of its bucket
+    if granularity == 'week':
+        return 6 - d.weekday()
+    if granularity == 'month':
+        return monthrange(d.year, d.month)[1] - d.day
+    return 0
+
+
+class RevenueRange:
+    # Prefix sums over the days in [start, end] that have facts, so any
+    # sub-range or bucket total is two binary searches; memory follows the
+    # number of fact rows, not the length of the range.
+    def __init__(self, start, end, facts):
+        self.start = start
+        self.end = end
+        per_day = defaultdict(lambda: [0, Decimal(0)])
+        by_type = defaultdict(lambda: [0, Decimal(0)])
+        for fact_date, car_type, count, amount in facts:
+            per_day[fact_date][0] += count
+            per_day[fact_date][1] += amount
+            by_type[car_type][0] += count
+            by_type[car_type][1] += amount
+        self.days = sorted(per_day)
+        self.by_type = dict(by_type)
+        self._bookings_prefix = [0] + list(accumulate(per_day[d][0] for d in self.days))
+        self._revenue_prefix = [Decimal(0)] + list(accumulate(per_day[d][1] for d in self.days))
+
+    def total(self, first=None, last=None):
+        i = bisect_left(self.days, first or self.start)
+        j = bisect_right(self.days, last or self.end)
+        return (self._bookings_prefix[j] - self._bookings_prefix[i],
+                self._revenue_prefix[j] - self._revenue_prefix[i])
+
+    def buckets(self, granularity='day'):
+        # Yields (bucket_start, bookings, revenue) covering the whole range; the
+        # first and last buckets are clipped to the range. Steps stay within
+        # the range, so a range ending on date.max does not overflow.
+        d = self.start
+        while True:
+            last = d + timedelta(days=min(_bucket_last(d, granularity), (self.end - d).days))
+            bookings, amount = self.total(d, last)
+            yield _bucket_start(d, granularity), bookings, amount
+            if last >= self.end:
+                return
+            d = last + timedelta(days=1)
+
+
+def load_range(conn, start, end, statuses):
+    # One range read on the (Fact_Date, Car_Type, Status) primary key
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT Fact_Date, Car_Type, Bookings, Revenue FROM Revenue_Daily
+        WHERE Fact_Date BETWEEN %s AND %s AND Status IN ({','.join(['%s'] * len(statuses))})
+    """, [start, end] + list(statuses))
+    facts = cur.fetchall()
+    cur.close()
+    return RevenueRange(start, end, facts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Maintain the Revenue_Daily fact table')
+    parser.add_argument('command', choices=['rebuild'])
+    args = parser.parse_args()
+    with get_db_connection() as conn:
+        rebuild(conn)
+        conn.commit()
+    print("Revenue_Daily rebuilt")
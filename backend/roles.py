@@ -0,0 +1,70 @@
+import os
+import threading
+import time
+
+# The role is resolved at login and kept in the session, stamped with the
+# user's User_Version (migration 005) and the time it was read. admin_required
+# trusts the stamp without touching the database and re-reads User_Type only
+# when the stamp is older than ROLE_RECHECK seconds, or when this process has
+# seen a newer User_Version for the user. Role changes emit a user.role_changed
+# outbox event carrying the new version, and each worker's dispatcher feeds it
+# into _seen_versions, so a demoted admin is refused within one outbox poll
+# everywhere, and within ROLE_RECHECK even when dispatch is off.
+
+ROLE_RECHECK = float(os.getenv('ROLE_RECHECK','30'))
+
+_lock = threading.Lock()
+_counters = {'hits': 0, 'misses': 0, 'stale': 0}
+# license_no -> newest User_Version this process has seen from a role change
+_seen_versions = {}
+
+
+def _count(key):
+    with _lock:
+        _counters[key] += 1
+
+
+def remember_role(session, license_no, user_type, version):
+    session['role'] = {
+        'license_no': license_no,
+        'user_type': user_type,
+        'version': version,
+        'checked_at': time.time(),
+    }
+
+
+def role_changed(license_no, version):
+    with _lock:
+        if version > _seen_versions.get(license_no, -1):
+            _seen_versions[license_no] = version
+
+
+def apply_role_events(events):
+    # outbox subscriber for user.role_changed
+    for event in events:
+        role_changed(event['Aggregate_ID'], event['Payload']['Version'])
+
+
+def cached_role(session):
+    # Returns the cached User_Type, or None when it must be re-read from the DB
+    entry = session.get('role')
+    license_no = session.get('license_no')
+    if not entry or entry.get('license_no') != license_no:
+        _count('misses')
+        return None
+    with _lock:
+        seen = _seen_versions.get(license_no, -1)
+    if seen > entry.get('version', -1) or time.time() - entry.get('checked_at', 0) > ROLE_RECHECK:
+        _count('stale')
+        return None
+    _count('hits')
+    return entry['user_type']
+
+
+def role_cache_stats():
+    with _lock:
+        data = dict(_counters)
+        data['tracked_users'] = len(_seen_versions)
+    lookups = data['hits'] + data['misses'] + data['stale']
+    data['hit_rate'] = data['hits'] / lookups if lookups else 0.0
+    return data
@@ -5,11 +5,10 @@ payment_bp = Blueprint('payment_bp', __name__, url_prefix='/api/payments')
 
 @payment_bp.route('/all', methods=['GET'])
 def get_payments():
-    conn = get_db_connection()
-    cur = conn.cursor(dictionary=True)
-    cur.execute("SELECT * FROM Payment")
-    rows = cur.fetchall()
-    conn.close()
+    with get_db_connection() as conn:
+        cur = conn.cursor(dictionary=True)
+        cur.execute("SELECT * FROM Payment")
+        rows = cur.fetchall()
     return jsonify(rows)
 
 @payment_bp.route('/add', methods=['POST'])
@@ -19,20 +18,19 @@ def add_payment():
     for f in fields:
         if f not in data:
             return jsonify({'error':f'Missing {f}'}), 400
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO Payment (Amount, Card_No, Expiry_Date, Name_on_Card, CVV, Billing_Address, Paid_By_Cash)
-        VALUES (%s,%s,%s,%s,%s,%s,%s)
-    """, (
-        data['Amount'],
-        data['Card_No'],
-        data['Expiry_Date'],
-        data['Name_on_Card'],
-        data['CVV'],
-        data['Billing_Address'],
-        int(bool(data['Paid_By_Cash']))
-    ))
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO Payment (Amount, Card_No, Expiry_Date, Name_on_Card, CVV, Billing_Address, Paid_By_Cash)
+            VALUES (%s,%s,%s,%s,%s,%s,%s)
+        """, (
+            data['Amount'],
+            data['Card_No'],
+            data['Expiry_Date'],
+            data['Name_on_Card'],
+            data['CVV'],
+            data['Billing_Address'],
+            int(bool(data['Paid_By_Cash']))
+        ))
+        conn.commit()
     return jsonify({'message':'Payment recorded'})
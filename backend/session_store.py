@@ -0,0 +1,202 @@
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+# Server-side sessions in one SQLite file (WAL mode) with an in-process LRU in
+# front. A cached entry is reused when the row's Version still matches, which
+# is an index-only lookup, so other worker processes on the same host see each
+# other's writes. Expired rows are swept every SESSION_SWEEP_INTERVAL seconds.
+# Values are encoded with Flask's tagged JSON (as cookie sessions are), not pickle.
+
+SESSION_FILE = os.getenv('SESSION_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sessions.sqlite3'))
+SESSION_LRU_SIZE = int(os.getenv('SESSION_LRU_SIZE','10000'))
+SESSION_SWEEP_INTERVAL = float(os.getenv('SESSION_SWEEP_INTERVAL','300'))
+
+_serializer = TaggedJSONSerializer()
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+
+class SqliteSessionStore:
+    def __init__(self, path=SESSION_FILE, lru_size=SESSION_LRU_SIZE, sweep_interval=SESSION_SWEEP_INTERVAL):
+        self.path = path
+        self.lru_size = lru_size
+        self.sweep_interval = sweep_interval
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # sid -> (version, expires, data)
+        self._lru = OrderedDict()
+        self._last_sweep = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.swept = 0
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS Sessions (
+                Sid TEXT PRIMARY KEY,
+                Version INTEGER NOT NULL,
+                Expires REAL NOT NULL,
+                Data TEXT NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS Sessions_Expires ON Sessions (Expires)")
+
+    def _conn(self):
+        # sqlite3 connections stay on the thread that opened them
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, sid, version, expires, data):
+        if not self.lru_size:
+            return
+        with self._lock:
+            self._lru[sid] = (version, expires, data)
+            self._lru.move_to_end(sid)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def _forget(self, sid):
+        with self._lock:
+            self._lru.pop(sid, None)
+
+    def get(self, sid, now=None):
+        now = now or time.time()
+        conn = self._conn()
+        with self._lock:
+            cached = self._lru.get(sid)
+        if cached:
+            row = conn.execute("SELECT Version, Expires FROM Sessions WHERE Sid = ?", (sid,)).fetchone()
+            if row and row[0] == cached[0] and row[1] > now:
+                with self._lock:
+                    self.hits += 1
+                    if sid in self._lru:
+                        self._lru.move_to_end(sid)
+                return dict(cached[2])
+        with self._lock:
+            self.misses += 1
+        row = conn.execute("SELECT Version, Expires, Data FROM Sessions WHERE Sid = ? AND Expires > ?",
+                           (sid, now)).fetchone()
+        if not row:
+            self._forget(sid)
+            return None
+        data = _serializer.loads(row[2])
+        self._remember(sid, row[0], row[1], data)
+        return dict(data)
+
+    def set(self, sid, data, expires):
+        conn = self._conn()
+        row = conn.execute("""
+            INSERT INTO Sessions (Sid, Version, Expires, Data) VALUES (?, 1, ?, ?)
+            ON CONFLICT (Sid) DO UPDATE SET Version = Version + 1, Expires = excluded.Expires, Data = excluded.Data
+            RETURNING Version
+        """, (sid, expires, _serializer.dumps(data))).fetchone()
+        with self._lock:
+            self.writes += 1
+        self._remember(sid, row[0], expires, dict(data))
+        self._maybe_sweep()
+
+    def delete(self, sid):
+        self._conn().execute("DELETE FROM Sessions WHERE Sid = ?", (sid,))
+        self._forget(sid)
+
+    def sweep(self, now=None):
+        now = now or time.time()
+        removed = self._conn().execute("DELETE FROM Sessions WHERE Expires <= ?", (now,)).rowcount
+        with self._lock:
+            for sid in [sid for sid, entry in self._lru.items() if entry[1] <= now]:
+                del self._lru[sid]
+            self.swept += removed
+        return removed
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        self.sweep()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': 'sqlite',
+                'lru_entries': len(self._lru),
+                'lru_size': self.lru_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'writes': self.writes,
+                'swept': self.swept,
+            }
+
+
+class StoreSessionInterface(SessionInterface):
+    # The cookie carries only a signed random session ID
+    def __init__(self, store):
+        self.store = store
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='server-session')
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+            if sid:
+                data = self.store.get(sid)
+                if data is not None:
+                    return ServerSession(data, sid=sid)
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def regenerate(self, session):
+        # New sid for the session's data (call at login so a sid planted before
+        # it is worthless afterwards); the old row goes at once. Same call as
+        # Flask-Session's interface, so app code works with either backend.
+        if not session.new:
+            self.store.delete(session.sid)
+        session.sid = secrets.token_urlsafe(32)
+        session.new = True
+        session.modified = True
+
+    def save_session(self, app, session, response):
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        name = self.get_cookie_name(app)
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if not self.should_set_cookie(app, session):
+            return
+        expires = self.get_expiration_time(app, session)
+        lifetime = expires or datetime.now(timezone.utc) + app.permanent_session_lifetime
+        self.store.set(session.sid, dict(session), lifetime.timestamp())
+        response.set_cookie(name, self._signer(app).sign(session.sid).decode(), expires=expires,
+                            httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                            secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
@@ -0,0 +1,217 @@
+import argparse
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from db import get_db_connection
+from cache_versions import bump_versions
+import revenue
+from user_versions import bump_user_versions
+
+# Counters behind /api/admin/stats live in Stats_Rollup keyed by (Stat_Date, Metric).
+# Per-day metrics use the reservation's Start_Date (bookings_*, revenue_*), its
+# End_Date (confirmed_ending) or the day of the write (users_new). Point-in-time
+# totals that have no natural day are stored on GAUGE_DATE.
+# Reservation changes recorded here also keep the Revenue_Daily facts in step
+# and bump the owner's User_Version (ETags of the per-user endpoints) and the
+# 'reservations' / 'users' change counters the admin dashboard stream polls.
+GAUGE_DATE = date(1000, 1, 1)
+
+REVENUE_STATUSES = ('Pending', 'Confirmed')
+
+
+def apply_deltas(conn, deltas):
+    # deltas: iterable of (stat_date, metric, amount); runs inside the caller's
+    # transaction so the counters commit or roll back with the write itself.
+    merged = defaultdict(Decimal)
+    for stat_date, metric, amount in deltas:
+        merged[(stat_date, metric)] += Decimal(amount)
+    rows = [(d, m, v) for (d, m), v in merged.items() if v]
+    if not rows:
+        return
+    cur = conn.cursor()
+    cur.executemany("""
+        INSERT INTO Stats_Rollup (Stat_Date, Metric, Value) VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE Value = Value + VALUES(Value)
+    """, rows)
+    cur.close()
+
+
+def fetch_reservation(conn, reservation_id):
+    cur = conn.cursor(dictionary=True)
+    cur.execute("""
+        SELECT r.Reservation_ID, r.License_No, r.VIN, r.Start_Date, r.End_Date, r.Status, r.Total_Amount,
+               c.Car_Type, c.Status AS Car_Status
+        FROM Reservation r JOIN Car c ON r.VIN = c.VIN
+        WHERE r.Reservation_ID = %s
+    """, (reservation_id,))
+    row = cur.fetchone()
+    cur.close()
+    return row
+
+
+def _reservation_deltas(row, sign):
+    status = row['Status'] or 'Pending'
+    metric_status = status.lower()
+    deltas = [(row['Start_Date'], f'bookings_{metric_status}', sign)]
+    if status in REVENUE_STATUSES:
+        deltas.append((row['Start_Date'], f'revenue_{metric_status}', sign * (row['Total_Amount'] or 0)))
+    if status == 'Pending':
+        deltas.append((GAUGE_DATE, 'reservations_pending', sign))
+    if status == 'Confirmed':
+        deltas.append((row['End_Date'], 'confirmed_ending', sign))
+    return deltas
+
+
+def record_reservation_change(conn, before, after):
+    # before/after are fetch_reservation() rows; None for an insert or a delete
+    deltas = []
+    facts = []
+    if before:
+        deltas += _reservation_deltas(before, -1)
+        facts.append((before, -1))
+    if after:
+        deltas += _reservation_deltas(after, 1)
+        facts.append((after, 1))
+    apply_deltas(conn, deltas)
+    revenue.apply_reservation_deltas(conn, facts)
+    bump_user_versions(conn, [row.get('License_No') for row, _ in facts])
+    bump_versions(conn, ['reservations'])
+
+
+def record_reservations_added(conn, rows):
+    deltas = []
+    for row in rows:
+        deltas += _reservation_deltas(row, 1)
+    apply_deltas(conn, deltas)
+    revenue.apply_reservation_deltas(conn, [(row, 1) for row in rows])
+    bump_user_versions(conn, [row.get('License_No') for row in rows])
+    bump_versions(conn, ['reservations'])
+
+
+def record_car_status_change(conn, old_status, new_status, count=1):
+    # count > 1 records the same transition for several cars at once
+    if old_status == new_status:
+        return
+    deltas = []
+    if old_status:
+        deltas.append((GAUGE_DATE, f'cars_{old_status.lower()}', -count))
+    else:
+        deltas.append((GAUGE_DATE, 'cars_total', count))
+    if new_status:
+        deltas.append((GAUGE_DATE, f'cars_{new_status.lower()}', count))
+    else:
+        deltas.append((GAUGE_DATE, 'cars_total', -count))
+    apply_deltas(conn, deltas)
+
+
+def record_user_added(conn):
+    apply_deltas(conn, [
+        (GAUGE_DATE, 'users_total', 1),
+        (date.today(), 'users_new', 1),
+    ])
+    bump_versions(conn, ['users'])
+
+
+def refresh_car_gauges(conn):
+    # Used after bulk car updates where per-row deltas are unknown
+    cur = conn.cursor()
+    cur.execute("DELETE FROM Stats_Rollup WHERE Stat_Date = %s AND Metric LIKE 'cars\\_%%'", (GAUGE_DATE,))
+    cur.execute("""
+        INSERT INTO Stats_Rollup (Stat_Date, Metric, Value)
+        SELECT %s, CONCAT('cars_', LOWER(Status)), COUNT(*) FROM Car GROUP BY Status
+        UNION ALL
+        SELECT %s, 'cars_total', COUNT(*) FROM Car
+    """, (GAUGE_DATE, GAUGE_DATE))
+    cur.close()
+
+
+def rebuild(conn):
+    # User has no creation timestamp, so users_new history cannot be recovered;
+    # only counts recorded from now on will show up.
+    cur = conn.cursor()
+    cur.execute("DELETE FROM Stats_Rollup")
+    cur.execute("""
+        INSERT INTO Stats_Rollup (Stat_Date, Metric, Value)
+        SELECT %s, 'users_total', COUNT(*) FROM User
+        UNION ALL
+        SELECT %s, 'reservations_pending', COUNT(*) FROM Reservation WHERE Status = 'Pending'
+    """, (GAUGE_DATE, GAUGE_DATE))
+    cur.execute("""
+        INSERT INTO Stats_Rollup (Stat_Date, Metric, Value)
+        SELECT Start_Date, CONCAT('bookings_', LOWER(Status)), COUNT(*)
+        FROM Reservation GROUP BY Start_Date, Status
+    """)
+    cur.execute("""
+        INSERT INTO Stats_Rollup (Stat_Date, Metric, Value)
+        SELECT Start_Date, CONCAT('revenue_', LOWER(Status)), COALESCE(SUM(Total_Amount), 0)
+        FROM Reservation WHERE Status IN ('Pending','Confirmed')
+        GROUP BY Start_Date, Status
+    """)
+    cur.execute("""
+        INSERT INTO Stats_Rollup (Stat_Date, Metric, Value)
+        SELECT End_Date, 'confirmed_ending', COUNT(*)
+        FROM Reservation WHERE Status = 'Confirmed' GROUP BY End_Date
+    """)
+    cur.close()
+    refresh_car_gauges(conn)
+
+
+def _first_of_month(d):
+    return d.replace(day=1)
+
+
+def read_admin_stats(conn, today=None):
+    today = today or date.today()
+    this_month = _first_of_month(today)
+    last_month = _first_of_month(this_month - timedelta(days=1))
+    next_month = _first_of_month(this_month + timedelta(days=31))
+
+    # One primary-key range read: the gauge rows plus every day from last month on
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT Stat_Date, Metric, Value FROM Stats_Rollup
+        WHERE Stat_Date = %s OR Stat_Date >= %s
+    """, (GAUGE_DATE, last_month))
+    rows = cur.fetchall()
+    cur.close()
+
+    gauges = {}
+    new_users = active = 0
+    monthly_revenue = last_month_revenue = Decimal(0)
+    for stat_date, metric, value in rows:
+        if stat_date == GAUGE_DATE:
+            gauges[metric] = value
+        elif metric == 'users_new' and stat_date == today:
+            new_users = value
+        elif metric == 'confirmed_ending' and stat_date >= today:
+            active += value
+        elif metric == 'revenue_confirmed':
+            if this_month <= stat_date < next_month:
+                monthly_revenue += value
+            elif last_month <= stat_date < this_month:
+                last_month_revenue += value
+
+    revenue_change = 0
+    if last_month_revenue > 0:
+        revenue_change = ((monthly_revenue - last_month_revenue) / last_month_revenue) * 100
+
+    return {
+        'totalUsers': int(gauges.get('users_total', 0)),
+        'newUsers': int(new_users),
+        'activeReservations': int(active),
+        'pendingReservations': int(gauges.get('reservations_pending', 0)),
+        'availableCars': int(gauges.get('cars_available', 0)),
+        'totalCars': int(gauges.get('cars_total', 0)),
+        'monthlyRevenue': float(monthly_revenue),
+        'revenueChange': float(revenue_change)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Maintain the Stats_Rollup table behind /api/admin/stats')
+    parser.add_argument('command', choices=['rebuild'])
+    args = parser.parse_args()
+    with get_db_connection() as conn:
+        rebuild(conn)
+        conn.commit()
+    print("Stats_Rollup rebuilt")
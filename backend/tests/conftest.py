@@ -0,0 +1,30 @@
+import os
+import sys
+import pytest
+
+# The database tests (query budgets, query plans) run against a throwaway MySQL
+# schema loaded from Car_rental_system.sql plus `python migrate.py`. Name it in
+# TEST_DB_NAME (host, user and password come from the usual DB_* settings);
+# without it those tests are skipped. They write fixture rows, so never point
+# it at a database you care about.
+TEST_DB_NAME = os.getenv('TEST_DB_NAME')
+if TEST_DB_NAME:
+    os.environ['DB_NAME'] = TEST_DB_NAME
+# hash inline: the budget tests count statements in this process only
+os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+# no outbox polling from a background thread while statements are counted
+os.environ.setdefault('OUTBOX_DISPATCH', '0')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def mysql():
+    if not TEST_DB_NAME:
+        pytest.skip('set TEST_DB_NAME to a throwaway MySQL schema to run the database tests')
+    from db import get_db_connection
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.fetchall()
+        cur.close()
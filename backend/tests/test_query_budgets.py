@@ -0,0 +1,304 @@
+from datetime import date, timedelta
+import pytest
+from werkzeug.security import generate_password_hash
+from app import app
+from availability import availability_index
+from booking import book_reservation
+from catalog import bump_catalog_version, invalidate_fleet
+from db import get_db_connection, set_query_hook
+from fleet_io import CHUNK, export_csv
+from passwords import HASH_METHOD
+from perf import normalize_sql
+from roles import remember_role
+from user_versions import user_version
+import stats
+
+# Runs every Flask route once cold and once warm through the test client and
+# counts what each request sends to MySQL: statements (cursor execute /
+# executemany / callproc) and round trips (statements plus commits and
+# rollbacks). The warm request must stay within the @query_budget declared
+# next to the route, and every route needs a budget and a case in CASES.
+# Needs TEST_DB_NAME (see conftest.py); run with -rA to see each route's counts.
+#
+# Fixture rows (user, admin, car) are kept between runs; reservations and
+# registrations made by the run are removed at the end.
+
+FIXTURE_LICENSE = 'QBUDGET01'
+FIXTURE_ADMIN = 'QBUDGETAD'
+FIXTURE_PASSWORD = 'budget-pass'
+FIXTURE_VIN = 'QBUDGETCAR0000001'
+REGISTER_PREFIX = 'QBREG'
+FAR_FUTURE = date(2350, 1, 1)
+
+# endpoint -> why it is not measured
+EXEMPT = {
+    'static': 'static files',
+    'api_admin_dashboard_stream': 'holds the request open as an event stream',
+}
+
+
+class StatementCounter:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.statements = 0
+        self.round_trips = 0
+        self.seconds = 0.0
+        self.sql = []
+
+    def __call__(self, sql, seconds, statement):
+        self.statements += statement
+        self.round_trips += 1
+        self.seconds += seconds
+        self.sql.append(normalize_sql(sql))
+
+    def snapshot(self):
+        return {'statements': self.statements, 'round_trips': self.round_trips,
+                'db_ms': round(self.seconds * 1000, 2), 'sql': list(self.sql)}
+
+
+class Fixture:
+    def __init__(self):
+        self._day = 0
+        self._registered = 0
+        self.role_toggle = False
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT Rental_Location_ID FROM Rental_Location ORDER BY Rental_Location_ID LIMIT 1")
+            location = cur.fetchone()
+            cur.execute("SELECT Car_Type FROM Car_Type ORDER BY Car_Type LIMIT 1")
+            car_type = cur.fetchone()
+            cur.execute("""SELECT Insurance_Type FROM Insurance_Price WHERE Car_Type = %s
+                           ORDER BY Insurance_Type LIMIT 1""", (car_type[0] if car_type else None,))
+            insurance = cur.fetchone()
+            if not (location and car_type and insurance):
+                pytest.fail('Load Car_rental_system.sql and run migrate.py first')
+            self.insurance = insurance[0]
+            password = generate_password_hash(FIXTURE_PASSWORD, method=HASH_METHOD)
+            for license_no, user_type in ((FIXTURE_LICENSE, 'Customer'), (FIXTURE_ADMIN, 'Admin')):
+                cur.execute("SELECT 1 FROM User WHERE License_No = %s", (license_no,))
+                if cur.fetchone():
+                    continue
+                cur.execute("""
+                    INSERT INTO User (License_No, FName, LName, Email, Address, DOB, User_Type)
+                    VALUES (%s, 'Budget', 'Fixture', %s, 'n/a', '1990-01-01', %s)
+                """, (license_no, f'{license_no.lower()}@example.invalid', user_type))
+                cur.execute("""INSERT INTO User_Credential (Password, Year_Of_Membership, License_No)
+                               VALUES (%s, YEAR(CURDATE()), %s)""", (password, license_no))
+                stats.record_user_added(conn)
+            cur.execute("SELECT Status FROM Car WHERE VIN = %s", (FIXTURE_VIN,))
+            car = cur.fetchone()
+            if not car:
+                cur.execute("""
+                    INSERT INTO Car (VIN, Rental_Location_ID, Reg_No, Status, Seating_Capacity, Car_Type, Model)
+                    VALUES (%s, %s, 'QBUDGET', 'Available', 5, %s, 'Budget Fixture')
+                """, (FIXTURE_VIN, location[0], car_type[0]))
+                stats.record_car_status_change(conn, None, 'Available')
+                bump_catalog_version(conn)
+            conn.commit()
+            cur.close()
+        invalidate_fleet()
+
+    def next_range(self, days=2):
+        # far-future, never overlapping, so every booking goes through
+        start = FAR_FUTURE + timedelta(days=self._day)
+        self._day += days + 1
+        return start, start + timedelta(days=days - 1)
+
+    def reservation(self):
+        start, end = self.next_range()
+        with get_db_connection() as conn:
+            row = book_reservation(conn, FIXTURE_LICENSE, FIXTURE_VIN, start, end, self.insurance)
+            stats.record_reservation_change(conn, None, row)
+            conn.commit()
+        availability_index.add(row['Reservation_ID'], FIXTURE_VIN, start, end)
+        return row['Reservation_ID']
+
+    def register_license(self):
+        self._registered += 1
+        return f'{REGISTER_PREFIX}{self._registered:07d}'
+
+    def cleanup(self):
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT Reservation_ID FROM Reservation WHERE VIN = %s", (FIXTURE_VIN,))
+            for (reservation_id,) in cur.fetchall():
+                row = stats.fetch_reservation(conn, reservation_id)
+                cur.execute("DELETE FROM Reservation WHERE Reservation_ID = %s", (reservation_id,))
+                stats.record_reservation_change(conn, row, None)
+                availability_index.remove(reservation_id)
+            cur.execute("SELECT Status FROM Car WHERE VIN = %s", (FIXTURE_VIN,))
+            status = cur.fetchone()[0]
+            if status != 'Available':
+                cur.execute("UPDATE Car SET Status = 'Available' WHERE VIN = %s", (FIXTURE_VIN,))
+                stats.record_car_status_change(conn, status, 'Available')
+                bump_catalog_version(conn)
+            cur.execute("UPDATE User SET User_Type = 'Customer' WHERE License_No = %s", (FIXTURE_LICENSE,))
+            cur.execute("DELETE FROM User WHERE License_No LIKE %s", (REGISTER_PREFIX + '%',))
+            if cur.rowcount:
+                stats.apply_deltas(conn, [(stats.GAUGE_DATE, 'users_total', -cur.rowcount),
+                                          (date.today(), 'users_new', -cur.rowcount)])
+            conn.commit()
+            cur.close()
+        invalidate_fleet()
+
+
+def _dates(fx):
+    start, end = fx.next_range()
+    return str(start), str(end)
+
+
+def _role_body(fx):
+    fx.role_toggle = not fx.role_toggle
+    return {'User_Type': 'Guest' if fx.role_toggle else 'Customer'}
+
+
+def _cars_csv(fx):
+    # the first CHUNK rows of the current fleet, re-imported unchanged
+    with get_db_connection() as conn:
+        text = ''.join(export_csv(conn, 'cars'))
+    return '\n'.join(text.split('\n')[:CHUNK + 1]) + '\n'
+
+
+def _register_body(fx):
+    license_no = fx.register_license()
+    return {'License_No': license_no, 'FName': 'Budget', 'LName': 'Register', 'Email': f'{license_no}@example.invalid',
+            'Address': 'n/a', 'DOB': '1990-01-01', 'Password': FIXTURE_PASSWORD, 'Phone': '9000000000'}
+
+
+def _booking_body(fx):
+    start, end = _dates(fx)
+    return {'License_No': FIXTURE_LICENSE, 'VIN': FIXTURE_VIN, 'Start_Date': start, 'End_Date': end,
+            'Insurance_Type': fx.insurance}
+
+
+def _batch_body(fx):
+    return {'reservations': [_booking_body(fx), _booking_body(fx)]}
+
+
+def _quote_body(fx):
+    start, end = _dates(fx)
+    return {'VINs': [FIXTURE_VIN], 'Insurance_Types': [fx.insurance],
+            'Ranges': [{'Start_Date': start, 'End_Date': end}]}
+
+
+def _payment_body(fx):
+    return {'Amount': '100.00', 'Card_No': 4111111111111111, 'Name_on_Card': 'Budget Fixture',
+            'Expiry_Date': '2099-12-31', 'CVV': 123, 'Billing_Address': 'n/a', 'Reservation_ID': fx.reservation()}
+
+
+# endpoint -> (method, path(fx), body(fx) or None, session: None/'user'/'admin')
+CASES = {
+    'index': ('GET', '/', None, None),
+    'login_page': ('GET', '/login', None, None),
+    'register_page': ('GET', '/register', None, None),
+    'dashboard': ('GET', '/dashboard', None, 'user'),
+    'cars_page': ('GET', '/cars', None, None),
+    'reserve_page': ('GET', '/reserve', None, 'user'),
+    'my_reservations_page': ('GET', '/my_reservations', None, 'user'),
+    'payment_page': ('GET', '/payment', None, 'user'),
+    'admin_page': ('GET', '/admin', None, 'admin'),
+    'api_register': ('POST', '/api/register', _register_body, None),
+    'api_login': ('POST', '/api/login', lambda fx: {'License_No': FIXTURE_LICENSE, 'Password': FIXTURE_PASSWORD},
+                  None),
+    'api_logout': ('POST', '/api/logout', None, 'user'),
+    'api_users_current': ('GET', '/api/users/current', None, 'user'),
+    'api_my_reservations': ('GET', '/api/my_reservations', None, 'user'),
+    'api_cars': ('GET', '/api/cars', None, None),
+    'api_locations': ('GET', '/api/locations', None, None),
+    'api_available_cars_by_date': ('GET', lambda fx: '/api/cars/available?start_date=%s&end_date=%s' % _dates(fx),
+                                   None, None),
+    'api_cars_calendar': ('GET', '/api/cars/calendar?days=90', None, None),
+    'api_quotes': ('POST', '/api/quotes', _quote_body, None),
+    'api_add_reservation': ('POST', '/api/reservations/add', _booking_body, 'user'),
+    'api_batch_reservations': ('POST', '/api/reservations/batch', _batch_body, 'admin'),
+    'api_payments_add': ('POST', '/api/payments/add', _payment_body, 'user'),
+    'api_cancel_reservation': ('POST', lambda fx: f'/api/reservations/{fx.reservation()}/cancel', None, 'user'),
+    'api_metrics_summary': ('GET', '/api/metrics/summary', None, None),
+    'api_metrics_runtime': ('GET', '/api/metrics/runtime', None, None),
+    'api_admin_perf': ('GET', '/api/admin/perf', None, 'admin'),
+    'api_admin_stats': ('GET', '/api/admin/stats', None, 'admin'),
+    'api_admin_users': ('GET', '/api/admin/users', None, 'admin'),
+    'api_admin_set_user_role': ('POST', f'/api/admin/users/{FIXTURE_LICENSE}/role', _role_body, 'admin'),
+    'api_admin_reservations': ('GET', '/api/admin/reservations', None, 'admin'),
+    'api_admin_search': ('GET', f'/api/admin/search?q={FIXTURE_LICENSE}', None, 'admin'),
+    'api_admin_reservation_detail': ('GET', lambda fx: f'/api/admin/reservation/{fx.reservation()}', None, 'admin'),
+    'api_admin_revenue': ('GET', '/api/admin/revenue?days=90&granularity=week', None, 'admin'),
+    'api_admin_car_status': ('GET', '/api/admin/car-status', None, 'admin'),
+    'api_admin_dashboard': ('GET', '/api/admin/dashboard', None, 'admin'),
+    'api_admin_fleet_import': ('POST', '/api/admin/fleet/import/cars', _cars_csv, 'admin'),
+    'api_admin_fleet_export': ('GET', '/api/admin/fleet/export/car_types', None, 'admin'),
+    'api_admin_confirm_reservation': ('POST', lambda fx: f'/api/admin/confirm-reservation/{fx.reservation()}',
+                                      None, 'admin'),
+}
+
+
+def _client(kind):
+    client = app.test_client()
+    if kind:
+        license_no = FIXTURE_ADMIN if kind == 'admin' else FIXTURE_LICENSE
+        with get_db_connection() as conn:
+            version = user_version(conn, license_no)
+        with client.session_transaction() as sess:
+            sess['license_no'] = license_no
+            remember_role(sess, license_no, 'Admin' if kind == 'admin' else 'Customer', version)
+    return client
+
+
+def measure(fx, counter, case):
+    # Setup (fixture rows, request bodies, session) runs before the counter is reset
+    method, path, body, kind = case
+    path = path(fx) if callable(path) else path
+    body = body(fx) if body else None
+    client = _client(kind)
+    counter.reset()
+    if isinstance(body, str):
+        resp = client.open(path, method=method, data=body, content_type='text/csv')
+    else:
+        resp = client.open(path, method=method, json=body)
+    resp.get_data()
+    resp.close()
+    result = counter.snapshot()
+    result['status'] = resp.status_code
+    return result
+
+
+def _routes():
+    return sorted((rule for rule in app.url_map.iter_rules() if rule.endpoint not in EXEMPT),
+                  key=lambda rule: rule.rule)
+
+
+@pytest.mark.parametrize('endpoint', [rule.endpoint for rule in _routes()])
+def test_route_declares_budget_and_case(endpoint):
+    assert getattr(app.view_functions[endpoint], 'query_budget', None) is not None, \
+        'no @query_budget on the route'
+    assert endpoint in CASES, 'no case in tests/test_query_budgets.py'
+
+
+@pytest.fixture(scope='module')
+def budget_run(mysql):
+    fx = Fixture()
+    counter = StatementCounter()
+    set_query_hook(counter)
+    try:
+        yield fx, counter
+    finally:
+        set_query_hook(None)
+        fx.cleanup()
+
+
+@pytest.mark.parametrize('endpoint', [rule.endpoint for rule in _routes() if rule.endpoint in CASES])
+def test_warm_request_within_budget(budget_run, endpoint):
+    fx, counter = budget_run
+    budget = app.view_functions[endpoint].query_budget
+    case = CASES[endpoint]
+    cold = measure(fx, counter, case)
+    warm = measure(fx, counter, case)
+    statements = '\n'.join(f'  {sql}' for sql in warm['sql'])
+    print(f"{endpoint}: statements {warm['statements']}/{budget['statements']} "
+          f"round trips {warm['round_trips']}/{budget['round_trips']} db {warm['db_ms']}ms "
+          f"(cold {cold['statements']})\n{statements}")
+    assert 200 <= warm['status'] < 400, f"status {warm['status']}"
+    for key in ('statements', 'round_trips'):
+        assert warm[key] <= budget[key], f"{key} {warm[key]} > {budget[key]}:\n{statements}"
@@ -0,0 +1,147 @@
+import os
+from datetime import date, timedelta
+import pytest
+from admin_search import search_query
+from db import get_db_connection
+from pagination import keyset_query
+from stats import GAUGE_DATE
+
+# EXPLAIN every hot query the app runs and fail if one regresses to a full
+# table scan. Needs TEST_DB_NAME (see conftest.py). The schema is first seeded
+# with PLAN_SEED_PER_CAR (default 2000) synthetic reservations per car so the
+# optimizer stops preferring scans on tiny tables; seeding is skipped when the
+# rows are already there.
+
+PLAN_SEED_PER_CAR = int(os.getenv('PLAN_SEED_PER_CAR','2000'))
+
+SEED_LICENSE = 'PLANSEED'
+
+TODAY = date.today()
+MONTH_START = TODAY.replace(day=1)
+
+# (name, sql, params, aliases allowed to scan). Car, Car_Type, Rental_Location
+# and the insurance tables are a few hundred rows at most and may be scanned,
+# except where a query filters Car by location.
+HOT_QUERIES = [
+    ('overlap_check', """
+        SELECT 1 FROM Reservation r
+        WHERE r.VIN = %s AND r.Status IN ('Pending','Confirmed')
+          AND r.Start_Date <= %s AND r.End_Date >= %s
+     """, ('1HGCM82633A123456', TODAY + timedelta(days=3), TODAY), set()),
+    ('availability_index_load', """
+        SELECT Reservation_ID, VIN, Start_Date, End_Date FROM Reservation
+        WHERE Status IN ('Pending','Confirmed') AND End_Date >= %s
+        ORDER BY VIN, Start_Date
+     """, (TODAY,), set()),
+    ('available_by_location', """
+        SELECT c.VIN, c.Model, c.Car_Type, c.Color, ct.Daily_Rate, c.Status, c.Year,
+               c.Rental_Location_ID, l.State, l.Zip_Code
+        FROM Car c
+        JOIN Car_Type ct ON c.Car_Type = ct.Car_Type
+        JOIN Rental_Location l ON c.Rental_Location_ID = l.Rental_Location_ID
+        WHERE c.Status = 'Available'
+        AND c.VIN NOT IN (
+            SELECT r.VIN FROM Reservation r
+            WHERE r.Status IN ('Pending','Confirmed')
+              AND r.Start_Date <= %s AND r.End_Date >= %s
+        ) AND c.Rental_Location_ID IN (%s)
+     """, (TODAY - timedelta(days=20), TODAY - timedelta(days=30), 1), {'ct', 'l'}),
+    # all-digit query: the user, phone and car FULLTEXT branches plus the ID lookup
+    ('admin_search',) + search_query('42', 20) + (set(),),
+    ('release_scan', """
+        SELECT VIN, COUNT(*) FROM Reservation
+        WHERE Status = 'Confirmed' AND End_Date > %s AND End_Date <= %s
+        GROUP BY VIN
+     """, (TODAY - timedelta(days=2), TODAY - timedelta(days=1)), set()),
+    ('my_reservations',) + keyset_query(
+        """SELECT r.Reservation_ID, r.Start_Date, r.End_Date, r.Status, r.Total_Amount, c.Model
+           FROM Reservation r JOIN Car c ON r.VIN = c.VIN""",
+        'r.Reservation_ID', 100, where='r.License_No=%s', params=('ADMIN001',)) + (set(),),
+    ('admin_reservations',) + keyset_query(
+        """SELECT r.Reservation_ID, r.License_No, u.FName, u.LName, u.Email,
+                  GROUP_CONCAT(DISTINCT up.Phone SEPARATOR ', ') AS Phones,
+                  c.VIN, c.Model, c.Car_Type, c.Color,
+                  r.Start_Date, r.End_Date, r.Status, r.Total_Amount, r.Insurance_Type
+           FROM Reservation r
+           JOIN User u ON r.License_No = u.License_No
+           LEFT JOIN User_Phone up ON up.License_No = u.License_No
+           JOIN Car c ON r.VIN = c.VIN""",
+        'r.Reservation_ID', 200, group_by='r.Reservation_ID') + (set(),),
+    ('admin_users',) + keyset_query(
+        """SELECT u.*, COUNT(r.Reservation_ID) as total_reservations,
+                  SUM(CASE WHEN r.Status = 'Confirmed' THEN 1 ELSE 0 END) as active_reservations
+           FROM User u
+           LEFT JOIN Reservation r ON u.License_No = r.License_No""",
+        'u.License_No', 100, group_by='u.License_No') + (set(),),
+    ('revenue_range', """
+        SELECT Fact_Date, Car_Type, Bookings, Revenue FROM Revenue_Daily
+        WHERE Fact_Date BETWEEN %s AND %s AND Status IN (%s, %s)
+     """, (MONTH_START, TODAY, 'Pending', 'Confirmed'), set()),
+    ('admin_stats', """
+        SELECT Stat_Date, Metric, Value FROM Stats_Rollup
+        WHERE Stat_Date = %s OR Stat_Date >= %s
+     """, (GAUGE_DATE, MONTH_START), set()),
+    ('reservation_detail', """
+        SELECT r.*, u.FName, u.LName, c.Model, ct.Daily_Rate
+        FROM Reservation r
+        JOIN User u ON r.License_No = u.License_No
+        JOIN Car c ON r.VIN = c.VIN
+        LEFT JOIN Car_Type ct ON c.Car_Type = ct.Car_Type
+        WHERE r.Reservation_ID = %s
+     """, (1,), set()),
+]
+
+
+def seed(conn, per_car):
+    # Back-to-back two-day bookings per car (every fourth Cancelled), far enough in the past that
+    # they never collide with real data. Re-running is a no-op.
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) FROM Reservation WHERE License_No=%s", (SEED_LICENSE,))
+    if cur.fetchone()[0]:
+        cur.close()
+        return 0
+    cur.execute("""
+        INSERT IGNORE INTO User (License_No, FName, LName, Email, Address, DOB, User_Type)
+        VALUES (%s, 'Plan', 'Seed', 'planseed@example.com', 'n/a', '1990-01-01', 'Guest')
+    """, (SEED_LICENSE,))
+    cur.execute("SELECT VIN FROM Car")
+    vins = [r[0] for r in cur.fetchall()]
+    base = date(1990, 1, 1)
+    rows = []
+    for vin in vins:
+        for n in range(per_car):
+            start = base + timedelta(days=3 * n)
+            rows.append((start, start + timedelta(days=1), 0, 0, 'Cancelled' if n % 4 == 0 else 'Pending',
+                         SEED_LICENSE, vin))
+    for i in range(0, len(rows), 1000):
+        cur.executemany("""
+            INSERT INTO Reservation (Start_Date, End_Date, Rental_Amount, Total_Amount, Status, License_No, VIN)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, rows[i:i + 1000])
+    conn.commit()
+    cur.execute("ANALYZE TABLE Reservation, User")
+    cur.fetchall()
+    cur.close()
+    return len(rows)
+
+
+@pytest.fixture(scope='module')
+def plan_conn(mysql):
+    with get_db_connection() as conn:
+        if PLAN_SEED_PER_CAR:
+            seed(conn, PLAN_SEED_PER_CAR)
+        yield conn
+
+
+@pytest.mark.parametrize('name,sql,params,scan_ok', HOT_QUERIES, ids=[q[0] for q in HOT_QUERIES])
+def test_hot_query_uses_an_index(plan_conn, name, sql, params, scan_ok):
+    cur = plan_conn.cursor(dictionary=True)
+    cur.execute("EXPLAIN " + sql, params)
+    plan = cur.fetchall()
+    cur.close()
+    scans = [row['table'] for row in plan
+             if row['type'] == 'ALL' and row['table'] not in scan_ok
+             and not str(row['table']).startswith('<')]
+    detail = '\n'.join(f"  {row['table']}: type={row['type']} key={row['key']} rows={row['rows']}" for row in plan)
+    print(f"{name}\n{detail}")
+    assert not scans, f"full scan on: {', '.join(scans)}\n{detail}"
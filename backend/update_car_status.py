@@ -1,23 +1,16 @@
 from db import get_db_connection
+from release_worker import run_once
 
+# One incremental release pass, for cron setups that still call this script;
+# `python release_worker.py` runs the same pass on a loop.
 def update_car_status_after_reservation():
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        update_query = """
-            UPDATE Car c
-            JOIN Reservation r ON c.VIN = r.VIN
-            SET c.Status = 'Available'
-            WHERE r.Status = 'Confirmed' AND r.End_Date < CURDATE()
-        """
-        cur.execute(update_query)
-        conn.commit()
-        print(f"{cur.rowcount} cars updated to 'Available'")
+        with get_db_connection() as conn:
+            result = run_once(conn)
+        print(f"{result['changed']} cars updated to 'Available' "
+              f"({result['scanned']} reservations scanned, {result['skipped_follow_on']} cars still booked)")
     except Exception as e:
         print("Error updating car status:", e)
-    finally:
-        cur.close()
-        conn.close()
 
 if __name__ == "__main__":
     update_car_status_after_reservation()
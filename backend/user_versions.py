@@ -0,0 +1,69 @@
+import hashlib
+import threading
+from flask import current_app, request
+
+# Conditional GET for per-user endpoints. User_Version (migration 005) holds a
+# counter per user that every reservation, payment and profile write bumps
+# inside its own transaction, so a matching If-None-Match is answered with one
+# primary-key read instead of the endpoint's full query.
+
+_lock = threading.Lock()
+_counters = {'conditional': 0, 'not_modified': 0, 'full': 0}
+
+
+def bump_user_versions(conn, license_nos):
+    rows = [(license_no,) for license_no in set(license_nos) if license_no]
+    if not rows:
+        return
+    cur = conn.cursor()
+    cur.executemany("""
+        INSERT INTO User_Version (License_No, Version) VALUES (%s, 1)
+        ON DUPLICATE KEY UPDATE Version = Version + 1
+    """, rows)
+    cur.close()
+
+
+def bump_user_version(conn, license_no):
+    bump_user_versions(conn, [license_no])
+
+
+def user_version(conn, license_no):
+    cur = conn.cursor()
+    cur.execute("SELECT Version FROM User_Version WHERE License_No=%s", (license_no,))
+    row = cur.fetchone()
+    cur.close()
+    return row[0] if row else 0
+
+
+def user_etag(license_no, version):
+    # Strong tag over the user, their version and the exact URL (page/cursor)
+    key = f"{license_no}|{version}|{request.full_path}".encode()
+    return hashlib.sha1(key).hexdigest()
+
+
+def check_not_modified(etag):
+    # True when the client already holds this representation
+    matched = etag in request.if_none_match
+    with _lock:
+        if request.if_none_match:
+            _counters['conditional'] += 1
+        _counters['not_modified' if matched else 'full'] += 1
+    return matched
+
+
+def tag_response(response, etag):
+    response.set_etag(etag)
+    # per-user data: browsers may keep it but must revalidate every time
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
+
+
+def not_modified(etag):
+    return tag_response(current_app.response_class(status=304), etag)
+
+
+def etag_stats():
+    with _lock:
+        served = _counters['not_modified'] + _counters['full']
+        return dict(_counters, not_modified_rate=round(_counters['not_modified'] / served, 4) if served else None)